@@ -3,27 +3,43 @@ MongoDB Real Estate Database Package
 Complete database implementation with CRUD operations
 """
 
-from .config import get_database, get_mongo_client, close_connection
-from .operations import DatabaseOperations
-from .models import (
-    UserRole,
-    VerificationStatus,
-    ListingStatus,
-    PropertyType,
-    COLLECTIONS_SCHEMA
-)
+import importlib
 
 __version__ = "1.0.0"
 __author__ = "Real Estate Database Team"
 
-__all__ = [
-    'get_database',
-    'get_mongo_client',
-    'close_connection',
-    'DatabaseOperations',
-    'UserRole',
-    'VerificationStatus',
-    'ListingStatus',
-    'PropertyType',
-    'COLLECTIONS_SCHEMA'
-]
+# Public name -> defining submodule. Submodules (and pymongo) are imported on
+# first attribute access, so `import mongodb` does not load drivers or .env.
+_LAZY_EXPORTS = {
+    'get_database': 'config',
+    'get_mongo_client': 'config',
+    'close_connection': 'config',
+    'check_ready': 'config',
+    'wait_until_ready': 'config',
+    'DatabaseOperations': 'operations',
+    'UserRole': 'models',
+    'VerificationStatus': 'models',
+    'ListingStatus': 'models',
+    'PropertyType': 'models',
+    'COLLECTIONS_SCHEMA': 'models',
+    'Model': 'models',
+    'User': 'models',
+    'Property': 'models',
+    'Listing': 'models',
+    'MODEL_CLASSES': 'models',
+}
+
+__all__ = list(_LAZY_EXPORTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    value = getattr(importlib.import_module(f".{module_name}", __name__), name)
+    globals()[name] = value  # cache so later lookups skip __getattr__
+    return value
+
+
+def __dir__():
+    return sorted(list(globals()) + __all__)
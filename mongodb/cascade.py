@@ -0,0 +1,248 @@
+"""
+Cascading Deletes and Archival
+Removes or archives documents that reference a deleted user, property or listing
+
+Dependents are found through the reference indexes (property_id,
+listing_id, user_firebase_uid, ...) and removed in throttled batches: each
+batch is one find, an optional insert_many into the cold collection
+(<collection>_archive) and one delete_many. Jobs run in a background
+thread and record their progress in cascade_jobs.
+
+    job = db_ops.cascade_delete("property", property_id, archive=True)
+    job.wait()
+    job.progress   # {"listings": 3, "saved_listings": 12, ...}
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Callable, Dict, Iterable, List, NamedTuple, Optional
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from listing_stats import VIEW_STATS_COLLECTION
+from models import ListingStatus
+from storage import ensure_collection
+
+JOBS_COLLECTION = "cascade_jobs"
+ARCHIVE_SUFFIX = "_archive"
+
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_PAUSE = 0.05  # seconds between batches, to leave room for foreground traffic
+
+# Archive collections already created (with their compressor) by this process
+_ensured = set()
+
+
+class Step(NamedTuple):
+    """Documents of `collection` matching `query` depend on the root"""
+
+    collection: str
+    query: Dict[str, Any]
+    # Steps for the dependents of each batch (run before the batch is removed)
+    children: Optional[Callable[[List[Dict[str, Any]]], List["Step"]]] = None
+    # (field, value): $pull the reference instead of removing the document
+    pull: Optional[tuple] = None
+
+
+def archive_name(collection: str) -> str:
+    return collection + ARCHIVE_SUFFIX
+
+
+# ==================== DEPENDENCY PLANS ====================
+
+def listing_steps(listing_ids: List[ObjectId], counter_names: Iterable[str] = ()) -> List[Step]:
+    steps = [
+        Step("saved_listings", {"listing_id": {"$in": listing_ids}}),
+        Step(VIEW_STATS_COLLECTION, {"listing_id": {"$in": listing_ids}}),
+    ]
+    for name in counter_names:
+        steps.append(Step("counter_shards", {"counter": name, "resource_id": {"$in": listing_ids}}))
+    return steps
+
+
+def _listing_children(counter_names: Iterable[str]):
+    counter_names = tuple(counter_names)
+    return lambda docs: listing_steps([doc["_id"] for doc in docs], counter_names)
+
+
+def property_steps(property_id: ObjectId, counter_names: Iterable[str] = ()) -> List[Step]:
+    return [
+        Step("listings", {"property_id": property_id}, children=_listing_children(counter_names)),
+        Step("reviews", {"target_type": "property", "target_id": str(property_id)}),
+        Step("property_comparisons", {"property_ids": property_id}, pull=("property_ids", property_id)),
+        Step("property_similar", {"_id": property_id}),
+    ]
+
+
+def user_steps(firebase_uid: str, counter_names: Iterable[str] = ()) -> List[Step]:
+    return [
+        Step("listings", {"lister_firebase_uid": firebase_uid}, children=_listing_children(counter_names)),
+        Step("saved_listings", {"user_firebase_uid": firebase_uid}),
+        Step("saved_searches", {"user_firebase_uid": firebase_uid}),
+        Step("property_comparisons", {"user_firebase_uid": firebase_uid}),
+        Step("reviews", {"reviewer_firebase_uid": firebase_uid}),
+        Step("reviews", {"target_type": "lister", "target_id": firebase_uid}),
+        Step("verification_documents", {"user_firebase_uid": firebase_uid}),
+        Step("notifications", {"user_firebase_uid": firebase_uid}),
+        Step("user_conversations", {"user_firebase_uid": firebase_uid}),
+    ]
+
+
+# ==================== JOBS ====================
+
+class CascadeJob:
+    """
+    Drains a list of steps in throttled batches
+
+    Args:
+        db: MongoDB database instance
+        name: Description stored with the progress record (e.g. "property:<id>")
+        steps: Dependents to remove
+        archive: Copy documents into <collection>_archive before deleting
+        batch_size: Documents per find/insert_many/delete_many
+        pause: Seconds to sleep between batches
+    """
+
+    def __init__(self, db, name: str, steps: List[Step], archive: bool = False,
+                 batch_size: int = DEFAULT_BATCH_SIZE, pause: float = DEFAULT_PAUSE):
+        self.db = db
+        self.name = name
+        self.steps = steps
+        self.archive = archive
+        self.batch_size = batch_size
+        self.pause = pause
+        self.job_id = ObjectId()
+        self.progress: Dict[str, int] = {}
+        self.error: Optional[BaseException] = None
+        self.done = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> "CascadeJob":
+        """Run in a background (daemon) thread"""
+        self._thread = threading.Thread(target=self.run, name=f"cascade-{self.name}", daemon=True)
+        self._thread.start()
+        return self
+
+    def wait(self, timeout: Optional[float] = None) -> bool:
+        return self.done.wait(timeout)
+
+    def run(self) -> Dict[str, int]:
+        jobs = self.db[JOBS_COLLECTION]
+        now = datetime.now(timezone.utc)
+        jobs.insert_one({"_id": self.job_id, "name": self.name, "archive": self.archive,
+                         "status": "running", "progress": {}, "started_at": now, "updated_at": now})
+        status = "failed"
+        try:
+            for step in self.steps:
+                self._drain(step)
+            status = "done"
+        except Exception as e:
+            self.error = e
+            print(f"✗ Cascade {self.name} failed: {e}")
+        finally:
+            jobs.update_one({"_id": self.job_id}, {"$set": {
+                "status": status,
+                "progress": self.progress,
+                "error": str(self.error) if self.error else None,
+                "finished_at": datetime.now(timezone.utc),
+                "updated_at": datetime.now(timezone.utc),
+            }})
+            self.done.set()
+        if self.error is None and self.steps:
+            print(f"✓ Cascade {self.name}: {self.progress or 'nothing to remove'}")
+        return self.progress
+
+    def _drain(self, step: Step) -> None:
+        collection = self.db[step.collection]
+        if step.pull is not None:
+            field, value = step.pull
+            result = collection.update_many(step.query, {"$pull": {field: value}})
+            self._record(step.collection, result.modified_count)
+            return
+
+        projection = None if self.archive or step.children else {"_id": 1}
+        while True:
+            docs = list(collection.find(step.query, projection).limit(self.batch_size))
+            if not docs:
+                return
+            if step.children is not None:
+                for child in step.children(docs):
+                    self._drain(child)
+            ids = [doc["_id"] for doc in docs]
+            if self.archive:
+                copy_to_archive(self.db, step.collection, docs)
+            result = collection.delete_many({"_id": {"$in": ids}})
+            self._record(step.collection, result.deleted_count)
+            if len(docs) < self.batch_size:
+                return
+            time.sleep(self.pause)
+
+    def _record(self, collection: str, count: int) -> None:
+        if not count:
+            return
+        self.progress[collection] = self.progress.get(collection, 0) + count
+        self.db[JOBS_COLLECTION].update_one({"_id": self.job_id}, {"$set": {
+            "progress": self.progress, "updated_at": datetime.now(timezone.utc)
+        }})
+
+
+def copy_to_archive(db, collection: str, docs: List[Dict[str, Any]]) -> None:
+    """insert_many into the cold collection; documents archived by an earlier, interrupted run are skipped"""
+    now = datetime.now(timezone.utc)
+    for doc in docs:
+        doc["archived_at"] = now
+    if collection not in _ensured:
+        ensure_collection(db, archive_name(collection))
+        _ensured.add(collection)
+    try:
+        db[archive_name(collection)].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        if any(err.get("code") != 11000 for err in e.details.get("writeErrors", [])):
+            raise
+
+
+def archive_stale(db, listing_days: int = 30, read_notification_days: int = 30, notification_days: int = 90,
+                  counter_names: Iterable[str] = (), batch_size: int = DEFAULT_BATCH_SIZE,
+                  pause: float = DEFAULT_PAUSE) -> Dict[str, int]:
+    """
+    Periodic archival of cold documents
+
+    Moves expired/rejected listings not updated for listing_days (with their
+    saved_listings), read notifications older than read_notification_days
+    and any notification older than notification_days into *_archive.
+
+    Returns:
+        dict: Collection -> documents archived
+    """
+    now = datetime.now(timezone.utc)
+    steps = [
+        Step("listings", {
+            "status": {"$in": [ListingStatus.EXPIRED, ListingStatus.REJECTED]},
+            "updated_at": {"$lt": now - timedelta(days=listing_days)},
+        }, children=_listing_children(counter_names)),
+        Step("notifications", {
+            "is_read": True,
+            "created_at": {"$lt": now - timedelta(days=read_notification_days)},
+        }),
+        Step("notifications", {"created_at": {"$lt": now - timedelta(days=notification_days)}}),
+    ]
+    return CascadeJob(db, "archive_stale", steps, archive=True, batch_size=batch_size, pause=pause).run()
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import get_database, close_connection
+
+    parser = argparse.ArgumentParser(description="Archive expired/rejected listings and old notifications")
+    parser.add_argument("--listing-days", type=int, default=30)
+    parser.add_argument("--read-notification-days", type=int, default=30)
+    parser.add_argument("--notification-days", type=int, default=90)
+    args = parser.parse_args()
+
+    client, db = get_database()
+    try:
+        archive_stale(db, args.listing_days, args.read_notification_days, args.notification_days)
+    finally:
+        close_connection(client)
@@ -4,50 +4,262 @@ Real Estate Listing Database
 """
 
 import os
-from pymongo import MongoClient
-from pymongo.errors import ConnectionFailure
-from dotenv import load_dotenv
+import time
 
-# Load environment variables
-load_dotenv()
+# pymongo and python-dotenv are imported on first use so that importing this
+# module (and the package) stays cheap for CLI tools and test collection.
 
-# MongoDB Configuration
-MONGO_URL = os.getenv("MONGO_URL", "mongodb://localhost:27017/")
-DB_NAME = os.getenv("DB_NAME", "real_estate_db")
+_settings = None
 
-def get_mongo_client():
+
+def get_settings():
+    """
+    Load environment variables (once) and return connection settings
+
+    Returns:
+        dict: {"MONGO_URL": ..., "DB_NAME": ...}
+    """
+    global _settings
+    if _settings is None:
+        from dotenv import load_dotenv
+        load_dotenv()
+        _settings = {
+            "MONGO_URL": os.getenv("MONGO_URL", "mongodb://localhost:27017/"),
+            "DB_NAME": os.getenv("DB_NAME", "real_estate_db"),
+            # Read routing per operation category (see get_read_preference)
+            "SEARCH_READ_PREFERENCE": os.getenv("SEARCH_READ_PREFERENCE", "secondaryPreferred"),
+            "SEARCH_MAX_STALENESS": int(os.getenv("SEARCH_MAX_STALENESS", "120")),
+            "ANALYTICS_READ_PREFERENCE": os.getenv("ANALYTICS_READ_PREFERENCE", "secondaryPreferred"),
+            "ANALYTICS_TAGS": os.getenv("ANALYTICS_TAGS", "nodeType:ANALYTICS"),
+            # Include shard keys in filters (enable when running against a sharded cluster)
+            "SHARD_TARGETING": os.getenv("SHARD_TARGETING", "false").lower() in ("1", "true", "yes"),
+            # Wire compression, in order of preference ("" disables); see client_options
+            "MONGO_COMPRESSORS": os.getenv("MONGO_COMPRESSORS", "zstd,snappy,zlib"),
+            "ZLIB_COMPRESSION_LEVEL": int(os.getenv("ZLIB_COMPRESSION_LEVEL", "-1")),
+            # Fail fast while no server is selectable / connectable (pymongo default: 30s / 20s)
+            "SERVER_SELECTION_TIMEOUT_MS": int(os.getenv("SERVER_SELECTION_TIMEOUT_MS", "5000")),
+            "CONNECT_TIMEOUT_MS": int(os.getenv("CONNECT_TIMEOUT_MS", "5000")),
+            # Per-call deadlines by kind (0 = none); see resilience.py
+            "READ_TIMEOUT_MS": int(os.getenv("READ_TIMEOUT_MS", "2000")),
+            "WRITE_TIMEOUT_MS": int(os.getenv("WRITE_TIMEOUT_MS", "5000")),
+            "SEARCH_TIMEOUT_MS": int(os.getenv("SEARCH_TIMEOUT_MS", "3000")),
+            "ANALYTICS_TIMEOUT_MS": int(os.getenv("ANALYTICS_TIMEOUT_MS", "30000")),
+            "CIRCUIT_FAILURE_THRESHOLD": int(os.getenv("CIRCUIT_FAILURE_THRESHOLD", "5")),
+            "CIRCUIT_RESET_SECONDS": float(os.getenv("CIRCUIT_RESET_SECONDS", "30")),
+            # Guarded calls in flight before low-priority work is shed
+            "MAX_CONCURRENT_OPERATIONS": int(os.getenv("MAX_CONCURRENT_OPERATIONS", "64")),
+            # Max age of last-good lookups served while a circuit is open (0 = off, the default)
+            "STALE_CACHE_SECONDS": float(os.getenv("STALE_CACHE_SECONDS", "0")),
+        }
+    return _settings
+
+
+# Wire compressor -> Python module pymongo needs for it (zlib is in the standard library)
+_COMPRESSOR_MODULES = {"zstd": "zstandard", "snappy": "snappy", "zlib": "zlib"}
+
+
+def available_compressors(spec):
+    """
+    Compressors from a "zstd,snappy,zlib" list whose Python module is installed
+
+    The server picks the first one in the list that it also supports, so
+    listing several is safe; unknown names are dropped.
+    """
+    import importlib.util
+
+    compressors = []
+    for name in (part.strip().lower() for part in spec.split(",")):
+        module = _COMPRESSOR_MODULES.get(name)
+        if module and name not in compressors and importlib.util.find_spec(module) is not None:
+            compressors.append(name)
+    return compressors
+
+
+def client_options():
+    """
+    Extra MongoClient keyword arguments derived from settings
+
+    Network compression shrinks large responses (descriptions, image
+    arrays, price_history) at some CPU cost on both ends; zstd needs
+    `pip install zstandard`, snappy needs `pip install python-snappy`.
+    Server selection and connection timeouts are shortened so calls fail
+    fast during an outage instead of blocking for pymongo's 30s default.
+    """
+    settings = get_settings()
+    options = {
+        "serverSelectionTimeoutMS": settings["SERVER_SELECTION_TIMEOUT_MS"],
+        "connectTimeoutMS": settings["CONNECT_TIMEOUT_MS"],
+    }
+    compressors = available_compressors(settings["MONGO_COMPRESSORS"])
+    if compressors:
+        options["compressors"] = ",".join(compressors)
+        if "zlib" in compressors:
+            options["zlibCompressionLevel"] = settings["ZLIB_COMPRESSION_LEVEL"]
+    return options
+
+
+def __getattr__(name):
+    # Keep config.MONGO_URL / config.DB_NAME working without loading .env at import time
+    if name in ("MONGO_URL", "DB_NAME"):
+        return get_settings()[name]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+
+# MONGO_URL=memory:// runs against the in-process memory_backend (tests, local benchmarks)
+MEMORY_URL_SCHEME = "memory://"
+
+
+def get_mongo_client(ping=True):
     """
     Create and return MongoDB client
-    
+
+    Args:
+        ping: Verify the connection immediately. With ping=False the client
+              connects in the background on first use and this never blocks.
+
     Returns:
-        MongoClient: MongoDB client instance
+        MongoClient: MongoDB client instance (memory_backend.MemoryClient
+                     when MONGO_URL is memory://)
     """
+    from pymongo import MongoClient
+    from pymongo.errors import ConnectionFailure
+
+    mongo_url = get_settings()["MONGO_URL"]
+    if mongo_url.startswith(MEMORY_URL_SCHEME):
+        from memory_backend import shared_client
+        return shared_client()
+    options = client_options()
+    if not ping:
+        return MongoClient(mongo_url, connect=False, **options)
+
     try:
-        client = MongoClient(MONGO_URL)
+        client = MongoClient(mongo_url, **options)
         # Test connection
         client.admin.command('ping')
-        print(f"✓ Successfully connected to MongoDB at {MONGO_URL}")
+        print(f"✓ Successfully connected to MongoDB at {mongo_url}")
         return client
     except ConnectionFailure as e:
         print(f"✗ Failed to connect to MongoDB: {e}")
         raise
 
-def get_database():
+def get_database(ping=True):
     """
     Get database instance
-    
+
+    Args:
+        ping: Verify the connection before returning (see get_mongo_client)
+
     Returns:
         (MongoClient, Database): Tuple of MongoDB client and database instance
     """
-    client = get_mongo_client()
-    db = client[DB_NAME]
-    print(f"✓ Using database: {DB_NAME}")
+    client = get_mongo_client(ping=ping)
+    db_name = get_settings()["DB_NAME"]
+    db = client[db_name]
+    if get_settings()["MONGO_URL"].startswith(MEMORY_URL_SCHEME):
+        from init_db import INDEX_SPECS
+        db.apply_index_specs(INDEX_SPECS)
+    print(f"✓ Using database: {db_name}")
     return client, db  # <-- MODIFIED: Return both client and db
 
+def check_ready(client, timeout=0.5):
+    """
+    Check whether the server is reachable, waiting at most `timeout` seconds
+
+    Args:
+        client: MongoDB client instance
+        timeout: Maximum seconds to wait for server selection and the ping
+
+    Returns:
+        bool: True if the server answered the ping
+    """
+    import pymongo
+    from pymongo.errors import PyMongoError
+
+    try:
+        with pymongo.timeout(timeout):
+            client.admin.command('ping')
+        return True
+    except PyMongoError:
+        return False
+
+def wait_until_ready(client, retries=5, initial_delay=0.2, max_delay=5.0, timeout=0.5):
+    """
+    Retry check_ready with exponential backoff
+
+    Args:
+        client: MongoDB client instance
+        retries: Number of attempts
+        initial_delay: Seconds to sleep after the first failed attempt
+        max_delay: Upper bound for the sleep between attempts
+        timeout: Per-attempt timeout passed to check_ready
+
+    Returns:
+        bool: True once the server is reachable, False if all attempts failed
+    """
+    delay = initial_delay
+    for attempt in range(1, retries + 1):
+        if check_ready(client, timeout=timeout):
+            return True
+        if attempt < retries:
+            print(f"… MongoDB not ready (attempt {attempt}/{retries}), retrying in {delay:.1f}s")
+            time.sleep(delay)
+            delay = min(delay * 2, max_delay)
+    print(f"✗ MongoDB not reachable after {retries} attempts")
+    return False
+
+def _parse_tags(spec):
+    """Parse "k1:v1,k2:v2" into a tag set dict"""
+    return dict(pair.split(":", 1) for pair in spec.split(",") if ":" in pair)
+
+def get_read_preference(category):
+    """
+    Read preference for an operation category
+
+    Categories:
+        primary: auth/user lookups, read-modify-write paths and transactions
+        search: search and browse pages; secondaries within SEARCH_MAX_STALENESS
+                seconds (MongoDB requires at least 90)
+        analytics: reporting; members tagged with ANALYTICS_TAGS, falling back
+                   to any eligible member when none match
+
+    Args:
+        category: One of "primary", "search", "analytics"
+
+    Returns:
+        pymongo read preference instance
+    """
+    from pymongo.read_preferences import (
+        Primary, PrimaryPreferred, Secondary, SecondaryPreferred, Nearest
+    )
+
+    modes = {
+        "primary": Primary,
+        "primaryPreferred": PrimaryPreferred,
+        "secondary": Secondary,
+        "secondaryPreferred": SecondaryPreferred,
+        "nearest": Nearest,
+    }
+    settings = get_settings()
+
+    if category == "search":
+        mode = modes[settings["SEARCH_READ_PREFERENCE"]]
+        if mode is Primary:
+            return Primary()
+        return mode(max_staleness=max(90, settings["SEARCH_MAX_STALENESS"]))
+    if category == "analytics":
+        mode = modes[settings["ANALYTICS_READ_PREFERENCE"]]
+        if mode is Primary:
+            return Primary()
+        tags = _parse_tags(settings["ANALYTICS_TAGS"])
+        return mode(tag_sets=[tags, {}] if tags else None)
+    if category == "primary":
+        return Primary()
+    raise ValueError(f"Unknown read category: {category!r}")
+
 def close_connection(client):
     """
     Close MongoDB connection
-    
+
     Args:
         client: MongoDB client instance
     """
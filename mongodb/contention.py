@@ -0,0 +1,134 @@
+"""
+Contention Handling
+Sharded counters, optimistic concurrency and conflict metrics for hot documents
+
+Hot counters (listing views) are spread over N small counter documents so
+concurrent increments never touch the listing itself; reads add the shards
+to the base value stored on the listing, and fold() periodically moves the
+shard totals into the base. Writes that must not overwrite each other use a
+`version` field: the update only applies if the version is unchanged.
+"""
+
+import random
+import threading
+from collections import defaultdict
+from itertools import groupby
+from typing import Any, Dict, Iterable, Optional
+
+from transactions import run_transaction
+
+COUNTER_COLLECTION = "counter_shards"
+DEFAULT_SHARDS = 16
+
+
+class VersionConflictError(Exception):
+    """The document changed since it was read (version mismatch)"""
+
+    def __init__(self, collection: str, query: Dict[str, Any], expected_version: int):
+        super().__init__(f"{collection}: version {expected_version} is stale for {query}")
+        self.collection = collection
+        self.query = query
+        self.expected_version = expected_version
+
+
+def version_filter(expected_version: int) -> Dict[str, Any]:
+    """Match a document at expected_version (documents written before versioning count as 0)"""
+    if expected_version == 0:
+        return {"version": {"$in": [0, None]}}
+    return {"version": expected_version}
+
+
+class ContentionMetrics:
+    """Thread-safe per-collection counts of writes, version conflicts and retries"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._counts = defaultdict(lambda: {"writes": 0, "conflicts": 0, "retries": 0})
+
+    def record(self, collection: str, conflicts: int = 0, retries: int = 0) -> None:
+        with self._lock:
+            counts = self._counts[collection]
+            counts["writes"] += 1
+            counts["conflicts"] += conflicts
+            counts["retries"] += retries
+
+    def snapshot(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            return {
+                collection: {
+                    **counts,
+                    "conflict_rate": counts["conflicts"] / counts["writes"] if counts["writes"] else 0.0,
+                    "retry_rate": counts["retries"] / counts["writes"] if counts["writes"] else 0.0,
+                }
+                for collection, counts in self._counts.items()
+            }
+
+
+class ShardedCounter:
+    """
+    Counter split across `shards` documents in counter_shards
+
+    Args:
+        db: MongoDB database instance
+        name: Counter name (e.g. "listing_views")
+        shards: Shard documents per resource; more shards, fewer conflicts
+    """
+
+    def __init__(self, db, name: str, shards: int = DEFAULT_SHARDS):
+        self.collection = db[COUNTER_COLLECTION]
+        self.name = name
+        self.shards = shards
+
+    def increment(self, resource_id: Any, amount: int = 1, session=None) -> None:
+        """Add amount to a random shard (upserted on first use)"""
+        shard = random.randrange(self.shards)
+        self.collection.update_one(
+            {"_id": f"{self.name}:{resource_id}:{shard}"},
+            {"$inc": {"count": amount}, "$setOnInsert": {"counter": self.name, "resource_id": resource_id}},
+            upsert=True,
+            session=session
+        )
+
+    def get(self, resource_id: Any, session=None) -> int:
+        """Sum of the shards not yet folded into the base document"""
+        return self.get_many([resource_id], session=session).get(resource_id, 0)
+
+    def get_many(self, resource_ids: Iterable[Any], session=None) -> Dict[Any, int]:
+        """Shard sums for many resources in one aggregation"""
+        totals = self.collection.aggregate([
+            {"$match": {"counter": self.name, "resource_id": {"$in": list(resource_ids)}}},
+            {"$group": {"_id": "$resource_id", "count": {"$sum": "$count"}}},
+        ], session=session)
+        return {doc["_id"]: doc["count"] for doc in totals}
+
+    def fold(self, target, field: str, resource_ids: Optional[Iterable[Any]] = None) -> int:
+        """
+        Move shard totals into target[field] ($inc on the base document)
+
+        Each shard is decremented by the amount that was folded rather than
+        reset, so increments that land during the fold are kept. The base
+        $inc and the shard decrements of a resource commit in one transaction,
+        so a crash between them cannot count the same views twice.
+
+        Returns:
+            int: Number of resources folded
+        """
+        query = {"counter": self.name, "count": {"$ne": 0}}
+        if resource_ids is not None:
+            query["resource_id"] = {"$in": list(resource_ids)}
+        shards = self.collection.find(query, {"resource_id": 1, "count": 1}).sort("resource_id", 1)
+        db = self.collection.database
+        folded = 0
+        for resource_id, group in groupby(shards, key=lambda shard: shard["resource_id"]):
+            group = list(group)
+
+            def move(uow, resource_id=resource_id, group=group):
+                target.update_one({"_id": resource_id}, {"$inc": {field: sum(s["count"] for s in group)}},
+                                  session=uow.session)
+                for shard in group:
+                    self.collection.update_one({"_id": shard["_id"]}, {"$inc": {"count": -shard["count"]}},
+                                               session=uow.session)
+
+            run_transaction(db.client, db, move)
+            folded += 1
+        return folded
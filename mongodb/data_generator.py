@@ -0,0 +1,474 @@
+"""
+Synthetic Data Generator
+Seeded, streaming generator for load-testing the Real Estate database
+
+Every document is derived from (seed, collection, index), so any chunk can be
+regenerated independently in any process. Cross-collection references are
+computed from indexes rather than looked up, which keeps the dataset
+referentially consistent without reading anything back from MongoDB.
+"""
+
+import math
+import random
+import struct
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from bson.objectid import ObjectId
+from pymongo.errors import BulkWriteError
+
+from models import UserRole, PropertyType, ListingStatus, VerificationStatus
+from validation import get_validator
+from sharding import geo_cell
+
+# Collections in dependency order (referenced collections first)
+LOAD_ORDER = [
+    "users",
+    "properties",
+    "listings",
+    "reviews",
+    "saved_listings",
+    "notifications",
+    "audit_logs",
+]
+
+# Tag byte embedded in generated ObjectIds, one per collection
+_COLLECTION_TAGS = {name: i + 1 for i, name in enumerate(LOAD_ORDER)}
+
+# Collection holding per-chunk load checkpoints
+PROGRESS_COLLECTION = "data_load_progress"
+
+# Cities with (state, latitude, longitude, base price, weight).
+# Weights follow a rough metro-size distribution so properties cluster.
+CITIES = {
+    "Austin": ("TX", 30.2672, -97.7431, 520000, 14),
+    "Dallas": ("TX", 32.7767, -96.7970, 430000, 16),
+    "Houston": ("TX", 29.7604, -95.3698, 340000, 18),
+    "San Antonio": ("TX", 29.4241, -98.4936, 300000, 10),
+    "Denver": ("CO", 39.7392, -104.9903, 590000, 8),
+    "Phoenix": ("AZ", 33.4484, -112.0740, 420000, 9),
+    "Seattle": ("WA", 47.6062, -122.3321, 820000, 7),
+    "Miami": ("FL", 25.7617, -80.1918, 560000, 8),
+    "Atlanta": ("GA", 33.7490, -84.3880, 390000, 6),
+    "Boise": ("ID", 43.6150, -116.2023, 450000, 4),
+}
+
+# Price multipliers relative to a residential home in the same city
+_TYPE_PRICE_FACTOR = {
+    PropertyType.RESIDENTIAL: 1.0,
+    PropertyType.COMMERCIAL: 2.4,
+    PropertyType.LAND: 0.45,
+    PropertyType.RENTAL: 0.0045,  # monthly rent
+}
+_TYPE_WEIGHTS = {
+    PropertyType.RESIDENTIAL: 60,
+    PropertyType.RENTAL: 25,
+    PropertyType.COMMERCIAL: 10,
+    PropertyType.LAND: 5,
+}
+_AMENITIES = [
+    "pool", "garage", "central_ac", "hardwood_floors", "gym", "parking",
+    "laundry", "garden", "smart_home", "security_system", "fireplace",
+    "wine_cellar", "balcony", "elevator", "pet_friendly",
+]
+_ADJECTIVES = ["Modern", "Cozy", "Spacious", "Luxury", "Charming", "Renovated", "Sunny", "Quiet"]
+_STREETS = ["Main St", "Oak Ave", "Congress Ave", "Elm St", "Park Blvd", "Lake Dr", "Highland Rd", "Cedar Ln"]
+_NOTIFICATION_TYPES = ["price_drop", "new_listing", "verification", "system", "message"]
+_AUDIT_ACTIONS = ["login", "logout", "view_listing", "create_listing", "update_property", "save_listing"]
+
+# Fixed reference time so timestamps are reproducible for a given seed
+_EPOCH = datetime(2024, 1, 1, tzinfo=timezone.utc)
+_HISTORY_DAYS = 365
+
+_MASK64 = (1 << 64) - 1
+
+
+def _mix(x: int) -> int:
+    """SplitMix64 finalizer: cheap, well-distributed 64-bit integer hash"""
+    x = (x + 0x9E3779B97F4A7C15) & _MASK64
+    x = ((x ^ (x >> 30)) * 0xBF58476D1CE4E5B9) & _MASK64
+    x = ((x ^ (x >> 27)) * 0x94D049BB133111EB) & _MASK64
+    return x ^ (x >> 31)
+
+
+def _unit(seed: int, tag: int, index: int, salt: int = 0) -> float:
+    """Deterministic uniform float in [0, 1) for (seed, tag, index, salt)"""
+    return _mix((seed << 40) ^ (tag << 32) ^ (salt << 48) ^ index) / float(1 << 64)
+
+
+def _weighted_choice(rng: random.Random, weights: Dict[str, float]) -> str:
+    return rng.choices(list(weights), weights=list(weights.values()))[0]
+
+
+def plan_counts(users: int) -> Dict[str, int]:
+    """
+    Derive per-collection document counts from the number of users
+
+    Args:
+        users: Number of users to generate
+
+    Returns:
+        dict: Collection name -> document count
+    """
+    listers = max(1, users // 10)
+    properties = listers * 5
+    return {
+        "users": users,
+        "properties": properties,
+        "listings": int(properties * 0.8),
+        "reviews": properties // 2,
+        "saved_listings": users * 2,
+        "notifications": users * 3,
+        "audit_logs": users * 5,
+    }
+
+
+class DataGenerator:
+    """Deterministic generator for a referentially consistent dataset"""
+
+    def __init__(self, users: int = 1000, seed: int = 42, chunk_size: int = 1000):
+        self.seed = seed
+        self.chunk_size = chunk_size
+        self.counts = plan_counts(users)
+        self.n_listers = max(1, users // 10)
+        self.n_admins = max(1, users // 1000)
+
+    # ==================== IDS AND REFERENCES ====================
+
+    def object_id(self, collection: str, index: int) -> ObjectId:
+        """Deterministic ObjectId for the index-th document of a collection"""
+        created = self.created_at(collection, index)
+        return ObjectId(struct.pack(
+            ">IBHBI",
+            int(created.timestamp()),
+            _COLLECTION_TAGS[collection],
+            self.seed & 0xFFFF,
+            0,
+            index,
+        ))
+
+    def created_at(self, collection: str, index: int) -> datetime:
+        """Creation time spread over the history window, increasing with index"""
+        count = max(1, self.counts[collection])
+        return _EPOCH + timedelta(days=_HISTORY_DAYS * index / count)
+
+    def firebase_uid(self, index: int) -> str:
+        return f"gen{self.seed}_user_{index:08d}"
+
+    def lister_of_property(self, index: int) -> int:
+        """User index of the lister owning a property; skewed towards power listers"""
+        u = _unit(self.seed, _COLLECTION_TAGS["properties"], index, salt=1)
+        return int(self.n_listers * u * u)
+
+    def hot_index(self, collection: str, index: int, salt: int) -> int:
+        """Pick a target document with a heavy-tailed (Zipf-like) popularity"""
+        n = self.counts[collection]
+        u = _unit(self.seed, _COLLECTION_TAGS[collection], index, salt)
+        return min(n - 1, int(n * u ** 3))
+
+    # ==================== DOCUMENT FACTORIES ====================
+
+    def _rng(self, collection: str, index: int) -> random.Random:
+        return random.Random((self.seed << 40) ^ (_COLLECTION_TAGS[collection] << 32) ^ index)
+
+    def make_user(self, i: int) -> Dict[str, Any]:
+        rng = self._rng("users", i)
+        if i < self.n_listers:
+            role = UserRole.LISTER
+        elif i < self.n_listers + self.n_admins:
+            role = UserRole.ADMIN
+        else:
+            role = rng.choice([UserRole.BUYER, UserRole.BUYER, UserRole.RENTER, UserRole.VISITOR])
+        verified = role in (UserRole.LISTER, UserRole.ADMIN) or rng.random() < 0.3
+        created = self.created_at("users", i)
+        return {
+            "_id": self.object_id("users", i),
+            "firebase_uid": self.firebase_uid(i),
+            "email": f"user{i}.{self.seed}@example.com",
+            "name": f"User {i}",
+            "role": role,
+            "phone": f"+1555{i % 10000000:07d}",
+            "verification_status": VerificationStatus.VERIFIED if verified else VerificationStatus.NOT_SUBMITTED,
+            "two_factor_enabled": rng.random() < 0.2,
+            "is_suspended": False,
+            "is_banned": False,
+            "created_at": created,
+            "updated_at": created,
+        }
+
+    def make_property(self, i: int) -> Dict[str, Any]:
+        rng = self._rng("properties", i)
+        city = _weighted_choice(rng, {name: c[4] for name, c in CITIES.items()})
+        state, lat, lon, base_price, _ = CITIES[city]
+        property_type = _weighted_choice(rng, _TYPE_WEIGHTS)
+
+        # Log-normal price skew: most near the city median, a long luxury tail
+        price = round(base_price * _TYPE_PRICE_FACTOR[property_type] * rng.lognormvariate(0, 0.45), -2 if property_type != PropertyType.RENTAL else 0)
+        bedrooms = None if property_type in (PropertyType.LAND, PropertyType.COMMERCIAL) else rng.choice([1, 2, 2, 3, 3, 3, 4, 4, 5])
+        area = round(rng.lognormvariate(math.log(900 + 450 * (bedrooms or 3)), 0.3))
+
+        # Cluster around the city centre (~0.1 degree is roughly 10km)
+        latitude = round(lat + rng.gauss(0, 0.08), 6)
+        longitude = round(lon + rng.gauss(0, 0.08), 6)
+
+        created = self.created_at("properties", i)
+        history = [{"price": price, "changed_at": created, "reason": "Initial listing"}]
+        changed = created
+        for _ in range(rng.choice([0, 0, 0, 1, 1, 2, 3])):
+            changed = changed + timedelta(days=rng.randint(7, 60))
+            price = round(price * rng.uniform(0.9, 1.04), 2)
+            history.append({"price": price, "changed_at": changed, "reason": "Price updated"})
+
+        return {
+            "_id": self.object_id("properties", i),
+            "title": f"{rng.choice(_ADJECTIVES)} {bedrooms or ''}{'BR ' if bedrooms else ''}{property_type.title()} in {city}",
+            "description": f"{rng.choice(_ADJECTIVES)} {property_type} property in {city}, {state} with "
+                           f"{', '.join(rng.sample(_AMENITIES, 2))}.",
+            "property_type": property_type,
+            "current_price": price,
+            "price_history": history,
+            "location": {
+                "street": f"{rng.randint(1, 9999)} {rng.choice(_STREETS)}",
+                "city": city,
+                "state": state,
+                "zip_code": f"{rng.randint(10000, 99999)}",
+                "country": "USA",
+                "latitude": latitude,
+                "longitude": longitude,
+                "geo": {"type": "Point", "coordinates": [longitude, latitude]},
+            },
+            "bedrooms": bedrooms,
+            "bathrooms": None if bedrooms is None else max(1, bedrooms - rng.choice([0, 0.5, 1])),
+            "area_sqft": area,
+            "year_built": rng.randint(1950, 2024),
+            "amenities": rng.sample(_AMENITIES, rng.randint(1, 6)),
+            "images": [f"https://images.example.com/p{i}/{n}.jpg" for n in range(rng.randint(1, 8))],
+            "lister_firebase_uid": self.firebase_uid(self.lister_of_property(i)),
+            "region": geo_cell(latitude, longitude),
+            "created_at": created,
+            "updated_at": changed,
+        }
+
+    def make_listing(self, i: int) -> Dict[str, Any]:
+        # Listing i advertises property i, listed by that property's lister
+        rng = self._rng("listings", i)
+        created = self.created_at("properties", i) + timedelta(hours=rng.randint(1, 72))
+        status = _weighted_choice(rng, {
+            ListingStatus.ACTIVE: 70,
+            ListingStatus.PENDING: 10,
+            ListingStatus.VERIFIED: 8,
+            ListingStatus.EXPIRED: 7,
+            ListingStatus.HIDDEN: 3,
+            ListingStatus.REJECTED: 2,
+        })
+        doc = {
+            "_id": self.object_id("listings", i),
+            "property_id": self.object_id("properties", i),
+            "lister_firebase_uid": self.firebase_uid(self.lister_of_property(i)),
+            "status": status,
+            # Pareto-distributed views: a few hot listings take most traffic
+            "views_count": int(rng.paretovariate(1.2) * 10),
+            "expires_at": created + timedelta(days=90),
+            "created_at": created,
+            "updated_at": created,
+        }
+        if status in (ListingStatus.ACTIVE, ListingStatus.VERIFIED):
+            doc["verified_at"] = created + timedelta(days=1)
+        return doc
+
+    def make_review(self, i: int) -> Dict[str, Any]:
+        rng = self._rng("reviews", i)
+        created = self.created_at("reviews", i)
+        reviewer = self.n_listers + rng.randrange(max(1, self.counts["users"] - self.n_listers))
+        if rng.random() < 0.7:
+            target_type = "property"
+            target_id = str(self.object_id("properties", self.hot_index("properties", i, salt=2)))
+        else:
+            target_type = "lister"
+            target_id = self.firebase_uid(rng.randrange(self.n_listers))
+        return {
+            "_id": self.object_id("reviews", i),
+            "reviewer_firebase_uid": self.firebase_uid(min(reviewer, self.counts["users"] - 1)),
+            "target_type": target_type,
+            "target_id": target_id,
+            "rating": float(min(5, max(1, round(rng.gauss(4.1, 0.9))))),
+            "comment": rng.choice(["Great place", "As described", "Responsive lister", "Needs work", "Loved it"]),
+            "created_at": created,
+            "updated_at": created,
+        }
+
+    def make_saved_listing(self, i: int) -> Dict[str, Any]:
+        # Two saves per user, each pointing at a (popularity-skewed) listing.
+        # The second save is offset so the (user, listing) pair stays unique.
+        user = i // 2
+        listing = self.hot_index("listings", i, salt=3)
+        if i % 2 and listing == self.hot_index("listings", i - 1, salt=3):
+            listing = (listing + 1) % self.counts["listings"]
+        return {
+            "_id": self.object_id("saved_listings", i),
+            "user_firebase_uid": self.firebase_uid(user),
+            "listing_id": self.object_id("listings", listing),
+            "notes": None,
+            "saved_at": self.created_at("saved_listings", i),
+        }
+
+    def make_notification(self, i: int) -> Dict[str, Any]:
+        rng = self._rng("notifications", i)
+        broadcast = rng.random() < 0.02
+        created = self.created_at("notifications", i)
+        return {
+            "_id": self.object_id("notifications", i),
+            "user_firebase_uid": None if broadcast else self.firebase_uid(i // 3),
+            "title": "Announcement" if broadcast else "Update",
+            "message": f"Notification {i}",
+            "notification_type": "system" if broadcast else rng.choice(_NOTIFICATION_TYPES),
+            "is_read": created < _EPOCH + timedelta(days=_HISTORY_DAYS - 30) or rng.random() < 0.4,
+            "created_at": created,
+        }
+
+    def make_audit_log(self, i: int) -> Dict[str, Any]:
+        rng = self._rng("audit_logs", i)
+        action = rng.choice(_AUDIT_ACTIONS)
+        doc = {
+            "_id": self.object_id("audit_logs", i),
+            "user_firebase_uid": self.firebase_uid(i // 5),
+            "action": action,
+            "metadata": {"ip": f"10.{rng.randrange(256)}.{rng.randrange(256)}.{rng.randrange(256)}"},
+            "timestamp": self.created_at("audit_logs", i),
+        }
+        if action in ("view_listing", "save_listing", "create_listing"):
+            doc["resource_type"] = "listing"
+            doc["resource_id"] = str(self.object_id("listings", self.hot_index("listings", i, salt=4)))
+        elif action == "update_property":
+            doc["resource_type"] = "property"
+            doc["resource_id"] = str(self.object_id("properties", rng.randrange(self.counts["properties"])))
+        return doc
+
+    # ==================== STREAMING ====================
+
+    def factory(self, collection: str):
+        return {
+            "users": self.make_user,
+            "properties": self.make_property,
+            "listings": self.make_listing,
+            "reviews": self.make_review,
+            "saved_listings": self.make_saved_listing,
+            "notifications": self.make_notification,
+            "audit_logs": self.make_audit_log,
+        }[collection]
+
+    def num_chunks(self, collection: str) -> int:
+        return -(-self.counts[collection] // self.chunk_size)
+
+    def generate_chunk(self, collection: str, chunk: int) -> List[Dict[str, Any]]:
+        """Generate the documents of one chunk of a collection"""
+        make = self.factory(collection)
+        start = chunk * self.chunk_size
+        stop = min(start + self.chunk_size, self.counts[collection])
+        return [make(i) for i in range(start, stop)]
+
+    def iter_documents(self, collection: str) -> Iterator[Dict[str, Any]]:
+        """Stream every document of a collection without materializing it"""
+        make = self.factory(collection)
+        for i in range(self.counts[collection]):
+            yield make(i)
+
+
+# ==================== LOADING ====================
+
+# Per-process client reused across chunks handled by the same worker
+_worker_db = None
+
+
+def _get_worker_db():
+    global _worker_db
+    if _worker_db is None:
+        from config import get_database
+        _, _worker_db = get_database()
+    return _worker_db
+
+
+def _chunk_key(gen: DataGenerator, collection: str, chunk: int) -> str:
+    return f"{gen.seed}:{gen.counts['users']}:{gen.chunk_size}:{collection}:{chunk}"
+
+
+def load_chunk(db, gen: DataGenerator, collection: str, chunk: int) -> int:
+    """
+    Insert one chunk and record it as done
+
+    Deterministic _ids make re-inserting a partially written chunk safe:
+    duplicate-key errors from an interrupted earlier run are ignored.
+
+    Returns:
+        int: Number of newly inserted documents
+    """
+    docs = gen.generate_chunk(collection, chunk)
+    get_validator(collection).validate_many(docs)
+    inserted = len(docs)
+    try:
+        db[collection].insert_many(docs, ordered=False)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(err.get("code") != 11000 for err in errors):
+            raise
+        inserted = e.details.get("nInserted", 0)
+
+    db[PROGRESS_COLLECTION].update_one(
+        {"_id": _chunk_key(gen, collection, chunk)},
+        {"$set": {"collection": collection, "count": len(docs), "loaded_at": datetime.now(timezone.utc)}},
+        upsert=True,
+    )
+    return inserted
+
+
+def _load_chunk_worker(args) -> int:
+    users, seed, chunk_size, collection, chunk = args
+    gen = DataGenerator(users=users, seed=seed, chunk_size=chunk_size)
+    return load_chunk(_get_worker_db(), gen, collection, chunk)
+
+
+def load_dataset(db, gen: DataGenerator, workers: int = 4, collections: Optional[List[str]] = None) -> Dict[str, int]:
+    """
+    Load a generated dataset with multi-process bulk inserts
+
+    Chunks already recorded in the progress collection are skipped, so an
+    interrupted load can be resumed by calling this again with the same
+    generator parameters.
+
+    Args:
+        db: MongoDB database instance (used for checkpoint lookups)
+        gen: DataGenerator describing the dataset
+        workers: Number of worker processes (1 loads in-process)
+        collections: Subset of collections to load (default: all, in dependency order)
+
+    Returns:
+        dict: Collection name -> number of newly inserted documents
+    """
+    collections = collections or LOAD_ORDER
+    totals = {}
+
+    for collection in collections:
+        prefix = f"{gen.seed}:{gen.counts['users']}:{gen.chunk_size}:{collection}:"
+        done = {
+            int(doc["_id"].rsplit(":", 1)[1])
+            for doc in db[PROGRESS_COLLECTION].find({"_id": {"$regex": f"^{prefix}"}}, {"_id": 1})
+        }
+        pending = [c for c in range(gen.num_chunks(collection)) if c not in done]
+        print(f"Loading '{collection}': {gen.counts[collection]} documents, "
+              f"{len(pending)}/{gen.num_chunks(collection)} chunks pending")
+
+        inserted = 0
+        if workers <= 1:
+            for chunk in pending:
+                inserted += load_chunk(db, gen, collection, chunk)
+        else:
+            tasks = [(gen.counts["users"], gen.seed, gen.chunk_size, collection, c) for c in pending]
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                for future in as_completed([pool.submit(_load_chunk_worker, t) for t in tasks]):
+                    inserted += future.result()
+
+        totals[collection] = inserted
+        print(f"✓ {collection}: {inserted} documents inserted")
+
+    return totals
@@ -0,0 +1,287 @@
+"""
+Columnar Export
+Streams properties and listings to Arrow record batches / Parquet files
+
+Requires pyarrow (optional dependency: pip install pyarrow).
+
+Usage:
+    python export.py properties listings --out exports --workers 4
+    python export.py properties --since 2024-06-01T00:00:00
+"""
+
+import argparse
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, Optional, Tuple
+
+from partitioned_scan import split_id_ranges
+
+
+DEFAULT_BATCH_SIZE = 10000
+
+# Server-side projections: large fields (descriptions, image arrays,
+# price_history) are reduced to the columns the data team needs before they
+# cross the wire. Expressions in find() projections need MongoDB 4.4+.
+PROJECTIONS = {
+    "properties": {
+        "title": 1,
+        "property_type": 1,
+        "current_price": 1,
+        "bedrooms": 1,
+        "bathrooms": 1,
+        "area_sqft": 1,
+        "year_built": 1,
+        "amenities": 1,
+        "region": 1,
+        "location.city": 1,
+        "location.state": 1,
+        "location.zip_code": 1,
+        "location.country": 1,
+        "location.latitude": 1,
+        "location.longitude": 1,
+        "image_count": {"$size": {"$ifNull": ["$images", []]}},
+        "price_changes": {"$size": {"$ifNull": ["$price_history", []]}},
+        "first_price": {"$first": "$price_history.price"},
+        "min_price": {"$min": "$price_history.price"},
+        "max_price": {"$max": "$price_history.price"},
+        "last_price_change_at": {"$max": "$price_history.changed_at"},
+        "created_at": 1,
+        "updated_at": 1,
+    },
+    "listings": {
+        "property_id": 1,
+        "lister_firebase_uid": 1,
+        "status": 1,
+        "views_count": 1,
+        "verified_at": 1,
+        "expires_at": 1,
+        "created_at": 1,
+        "updated_at": 1,
+    },
+}
+
+
+def _import_pyarrow():
+    try:
+        import pyarrow
+        import pyarrow.parquet
+    except ImportError as e:
+        raise ImportError("export.py requires pyarrow: pip install pyarrow") from e
+    return pyarrow
+
+
+def arrow_schema(collection: str):
+    """Explicit Arrow schema per collection so every part file has identical types"""
+    pa = _import_pyarrow()
+    ts = pa.timestamp("ms", tz="UTC")
+    if collection == "properties":
+        return pa.schema([
+            ("_id", pa.string()),
+            ("title", pa.string()),
+            ("property_type", pa.string()),
+            ("current_price", pa.float64()),
+            ("bedrooms", pa.int32()),
+            ("bathrooms", pa.float64()),
+            ("area_sqft", pa.float64()),
+            ("year_built", pa.int32()),
+            ("amenities", pa.list_(pa.string())),
+            ("region", pa.string()),
+            ("city", pa.string()),
+            ("state", pa.string()),
+            ("zip_code", pa.string()),
+            ("country", pa.string()),
+            ("latitude", pa.float64()),
+            ("longitude", pa.float64()),
+            ("image_count", pa.int32()),
+            ("price_changes", pa.int32()),
+            ("first_price", pa.float64()),
+            ("min_price", pa.float64()),
+            ("max_price", pa.float64()),
+            ("last_price_change_at", ts),
+            ("created_at", ts),
+            ("updated_at", ts),
+        ])
+    if collection == "listings":
+        return pa.schema([
+            ("_id", pa.string()),
+            ("property_id", pa.string()),
+            ("lister_firebase_uid", pa.string()),
+            ("status", pa.string()),
+            ("views_count", pa.int64()),
+            ("verified_at", ts),
+            ("expires_at", ts),
+            ("created_at", ts),
+            ("updated_at", ts),
+        ])
+    raise ValueError(f"No export schema for collection {collection!r}")
+
+
+def flatten(collection: str, doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Flatten a projected document into one row"""
+    row = dict(doc)
+    row["_id"] = str(doc["_id"])
+    if collection == "properties":
+        location = row.pop("location", None) or {}
+        for key in ("city", "state", "zip_code", "country", "latitude", "longitude"):
+            row[key] = location.get(key)
+    elif collection == "listings" and doc.get("property_id") is not None:
+        row["property_id"] = str(doc["property_id"])
+    return row
+
+
+def export_query(since: Optional[datetime] = None, id_range: Tuple = (None, None)) -> Dict[str, Any]:
+    query = {}
+    if since is not None:
+        query["updated_at"] = {"$gte": since}
+    low, high = id_range
+    if low is not None or high is not None:
+        query["_id"] = {}
+        if low is not None:
+            query["_id"]["$gte"] = low
+        if high is not None:
+            query["_id"]["$lt"] = high
+    return query
+
+
+def iter_record_batches(db, collection: str, since: Optional[datetime] = None, id_range: Tuple = (None, None),
+                        batch_size: int = DEFAULT_BATCH_SIZE) -> Iterator[Any]:
+    """
+    Stream a collection as Arrow RecordBatches
+
+    Args:
+        db: MongoDB database instance
+        collection: "properties" or "listings"
+        since: Only documents with updated_at >= since (incremental export)
+        id_range: (low, high) half-open _id range for partitioned exports
+        batch_size: Rows per record batch (also the cursor batch size)
+    """
+    pa = _import_pyarrow()
+    schema = arrow_schema(collection)
+    cursor = db[collection].find(
+        export_query(since, id_range), PROJECTIONS[collection], batch_size=batch_size
+    ).sort("_id", 1)
+
+    rows = []
+    for doc in cursor:
+        rows.append(flatten(collection, doc))
+        if len(rows) >= batch_size:
+            yield pa.RecordBatch.from_pylist(rows, schema=schema)
+            rows = []
+    if rows:
+        yield pa.RecordBatch.from_pylist(rows, schema=schema)
+
+
+def _write_partition(db, task) -> Tuple[str, int]:
+    collection, path, since, id_range, batch_size = task
+    pa = _import_pyarrow()
+    rows = 0
+    with pa.parquet.ParquetWriter(path, arrow_schema(collection), compression="zstd") as writer:
+        for batch in iter_record_batches(db, collection, since, id_range, batch_size):
+            writer.write_batch(batch)
+            rows += batch.num_rows
+    return path, rows
+
+
+# Per-process client reused across partitions handled by the same pool worker.
+# Only set inside workers: a MongoClient must not be inherited across fork().
+_worker_db = None
+
+
+def _export_partition(task) -> Tuple[str, int]:
+    global _worker_db
+    if _worker_db is None:
+        from config import get_database
+        _, _worker_db = get_database(ping=False)
+    return _write_partition(_worker_db, task)
+
+
+def run_directory(since: Optional[datetime] = None, now: Optional[datetime] = None) -> str:
+    """Directory name of one export run: full-<run time> or since-<since>-<run time>"""
+    stamp = (now or datetime.now(timezone.utc)).strftime("%Y%m%dT%H%M%SZ")
+    if since is None:
+        return f"full-{stamp}"
+    return f"since-{since.astimezone(timezone.utc).strftime('%Y%m%dT%H%M%SZ')}-{stamp}"
+
+
+def export_collection(db, collection: str, out_dir: str, workers: int = 4, since: Optional[datetime] = None,
+                      batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Export a collection to Parquet part files, one per _id range
+
+    Args:
+        db: MongoDB database instance (used to compute partitions)
+        collection: "properties" or "listings"
+        out_dir: Output directory; files go to out_dir/<collection>/<run>/part-NNNNN.parquet,
+            where <run> is run_directory(since)
+        workers: Worker processes (and partitions)
+        since: Incremental export of documents updated at or after this time
+        batch_size: Rows per record batch
+
+    Returns:
+        dict: {"directory": run directory, "files": [...], "rows": total, "seconds": elapsed}
+    """
+    _import_pyarrow()
+    start = time.perf_counter()
+    # Each run gets its own directory, so an incremental export never overwrites
+    # (or mixes with) the part files of an earlier run. Parts are written to a
+    # hidden staging directory that is renamed into place once all of them exist.
+    target = os.path.join(out_dir, collection, run_directory(since))
+    staging = os.path.join(out_dir, collection, f".{os.path.basename(target)}.tmp")
+    if os.path.exists(target):
+        raise FileExistsError(f"Export run directory {target} already exists")
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    try:
+        ranges = split_id_ranges(db, collection, workers, export_query(since))
+        tasks = [
+            (collection, os.path.join(staging, f"part-{i:05d}.parquet"), since, id_range, batch_size)
+            for i, id_range in enumerate(ranges)
+        ]
+        if workers <= 1 or len(tasks) == 1:
+            results = [_write_partition(db, task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                results = list(pool.map(_export_partition, tasks))
+        os.rename(staging, target)
+    except BaseException:
+        shutil.rmtree(staging, ignore_errors=True)
+        raise
+
+    files = [os.path.join(target, os.path.basename(path)) for path, _ in results]
+    total = sum(rows for _, rows in results)
+    elapsed = time.perf_counter() - start
+    print(f"✓ {collection}: {total} rows in {len(files)} file(s) under {target} "
+          f"({elapsed:.1f}s, {total / max(elapsed, 1e-9):,.0f} rows/s)")
+    return {"directory": target, "files": files, "rows": total, "seconds": elapsed}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export collections to Parquet")
+    parser.add_argument("collections", nargs="+", choices=sorted(PROJECTIONS))
+    parser.add_argument("--out", default="exports", help="output directory")
+    parser.add_argument("--workers", type=int, default=4, help="worker processes / partitions")
+    parser.add_argument("--since", help="ISO timestamp; export documents updated since then")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    args = parser.parse_args()
+
+    since = None
+    if args.since:
+        since = datetime.fromisoformat(args.since)
+        if since.tzinfo is None:
+            since = since.replace(tzinfo=timezone.utc)
+
+    from config import get_database, close_connection
+    client, db = get_database()
+    try:
+        for collection in args.collections:
+            export_collection(db, collection, args.out, args.workers, since, args.batch_size)
+    finally:
+        close_connection(client)
+
+
+if __name__ == "__main__":
+    main()
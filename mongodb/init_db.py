@@ -5,88 +5,170 @@ Creates collections and indexes for the Real Estate Listing Database
 
 from config import get_database, close_connection, get_mongo_client
 from pymongo import ASCENDING, DESCENDING, GEOSPHERE, TEXT  # <-- MODIFIED
+from migrations import sync_indexes, MigrationRunner, default_migrations
+from models import COLLECTIONS_SCHEMA
+from validation import compile_json_schema
+from sharding import enable_sharding
+from storage import collection_storage_engine, index_storage_engine, ensure_collection
+from listing_stats import RETENTION_DAYS
+import argparse
 
-def create_indexes(db):
+# Desired indexes per collection: list of (keys, options).
+# create_indexes() diffs these against list_indexes() and only builds what is missing.
+INDEX_SPECS = {
+    "users": [
+        ([("firebase_uid", ASCENDING)], {"unique": True}),
+        ([("email", ASCENDING)], {}),
+        ([("role", ASCENDING)], {}),
+    ],
+    "properties": [
+        # property_id unique index removed (using _id)
+        ([("property_type", ASCENDING)], {}),
+        ([("current_price", ASCENDING)], {}),
+        # City/state search filters: their case-insensitive regexes are matched
+        # against index keys, so only matching properties are fetched
+        ([("location.city", ASCENDING), ("location.state", ASCENDING)], {}),
+        ([("bedrooms", ASCENDING)], {}),
+        # Geospatial index (Suggestion 1)
+        ([("location.geo", GEOSPHERE)], {}),
+        # Full-text search index (Suggestion 5)
+        # Title matches rank above description matches
+        ([("title", TEXT), ("description", TEXT)], {"weights": {"title": 10, "description": 2}}),
+        # Shard key for properties (see sharding.py)
+        ([("region", ASCENDING), ("_id", ASCENDING)], {}),
+        # Recent price changes (market analytics)
+        ([("price_history.changed_at", ASCENDING)], {}),
+        # Incremental exports / change polling
+        ([("updated_at", ASCENDING)], {}),
+    ],
+    "listings": [
+        ([("property_id", ASCENDING)], {}),
+        ([("lister_firebase_uid", ASCENDING)], {}),
+        ([("status", ASCENDING)], {}),
+        ([("updated_at", ASCENDING)], {}),
+        # Archival of expired/rejected listings (cascade.archive_stale)
+        ([("status", ASCENDING), ("updated_at", ASCENDING)], {}),
+    ],
+    "verification_documents": [
+        ([("user_firebase_uid", ASCENDING)], {}),
+        ([("status", ASCENDING)], {}),
+    ],
+    "saved_listings": [
+        ([("user_firebase_uid", ASCENDING)], {}),
+        ([("user_firebase_uid", ASCENDING), ("listing_id", ASCENDING)], {"unique": True}),
+        # Cascades from deleted listings
+        ([("listing_id", ASCENDING)], {}),
+    ],
+    "property_comparisons": [
+        ([("user_firebase_uid", ASCENDING)], {}),
+        ([("property_ids", ASCENDING)], {}),
+    ],
+    "reviews": [
+        ([("reviewer_firebase_uid", ASCENDING)], {}),
+        ([("target_id", ASCENDING)], {}),
+        ([("target_type", ASCENDING), ("target_id", ASCENDING)], {}),
+    ],
+    "notifications": [
+        # A user's notifications (and broadcasts, user_firebase_uid null) newest first
+        ([("user_firebase_uid", ASCENDING), ("created_at", DESCENDING)], {}),
+        # Archival of old notifications (cascade.archive_stale)
+        ([("created_at", ASCENDING)], {}),
+    ],
+    "audit_logs": [
+        # A user's audit trail newest first
+        ([("user_firebase_uid", ASCENDING), ("timestamp", DESCENDING)], {}),
+        ([("timestamp", ASCENDING)], {}),
+        ([("action", ASCENDING)], {}),
+    ],
+    "saved_searches": [
+        # Reverse index: property keys -> candidate saved searches
+        ([("match_keys", ASCENDING)], {"partialFilterExpression": {"is_active": True}}),
+        ([("user_firebase_uid", ASCENDING), ("filters_key", ASCENDING)], {"unique": True}),
+        # get_saved_searches: a user's searches newest first
+        ([("user_firebase_uid", ASCENDING), ("created_at", DESCENDING)], {}),
+    ],
+    "conversations": [
+        ([("participants", ASCENDING)], {}),
+    ],
+    "message_buckets": [
+        # One bucket per (conversation, seq); newest page = highest seq
+        ([("conversation_id", ASCENDING), ("seq", DESCENDING)], {"unique": True}),
+    ],
+    "user_conversations": [
+        # Inbox: a user's conversations, most recent first
+        ([("user_firebase_uid", ASCENDING), ("last_message_at", DESCENDING)], {}),
+    ],
+    "listing_view_stats": [
+        # A listing's daily buckets in date order (get_listing_view_stats, cascades)
+        ([("listing_id", ASCENDING), ("day", ASCENDING)], {}),
+        # Trending refresh scans recent days; buckets expire after RETENTION_DAYS
+        ([("day", ASCENDING)], {"expireAfterSeconds": RETENTION_DAYS * 86400}),
+    ],
+    "counter_shards": [
+        ([("counter", ASCENDING), ("resource_id", ASCENDING)], {}),
+    ],
+    "market_stats": [
+        ([("city", ASCENDING), ("property_type", ASCENDING), ("bucket", ASCENDING)], {}),
+    ],
+}
+
+def create_indexes(db, workers=4, rebuild_changed=False):
     """
     Create all database indexes for optimized querying
     
+    Only indexes missing from the collection are built; collections are
+    processed concurrently.
+    
     Args:
         db: MongoDB database instance
+        workers: Maximum number of collections indexed at once
+        rebuild_changed: Drop and rebuild indexes whose options changed
     """
     print("\n=== Creating Database Indexes ===\n")
+    # Prefix compression is set per index at build time (storage.py)
+    specs = {
+        collection: [(keys, {**options, "storageEngine": index_storage_engine(collection)}) for keys, options in indexes]
+        for collection, indexes in INDEX_SPECS.items()
+    }
+    sync_indexes(db, specs, workers=workers, rebuild_changed=rebuild_changed)
+    print("\n=== All indexes created successfully! ===\n")
+
+def apply_validators(db, level="moderate", action="error"):
+    """
+    Apply $jsonSchema validators compiled from COLLECTIONS_SCHEMA
     
-    # Users Collection Indexes
-    print("Creating indexes for 'users' collection...")
-    db.users.create_index("firebase_uid", unique=True)
-    db.users.create_index("email")
-    db.users.create_index("role")
-    print("✓ Users indexes created")
-    
-    # Properties Collection Indexes
-    print("Creating indexes for 'properties' collection...")
-    # db.properties.create_index("property_id", unique=True) # <-- REMOVED (using _id)
-    db.properties.create_index("property_type")
-    db.properties.create_index("current_price")
-    # db.properties.create_index([("location.city", ASCENDING), ("location.state", ASCENDING)]) # <-- REMOVED
-    
-    # ADDED: Geospatial index (Suggestion 1)
-    db.properties.create_index([("location.geo", GEOSPHERE)]) 
-    
-    # ADDED: Full-text search index (Suggestion 5)
-    db.properties.create_index([("title", TEXT), ("description", TEXT)]) 
-    
-    print("✓ Properties indexes created")
-    
-    # Listings Collection Indexes
-    print("Creating indexes for 'listings' collection...")
-    # db.listings.create_index("listing_id", unique=True) # <-- REMOVED (using _id)
-    db.listings.create_index("property_id")
-    db.listings.create_index("lister_firebase_uid")
-    db.listings.create_index("status")
-    print("✓ Listings indexes created")
-    
-    # Verification Documents Collection Indexes
-    print("Creating indexes for 'verification_documents' collection...")
-    # db.verification_documents.create_index("document_id", unique=True) # <-- REMOVED (using _id)
-    db.verification_documents.create_index("user_firebase_uid")
-    db.verification_documents.create_index("status")
-    print("✓ Verification documents indexes created")
-    
-    # Saved Listings Collection Indexes
-    print("Creating indexes for 'saved_listings' collection...")
-    # db.saved_listings.create_index("saved_id", unique=True) # <-- REMOVED (using _id)
-    db.saved_listings.create_index("user_firebase_uid")
-    db.saved_listings.create_index([("user_firebase_uid", ASCENDING), ("listing_id", ASCENDING)], unique=True)
-    print("✓ Saved listings indexes created")
-    
-    # Property Comparisons Collection Indexes
-    print("Creating indexes for 'property_comparisons' collection...")
-    # db.property_comparisons.create_index("comparison_id", unique=True) # <-- REMOVED (using _id)
-    db.property_comparisons.create_index("user_firebase_uid")
-    print("✓ Property comparisons indexes created")
-    
-    # Reviews Collection Indexes
-    print("Creating indexes for 'reviews' collection...")
-    # db.reviews.create_index("review_id", unique=True) # <-- REMOVED (using _id)
-    db.reviews.create_index("target_id")
-    db.reviews.create_index([("target_type", ASCENDING), ("target_id", ASCENDING)])
-    print("✓ Reviews indexes created")
-    
-    # Notifications Collection Indexes
-    print("Creating indexes for 'notifications' collection...")
-    # db.notifications.create_index("notification_id", unique=True) # <-- REMOVED (using _id)
-    db.notifications.create_index("user_firebase_uid")
-    print("✓ Notifications indexes created")
+    Args:
+        db: MongoDB database instance
+        level: validationLevel ("moderate" leaves existing invalid documents updatable)
+        action: validationAction ("error" rejects, "warn" only logs)
+    """
+    print("\n=== Applying Schema Validators ===\n")
+    existing = set(db.list_collection_names())
+    for collection in COLLECTIONS_SCHEMA:
+        validator = compile_json_schema(collection)
+        if collection in existing:
+            db.command("collMod", collection, validator=validator,
+                       validationLevel=level, validationAction=action)
+        else:
+            db.create_collection(collection, validator=validator,
+                                 validationLevel=level, validationAction=action,
+                                 storageEngine=collection_storage_engine(collection))
+        print(f"✓ {collection} validator applied")
+
+def apply_storage_options(db):
+    """
+    Create the remaining indexed collections with their block compressor
     
-    # Audit Logs Collection Indexes
-    print("Creating indexes for 'audit_logs' collection...")
-    # db.audit_logs.create_index("log_id", unique=True) # <-- REMOVED (using _id)
-    db.audit_logs.create_index("user_firebase_uid")
-    db.audit_logs.create_index("timestamp")
-    db.audit_logs.create_index("action")
-    print("✓ Audit logs indexes created")
+    Schema collections are created by apply_validators. Compression settings
+    only apply at creation; existing collections are left unchanged.
     
-    print("\n=== All indexes created successfully! ===\n")
+    Args:
+        db: MongoDB database instance
+    """
+    print("\n=== Applying Storage Options ===\n")
+    for collection in INDEX_SPECS:
+        if collection not in COLLECTIONS_SCHEMA and ensure_collection(db, collection):
+            print(f"✓ {collection} created ({collection_storage_engine(collection)['wiredTiger']['configString']})")
 
 def list_collections(db):
     """
@@ -99,23 +181,33 @@ def list_collections(db):
     collections = db.list_collection_names()
     if collections:
         for i, collection in enumerate(collections, 1):
-            count = db[collection].count_documents({})
-            print(f"{i}. {collection} ({count} documents)")
+            # Metadata-based count: avoids a full scan per collection
+            count = db[collection].estimated_document_count()
+            print(f"{i}. {collection} (~{count} documents)")
     else:
         print("No collections found")
     print()
 
-def initialize_database():
+def initialize_database(sharded=False):
     """
     Main function to initialize the database
+    
+    Args:
+        sharded: Also enable sharding with the keys in sharding.SHARD_KEYS
+                 (requires connecting to a mongos)
     """
     print("=== MongoDB Database Initialization ===")
     print("Real Estate Listing Database\n")
     
     client, db = get_database() # <-- MODIFIED
     
-    # Create indexes
+    # Create indexes, validators and apply pending migrations
+    apply_validators(db)
+    apply_storage_options(db)
     create_indexes(db)
+    MigrationRunner(db, default_migrations()).run()
+    if sharded:
+        enable_sharding(client, db)
     
     # List collections
     list_collections(db)
@@ -126,4 +218,7 @@ def initialize_database():
     print("✓ Database initialization complete!")
 
 if __name__ == "__main__":
-    initialize_database()
+    parser = argparse.ArgumentParser(description="Initialize the Real Estate database")
+    parser.add_argument("--sharded", action="store_true", help="enable sharding (run against mongos)")
+    args = parser.parse_args()
+    initialize_database(sharded=args.sharded)
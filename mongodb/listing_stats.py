@@ -0,0 +1,292 @@
+"""
+Listing View Statistics
+Per-listing daily view buckets and precomputed trending lists
+
+Views are counted in memory by a ViewRecorder and written as one $inc
+upsert per (listing, day) per flush, so a popular listing costs one write
+per flush interval rather than one per view. Each bucket document holds a
+day's total and hourly counts; a year of daily stats for a listing is at
+most 365 small documents, read with one indexed range query.
+
+refresh_trending() sums the buckets of the last 1, 7 and 30 days and
+stores the top active listings of each window in listing_trending, so
+get_trending_listings() is a single read by _id.
+
+Usage:
+    python listing_stats.py            # refresh listing_trending (run e.g. every 10 minutes)
+"""
+
+import threading
+import time
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+from pymongo import ReplaceOne, UpdateOne
+from pymongo.errors import BulkWriteError
+
+from models import ListingStatus
+
+VIEW_STATS_COLLECTION = "listing_view_stats"
+TRENDING_COLLECTION = "listing_trending"
+
+# Window name -> days; listing_trending has one document per window
+TRENDING_WINDOWS = {"1d": 1, "7d": 7, "30d": 30}
+DEFAULT_TOP_N = 100
+# Buckets expire after this many days (TTL index on day)
+RETENTION_DAYS = 400
+
+
+def day_start(at: datetime) -> datetime:
+    """Midnight UTC of the day containing `at`"""
+    if at.tzinfo is not None:
+        at = at.astimezone(timezone.utc)
+    return datetime(at.year, at.month, at.day, tzinfo=timezone.utc)
+
+
+def bucket_id(listing_id: Any, day: datetime) -> str:
+    return f"{listing_id}:{day:%Y-%m-%d}"
+
+
+class ViewRecorder:
+    """
+    Buffers listing views and flushes them as batched bucket upserts
+
+    A flush happens when max_pending (listing, day, hour) counters are
+    buffered, when flush_interval seconds have passed since the last flush
+    (checked on record and by the optional background thread), and on flush().
+    Views buffered when the process dies are lost; the buffer is bounded by
+    flush_interval.
+
+    Args:
+        db: MongoDB database instance
+        flush_interval: Seconds between flushes
+        max_pending: Buffered counters that trigger an immediate flush
+    """
+
+    def __init__(self, db, flush_interval: float = 5.0, max_pending: int = 1000):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_pending = max_pending
+        self._pending: Dict[Tuple[Any, datetime, int], int] = {}
+        self._last_flush = time.monotonic()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self.stats = {"views": 0, "flushes": 0, "upserts": 0}
+
+    def record(self, listing_id: Any, at: Optional[datetime] = None, count: int = 1) -> None:
+        """Count `count` views of a listing at `at` (default: now)"""
+        at = (at or datetime.now(timezone.utc)).astimezone(timezone.utc)
+        key = (listing_id, day_start(at), at.hour)
+        with self._lock:
+            self._pending[key] = self._pending.get(key, 0) + count
+            self.stats["views"] += count
+            due = (len(self._pending) >= self.max_pending
+                   or time.monotonic() - self._last_flush >= self.flush_interval)
+        if due:
+            self.flush()
+
+    def pending(self, listing_id: Any) -> Dict[datetime, int]:
+        """Buffered (not yet written) views of a listing per day"""
+        with self._lock:
+            days: Dict[datetime, int] = {}
+            for (lid, day, _), count in self._pending.items():
+                if lid == listing_id:
+                    days[day] = days.get(day, 0) + count
+            return days
+
+    def flush(self) -> int:
+        """
+        Write buffered views: one upsert per (listing, day)
+
+        Returns:
+            int: Number of bucket documents upserted
+        """
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+                self._last_flush = time.monotonic()
+            if not pending:
+                return 0
+
+            buckets: Dict[Tuple[Any, datetime], Dict[str, int]] = {}
+            for (listing_id, day, hour), count in pending.items():
+                inc = buckets.setdefault((listing_id, day), {"views": 0})
+                inc["views"] += count
+                inc[f"hours.{hour}"] = inc.get(f"hours.{hour}", 0) + count
+
+            keys = list(buckets)
+            ops = [
+                UpdateOne(
+                    {"_id": bucket_id(listing_id, day)},
+                    {"$inc": buckets[(listing_id, day)], "$setOnInsert": {"listing_id": listing_id, "day": day}},
+                    upsert=True
+                )
+                for listing_id, day in keys
+            ]
+            try:
+                self.db[VIEW_STATS_COLLECTION].bulk_write(ops, ordered=False)
+            except BulkWriteError as e:
+                # Unordered: every op not listed in writeErrors was applied; retry only the failed buckets
+                failed = {keys[error["index"]] for error in e.details.get("writeErrors", [])}
+                self._requeue({key: count for key, count in pending.items() if key[:2] in failed})
+                raise
+            except Exception:
+                # Outcome unknown (e.g. connection lost): put the views back so the next flush retries them
+                self._requeue(pending)
+                raise
+            self.stats["flushes"] += 1
+            self.stats["upserts"] += len(ops)
+            return len(ops)
+
+    def _requeue(self, pending: Dict[Tuple[Any, datetime, int], int]) -> None:
+        with self._lock:
+            for key, count in pending.items():
+                self._pending[key] = self._pending.get(key, 0) + count
+
+    def start(self) -> "ViewRecorder":
+        """Flush every flush_interval seconds in a background (daemon) thread"""
+        def loop():
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception as e:
+                    print(f"✗ View stats flush failed: {e}")
+
+        self._thread = threading.Thread(target=loop, name="listing-view-stats", daemon=True)
+        self._thread.start()
+        return self
+
+    def close(self) -> None:
+        """Stop the background thread and write what is buffered"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        self.flush()
+
+
+# ==================== QUERIES ====================
+
+def view_stats(db, listing_id: Any, start: datetime, end: datetime,
+               pending: Optional[Dict[datetime, int]] = None) -> Dict[str, Any]:
+    """
+    Daily views of a listing between start and end (inclusive days)
+
+    Returns:
+        dict: {"listing_id", "start", "end", "total", "daily": [{"day", "views"}]}
+              with a zero entry for days without views
+    """
+    first, last = day_start(start), day_start(end)
+    views = {
+        day_start(doc["day"]): doc["views"]
+        for doc in db[VIEW_STATS_COLLECTION].find(
+            {"listing_id": listing_id, "day": {"$gte": first, "$lte": last}},
+            {"day": 1, "views": 1, "_id": 0}
+        )
+    }
+    for day, count in (pending or {}).items():
+        if first <= day <= last:
+            views[day] = views.get(day, 0) + count
+
+    daily, day = [], first
+    while day <= last:
+        daily.append({"day": day, "views": views.get(day, 0)})
+        day += timedelta(days=1)
+    return {
+        "listing_id": listing_id,
+        "start": first,
+        "end": last,
+        "total": sum(entry["views"] for entry in daily),
+        "daily": daily,
+    }
+
+
+def refresh_trending(db, windows: Optional[Dict[str, int]] = None, top_n: int = DEFAULT_TOP_N,
+                     now: Optional[datetime] = None) -> Dict[str, int]:
+    """
+    Recompute the top listings by views for each rolling window
+
+    One aggregation over the buckets of the longest window sums every window
+    per listing; only active listings are kept.
+
+    Args:
+        db: MongoDB database instance
+        windows: Window name -> days (default TRENDING_WINDOWS)
+        top_n: Listings stored per window
+        now: End of the windows (default: now); today's partial day is included
+
+    Returns:
+        dict: Window name -> listings stored
+    """
+    windows = windows or TRENDING_WINDOWS
+    now = now or datetime.now(timezone.utc)
+    today = day_start(now)
+    starts = {name: today - timedelta(days=days - 1) for name, days in windows.items()}
+
+    totals = list(db[VIEW_STATS_COLLECTION].aggregate([
+        {"$match": {"day": {"$gte": min(starts.values())}}},
+        {"$group": {"_id": "$listing_id", **{
+            name: {"$sum": {"$cond": [{"$gte": ["$day", start]}, "$views", 0]}}
+            for name, start in starts.items()
+        }}},
+    ], allowDiskUse=True))
+
+    active = _active(db, [doc["_id"] for doc in totals])
+    totals = [doc for doc in totals if doc["_id"] in active]
+
+    ops, stored = [], {}
+    for name, days in windows.items():
+        ranked = sorted((doc for doc in totals if doc[name] > 0), key=lambda doc: doc[name], reverse=True)[:top_n]
+        stored[name] = len(ranked)
+        ops.append(ReplaceOne({"_id": name}, {
+            "window_days": days,
+            "start": starts[name],
+            "listings": [{**active[doc["_id"]], "views": doc[name]} for doc in ranked],
+            "computed_at": now,
+        }, upsert=True))
+    db[TRENDING_COLLECTION].bulk_write(ops, ordered=False)
+    print(f"✓ listing_trending refreshed: {stored}")
+    return stored
+
+
+def _active(db, listing_ids: Iterable[Any], batch_size: int = 10000) -> Dict[Any, Dict[str, Any]]:
+    """Summaries of the active listings among listing_ids"""
+    listing_ids = list(listing_ids)
+    summaries = {}
+    for lo in range(0, len(listing_ids), batch_size):
+        for doc in db.listings.find(
+            {"_id": {"$in": listing_ids[lo:lo + batch_size]}, "status": ListingStatus.ACTIVE},
+            {"property_id": 1, "lister_firebase_uid": 1, "price": 1, "listing_type": 1}
+        ):
+            summaries[doc["_id"]] = {
+                "listing_id": doc["_id"],
+                "property_id": doc.get("property_id"),
+                "lister_firebase_uid": doc.get("lister_firebase_uid"),
+                "price": doc.get("price"),
+                "listing_type": doc.get("listing_type"),
+            }
+    return summaries
+
+
+def trending(db, window: str = "7d", limit: int = 20) -> List[Dict[str, Any]]:
+    """Stored trending listings of a window, most viewed first"""
+    if window not in TRENDING_WINDOWS:
+        raise ValueError(f"Unknown trending window {window!r} (expected one of {', '.join(TRENDING_WINDOWS)})")
+    doc = db[TRENDING_COLLECTION].find_one({"_id": window}, {"listings": {"$slice": limit}})
+    return doc["listings"] if doc else []
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import get_database, close_connection
+
+    parser = argparse.ArgumentParser(description="Recompute trending listings from daily view buckets")
+    parser.add_argument("--top", type=int, default=DEFAULT_TOP_N, help="listings stored per window")
+    args = parser.parse_args()
+
+    client, db = get_database()
+    try:
+        refresh_trending(db, top_n=args.top)
+    finally:
+        close_connection(client)
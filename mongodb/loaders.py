@@ -0,0 +1,177 @@
+"""
+Request-Scoped Batch Loaders
+DataLoader-style coalescing of id lookups into one $in query per collection
+
+Create one RequestLoaders per web request. Lookups issued before the first
+result is needed are collected, deduplicated and resolved together; results
+are memoized for the rest of the request.
+
+    loaders = RequestLoaders(db_ops)
+    user = loaders.users.load(uid)           # no query yet
+    props = loaders.properties.load_many(ids)
+    user.get()                               # one $in query for all pending users
+    [p.get() for p in props]                 # one $in query for all pending properties
+
+    # asyncio: lookups awaited in the same event-loop tick share one query
+    aloaders = AsyncRequestLoaders(db_ops)
+    user, prop = await asyncio.gather(aloaders.users.load(uid), aloaders.properties.load(pid))
+"""
+
+import asyncio
+from typing import Any, Callable, Dict, Hashable, Iterable, List, Optional, Set
+
+from bson.objectid import ObjectId
+
+
+class Deferred:
+    """Placeholder for a value resolved by its loader's next batch"""
+
+    __slots__ = ("_loader", "_key")
+
+    def __init__(self, loader: "BatchLoader", key: Hashable):
+        self._loader = loader
+        self._key = key
+
+    def get(self) -> Optional[Dict[str, Any]]:
+        """Return the document (None if not found), dispatching the batch if needed"""
+        return self._loader._resolve(self._key)
+
+
+class BatchLoader:
+    """
+    Synchronous batching loader
+
+    Args:
+        batch_fn: Takes a list of keys and returns {key: document}
+        normalize: Maps caller keys to the keys used by batch_fn results
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Dict[Hashable, Any]],
+                 normalize: Callable[[Any], Hashable] = None):
+        self.batch_fn = batch_fn
+        self.normalize = normalize or (lambda key: key)
+        self._cache: Dict[Hashable, Any] = {}
+        self._pending: Dict[Hashable, None] = {}  # insertion-ordered set
+        self.batches = 0
+
+    def load(self, key: Any) -> Deferred:
+        key = self.normalize(key)
+        if key not in self._cache:
+            self._pending[key] = None
+        return Deferred(self, key)
+
+    def load_many(self, keys: Iterable[Any]) -> List[Deferred]:
+        return [self.load(key) for key in keys]
+
+    def prime(self, key: Any, value: Any) -> None:
+        """Seed the cache with a document already fetched elsewhere"""
+        self._cache[self.normalize(key)] = value
+
+    def clear(self, key: Any = None) -> None:
+        """Forget one key (e.g. after updating it) or the whole cache"""
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(self.normalize(key), None)
+
+    def dispatch(self) -> None:
+        """Resolve every pending key with a single batch call"""
+        if not self._pending:
+            return
+        keys = list(self._pending)
+        self._pending.clear()
+        found = self.batch_fn(keys)
+        self.batches += 1
+        for key in keys:
+            self._cache[key] = found.get(key)
+
+    def _resolve(self, key: Hashable) -> Any:
+        if key not in self._cache:
+            self._pending[key] = None
+            self.dispatch()
+        return self._cache[key]
+
+
+class AsyncBatchLoader:
+    """
+    asyncio batching loader
+
+    Keys requested during one event-loop tick are resolved together; the
+    blocking batch_fn runs in the default executor.
+    """
+
+    def __init__(self, batch_fn: Callable[[List[Hashable]], Dict[Hashable, Any]],
+                 normalize: Callable[[Any], Hashable] = None):
+        self.batch_fn = batch_fn
+        self.normalize = normalize or (lambda key: key)
+        self._cache: Dict[Hashable, "asyncio.Future"] = {}
+        self._pending: Dict[Hashable, "asyncio.Future"] = {}
+        self._scheduled = False
+        # The event loop only keeps weak references to tasks
+        self._pending_tasks: Set["asyncio.Task"] = set()
+        self.batches = 0
+
+    def load(self, key: Any) -> "asyncio.Future":
+        key = self.normalize(key)
+        future = self._cache.get(key)
+        if future is not None:
+            return future
+
+        loop = asyncio.get_running_loop()
+        future = self._cache[key] = loop.create_future()
+        self._pending[key] = future
+        if not self._scheduled:
+            self._scheduled = True
+            loop.call_soon(self._start_dispatch, loop)
+        return future
+
+    async def load_many(self, keys: Iterable[Any]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def clear(self, key: Any = None) -> None:
+        if key is None:
+            self._cache.clear()
+        else:
+            self._cache.pop(self.normalize(key), None)
+
+    def _start_dispatch(self, loop: "asyncio.AbstractEventLoop") -> None:
+        task = loop.create_task(self._dispatch())
+        self._pending_tasks.add(task)
+        task.add_done_callback(self._pending_tasks.discard)
+
+    async def _dispatch(self) -> None:
+        pending, self._pending = self._pending, {}
+        self._scheduled = False
+        try:
+            found = await asyncio.get_running_loop().run_in_executor(None, self.batch_fn, list(pending))
+        except Exception as e:
+            for key, future in pending.items():
+                self._cache.pop(key, None)
+                if not future.done():
+                    future.set_exception(e)
+            return
+        self.batches += 1
+        for key, future in pending.items():
+            if not future.done():
+                future.set_result(found.get(key))
+
+
+def _object_id(value: Any) -> ObjectId:
+    return value if isinstance(value, ObjectId) else ObjectId(value)
+
+
+class RequestLoaders:
+    """Per-request loaders for users, properties and listings"""
+
+    loader_class = BatchLoader
+
+    def __init__(self, db_ops):
+        self.users = self.loader_class(db_ops.get_users_by_firebase_uids)
+        self.properties = self.loader_class(db_ops.get_properties_by_ids, normalize=_object_id)
+        self.listings = self.loader_class(db_ops.get_listings_by_ids, normalize=_object_id)
+
+
+class AsyncRequestLoaders(RequestLoaders):
+    """asyncio variant of RequestLoaders"""
+
+    loader_class = AsyncBatchLoader
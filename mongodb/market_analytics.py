@@ -0,0 +1,179 @@
+"""
+Market Analytics
+Aggregation pipelines over properties and their embedded price_history
+
+Percentiles use $percentile/$median, which require MongoDB 7.0+;
+time bucketing uses $dateTrunc (MongoDB 5.0+).
+"""
+
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+# Materialized trend buckets and the watermark of the last refresh
+MARKET_STATS_COLLECTION = "market_stats"
+_WATERMARK_ID = "_watermark"
+
+_PERCENTILE = {"method": "approximate"}
+
+
+def _price_per_sqft(price_expr: str) -> Dict[str, Any]:
+    return {"$divide": [price_expr, "$area_sqft"]}
+
+
+def _scope_match(city: Optional[str] = None, property_type: Optional[str] = None) -> Dict[str, Any]:
+    match = {"area_sqft": {"$gt": 0}}
+    if city:
+        match["location.city"] = city
+    if property_type:
+        match["property_type"] = property_type
+    return match
+
+
+def price_per_sqft_pipeline(group_by_type: bool = True, city: Optional[str] = None,
+                            property_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """Current price per sqft (median, p25, p75, mean) by city (and type)"""
+    group_id = {"city": "$location.city"}
+    if group_by_type:
+        group_id["property_type"] = "$property_type"
+    return [
+        {"$match": {**_scope_match(city, property_type), "current_price": {"$gt": 0}}},
+        {"$project": {
+            "location.city": 1,
+            "property_type": 1,
+            "ppsf": _price_per_sqft("$current_price"),
+        }},
+        {"$group": {
+            "_id": group_id,
+            "count": {"$sum": 1},
+            "mean": {"$avg": "$ppsf"},
+            "median": {"$median": {"input": "$ppsf", **_PERCENTILE}},
+            "quartiles": {"$percentile": {"input": "$ppsf", "p": [0.25, 0.75], **_PERCENTILE}},
+        }},
+        {"$sort": {"_id.city": 1, "_id.property_type": 1}},
+    ]
+
+
+def price_drop_pipeline(since: datetime, min_drop_pct: float = 5.0, limit: int = 100) -> List[Dict[str, Any]]:
+    """
+    Properties whose price fell by at least min_drop_pct since `since`
+
+    The reference price is the last price_history entry before `since`
+    (properties first listed inside the window are compared with their
+    initial price).
+    """
+    return [
+        # Multikey index on price_history.changed_at limits this to recently changed properties
+        {"$match": {"price_history.changed_at": {"$gte": since}}},
+        {"$project": {
+            "title": 1,
+            "location.city": 1,
+            "property_type": 1,
+            "current_price": 1,
+            "before": {"$ifNull": [
+                {"$last": {"$filter": {
+                    "input": "$price_history",
+                    "cond": {"$lt": ["$$this.changed_at", since]},
+                }}},
+                {"$first": "$price_history"},
+            ]},
+        }},
+        # A zero reference price has no defined drop and would fail $divide
+        {"$match": {"before.price": {"$gt": 0}}},
+        {"$set": {
+            "previous_price": "$before.price",
+            "drop_pct": {"$multiply": [
+                100,
+                {"$divide": [{"$subtract": ["$before.price", "$current_price"]}, "$before.price"]},
+            ]},
+        }},
+        {"$match": {"drop_pct": {"$gte": min_drop_pct}}},
+        {"$project": {"before": 0}},
+        {"$sort": {"drop_pct": -1}},
+        {"$limit": limit},
+    ]
+
+
+def price_trend_pipeline(start: datetime, unit: str = "month", city: Optional[str] = None,
+                         property_type: Optional[str] = None) -> List[Dict[str, Any]]:
+    """
+    Time-bucketed price-per-sqft percentiles from price_history events
+
+    Each price_history entry (initial listing or change) contributes one
+    observation to the bucket containing its changed_at.
+    """
+    return [
+        {"$match": {**_scope_match(city, property_type), "price_history.changed_at": {"$gte": start}}},
+        {"$project": {"location.city": 1, "property_type": 1, "area_sqft": 1, "price_history": 1}},
+        {"$unwind": "$price_history"},
+        {"$match": {"price_history.changed_at": {"$gte": start}}},
+        {"$group": {
+            "_id": {
+                "city": "$location.city",
+                "property_type": "$property_type",
+                "bucket": {"$dateTrunc": {"date": "$price_history.changed_at", "unit": unit}},
+            },
+            "count": {"$sum": 1},
+            "median": {"$median": {"input": _price_per_sqft("$price_history.price"), **_PERCENTILE}},
+            "percentiles": {"$percentile": {
+                "input": _price_per_sqft("$price_history.price"),
+                "p": [0.1, 0.25, 0.75, 0.9],
+                **_PERCENTILE,
+            }},
+        }},
+        {"$sort": {"_id.bucket": 1, "_id.city": 1}},
+    ]
+
+
+def _month_start(dt: datetime) -> datetime:
+    return dt.replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+
+
+def refresh_market_stats(db, full: bool = False, months: int = 12) -> Dict[str, Any]:
+    """
+    Incrementally materialize monthly trend buckets into market_stats
+
+    Only months touched by price changes since the previous refresh are
+    recomputed (a month is recomputed as a whole, so buckets stay exact);
+    older buckets are left as they are.
+
+    Args:
+        db: MongoDB database instance
+        full: Recompute the last `months` months regardless of the watermark
+        months: History window for a full refresh
+
+    Returns:
+        dict: {"from": bucket start recomputed, "buckets": count written}
+    """
+    stats = db[MARKET_STATS_COLLECTION]
+    now = datetime.now(timezone.utc)
+    watermark = None if full else (stats.find_one({"_id": _WATERMARK_ID}) or {}).get("refreshed_at")
+
+    if watermark is None:
+        start = _month_start(now - timedelta(days=31 * months))
+    else:
+        # Months containing a change since the last refresh
+        changed = list(db.properties.aggregate([
+            {"$match": {"price_history.changed_at": {"$gte": watermark}}},
+            {"$unwind": "$price_history"},
+            {"$match": {"price_history.changed_at": {"$gte": watermark}}},
+            {"$group": {"_id": None, "first": {"$min": "$price_history.changed_at"}}},
+        ]))
+        if not changed:
+            stats.update_one({"_id": _WATERMARK_ID}, {"$set": {"refreshed_at": now}}, upsert=True)
+            return {"from": None, "buckets": 0}
+        start = _month_start(changed[0]["first"])
+
+    pipeline = price_trend_pipeline(start, unit="month") + [
+        {"$set": {
+            "city": "$_id.city",
+            "property_type": "$_id.property_type",
+            "bucket": "$_id.bucket",
+            "refreshed_at": now,
+        }},
+        {"$merge": {"into": MARKET_STATS_COLLECTION, "on": "_id", "whenMatched": "replace", "whenNotMatched": "insert"}},
+    ]
+    db.properties.aggregate(pipeline, allowDiskUse=True)
+    stats.update_one({"_id": _WATERMARK_ID}, {"$set": {"refreshed_at": now}}, upsert=True)
+    written = stats.count_documents({"refreshed_at": now, "bucket": {"$exists": True}})
+    print(f"✓ market_stats refreshed from {start:%Y-%m}: {written} bucket(s)")
+    return {"from": start, "buckets": written}
@@ -0,0 +1,1315 @@
+"""
+In-Memory Backend
+A process-local stand-in for MongoClient/Database/Collection
+
+Implements the subset of pymongo that operations.py uses, so
+DatabaseOperations runs without a server (hermetic tests, benchmarking the
+Python side of an operation):
+
+    db_ops = DatabaseOperations.in_memory()      # fresh, isolated database
+    MONGO_URL=memory:// python examples.py       # one shared in-process client
+
+Supported: find/find_one (filter, projection incl. $slice, sort, skip,
+limit), insert/update/replace/delete (one and many), find_one_and_update,
+bulk_write, count_documents, distinct, aggregate ($match, $group, $sort,
+$skip, $limit, $project, $set, $unwind, $count, $sample), pipeline updates, and
+sessions/transactions as no-ops (writes are not rolled back on abort).
+Query operators: equality, $eq, $ne, $gt(e), $lt(e), $in, $nin, $exists,
+$regex, $all, $size, $elemMatch, $not, $and, $or, $nor, and a simplified
+$text (any search token in a text-indexed field, scored by the index weights;
+no stemming or phrases; also inside $or and aggregate $match), $near/$nearSphere with $geometry points,
+$geoWithin $centerSphere (spherical distance) and $geoWithin $box. Update
+operators: $set, $unset, $inc, $min, $max, $push ($each), $addToSet, $pull,
+$setOnInsert. Anything else raises NotImplementedError.
+
+Indexes created through create_index/create_indexes (init_db.INDEX_SPECS
+when built with from_index_specs) become dict-based secondary indexes on
+their first field: equality and $in filters on that field read candidates
+from the index instead of scanning; unique indexes raise DuplicateKeyError. Changing _id raises WriteError
+(code 66, ImmutableField) as on a server.
+"""
+
+import copy
+import math
+import random
+import re
+import threading
+from datetime import datetime
+from typing import Any, Dict, Iterable, List, Mapping, Optional, Tuple
+
+import bson
+from bson.objectid import ObjectId
+from bson.raw_bson import RawBSONDocument
+from bson.son import SON
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, WriteError
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany, UpdateOne
+from pymongo.results import (
+    BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+)
+
+from text_index import tokenize
+
+_MISSING = object()
+
+_EARTH_RADIUS_M = 6378100
+
+
+# ==================== VALUES AND PATHS ====================
+
+def _type_rank(value: Any) -> int:
+    """BSON comparison order between types"""
+    if value is None or value is _MISSING:
+        return 1
+    if isinstance(value, bool):
+        return 8
+    if isinstance(value, (int, float)):
+        return 2
+    if isinstance(value, str):
+        return 3
+    if isinstance(value, Mapping):
+        return 4
+    if isinstance(value, (list, tuple)):
+        return 5
+    if isinstance(value, ObjectId):
+        return 7
+    if isinstance(value, datetime):
+        return 9
+    return 10
+
+
+def _sort_key(value: Any):
+    rank = _type_rank(value)
+    if rank == 4:
+        return (rank, [(_sort_key(k), _sort_key(v)) for k, v in value.items()])
+    if rank == 5:
+        return (rank, [_sort_key(v) for v in value])
+    if rank in (1, 10):
+        return (rank, 0)
+    if rank == 9 and value.tzinfo is not None:
+        value = value.replace(tzinfo=None) - value.utcoffset()
+    return (rank, value)
+
+
+def _comparable(a: Any, b: Any) -> bool:
+    return _type_rank(a) == _type_rank(b)
+
+
+def _hashable(value: Any):
+    """Index key for a value (None for unhashable values)"""
+    if isinstance(value, bool):
+        return ("bool", value)
+    if isinstance(value, datetime) and value.tzinfo is not None:
+        return value.replace(tzinfo=None) - value.utcoffset()
+    try:
+        hash(value)
+    except TypeError:
+        return None
+    return value
+
+
+def _values(doc: Any, parts: List[str]) -> List[Any]:
+    """Every value at a dotted path, descending into arrays"""
+    if not parts:
+        return [doc]
+    if isinstance(doc, Mapping):
+        if parts[0] not in doc:
+            return []
+        return _values(doc[parts[0]], parts[1:])
+    if isinstance(doc, list):
+        if parts[0].isdigit():
+            index = int(parts[0])
+            return _values(doc[index], parts[1:]) if index < len(doc) else []
+        return [v for item in doc for v in _values(item, parts)]
+    return []
+
+
+def get_path(doc: Mapping, path: str, default: Any = _MISSING) -> Any:
+    """Value at a dotted path without array traversal"""
+    current = doc
+    for part in path.split("."):
+        if isinstance(current, Mapping) and part in current:
+            current = current[part]
+        elif isinstance(current, list) and part.isdigit() and int(part) < len(current):
+            current = current[int(part)]
+        else:
+            return default
+    return current
+
+
+def _parent(doc: dict, path: str, create: bool = True):
+    parts = path.split(".")
+    current = doc
+    for part in parts[:-1]:
+        if isinstance(current, list):
+            current = current[int(part)]
+            continue
+        if part not in current or current[part] is None:
+            if not create:
+                return None, parts[-1]
+            current[part] = {}
+        current = current[part]
+    return current, parts[-1]
+
+
+def set_path(doc: dict, path: str, value: Any) -> None:
+    parent, key = _parent(doc, path)
+    if isinstance(parent, list):
+        parent[int(key)] = value
+    else:
+        parent[key] = value
+
+
+def unset_path(doc: dict, path: str) -> None:
+    parent, key = _parent(doc, path, create=False)
+    if isinstance(parent, dict):
+        parent.pop(key, None)
+
+
+# ==================== QUERY MATCHING ====================
+
+def _point(value: Any) -> Optional[Tuple[float, float]]:
+    """(lon, lat) of a GeoJSON point or legacy [lon, lat] pair"""
+    if isinstance(value, Mapping) and value.get("type") == "Point":
+        value = value.get("coordinates")
+    if isinstance(value, (list, tuple)) and len(value) == 2 and all(isinstance(c, (int, float)) for c in value):
+        return float(value[0]), float(value[1])
+    return None
+
+
+def distance_m(a: Tuple[float, float], b: Tuple[float, float]) -> float:
+    """Great-circle distance in meters between two (lon, lat) points"""
+    lon0, lat0, lon1, lat1 = map(math.radians, (a[0], a[1], b[0], b[1]))
+    h = math.sin((lat1 - lat0) / 2) ** 2 + math.cos(lat0) * math.cos(lat1) * math.sin((lon1 - lon0) / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * math.asin(math.sqrt(h))
+
+
+def near_spec(spec: Mapping) -> Tuple[Tuple[float, float], float, float]:
+    """(center, min meters, max meters) of a $near/$nearSphere operand"""
+    near = spec.get("$near", spec.get("$nearSphere"))
+    if not isinstance(near, Mapping) or "$geometry" not in near:
+        raise NotImplementedError("Only $near with $geometry is supported by the in-memory backend")
+    return (_point(near["$geometry"]), near.get("$minDistance", spec.get("$minDistance", 0)),
+            near.get("$maxDistance", spec.get("$maxDistance", math.inf)))
+
+
+def _geo_distance(values: List[Any], center: Tuple[float, float]) -> Optional[float]:
+    distances = [distance_m(point, center) for point in map(_point, values) if point is not None]
+    return min(distances) if distances else None
+
+
+def _equals(candidate: Any, value: Any) -> bool:
+    if isinstance(value, re.Pattern):
+        return isinstance(candidate, str) and value.search(candidate) is not None
+    if value is None:
+        return candidate is None or candidate is _MISSING
+    if not _comparable(candidate, value):
+        return False
+    if isinstance(value, Mapping):
+        return list(candidate.items()) == list(value.items()) if isinstance(candidate, Mapping) else False
+    return candidate == value
+
+
+def _expand(values: List[Any]) -> List[Any]:
+    """Values plus the elements of array values (MongoDB's implicit array matching)"""
+    out = []
+    for value in values:
+        out.append(value)
+        if isinstance(value, list):
+            out.extend(value)
+    return out
+
+
+def _compile_regex(pattern: Any, options: str = "") -> re.Pattern:
+    if isinstance(pattern, re.Pattern):
+        return pattern
+    flags = 0
+    for flag, bit in (("i", re.IGNORECASE), ("m", re.MULTILINE), ("s", re.DOTALL), ("x", re.VERBOSE)):
+        if flag in options:
+            flags |= bit
+    return re.compile(pattern, flags)
+
+
+def _match_operators(values: List[Any], spec: Mapping) -> bool:
+    expanded = _expand(values)
+    for op, arg in spec.items():
+        if op == "$eq":
+            ok = any(_equals(v, arg) for v in expanded) or (arg is None and not values)
+        elif op == "$ne":
+            ok = not (any(_equals(v, arg) for v in expanded) or (arg is None and not values))
+        elif op in ("$gt", "$gte", "$lt", "$lte"):
+            key = _sort_key(arg)
+            compare = {"$gt": lambda k: k > key, "$gte": lambda k: k >= key,
+                       "$lt": lambda k: k < key, "$lte": lambda k: k <= key}[op]
+            ok = any(_comparable(v, arg) and compare(_sort_key(v)) for v in expanded)
+        elif op == "$in":
+            ok = any(_equals(v, a) for a in arg for v in expanded) or (None in arg and not values)
+        elif op == "$nin":
+            ok = not (any(_equals(v, a) for a in arg for v in expanded) or (None in arg and not values))
+        elif op == "$exists":
+            ok = bool(values) == bool(arg)
+        elif op == "$regex":
+            regex = _compile_regex(arg, spec.get("$options", ""))
+            ok = any(isinstance(v, str) and regex.search(v) for v in expanded)
+        elif op == "$options":
+            continue
+        elif op == "$all":
+            ok = all(any(_equals(v, a) for v in expanded) for a in arg)
+        elif op == "$size":
+            ok = any(isinstance(v, list) and len(v) == arg for v in values)
+        elif op == "$elemMatch":
+            ok = any(isinstance(v, list) and any(
+                match(item, arg) if isinstance(item, Mapping) and not _is_operator_spec(arg)
+                else _match_operators([item], arg)
+                for item in v) for v in values)
+        elif op == "$not":
+            ok = not (_match_operators(values, arg) if isinstance(arg, Mapping)
+                      else _match_operators(values, {"$regex": arg}))
+        elif op in ("$near", "$nearSphere"):
+            center, low, high = near_spec(spec)
+            distance = _geo_distance(values, center)
+            ok = distance is not None and low <= distance <= high
+        elif op in ("$maxDistance", "$minDistance"):
+            continue
+        elif op == "$geoWithin":
+            if "$box" in arg:
+                (min_lon, min_lat), (max_lon, max_lat) = arg["$box"]
+                points = [p for p in map(_point, values) if p is not None]
+                ok = any(min_lon <= lon <= max_lon and min_lat <= lat <= max_lat for lon, lat in points)
+            elif "$centerSphere" in arg:
+                center, radians = arg["$centerSphere"]
+                distance = _geo_distance(values, _point(center))
+                ok = distance is not None and distance <= radians * _EARTH_RADIUS_M
+            else:
+                raise NotImplementedError("Only $geoWithin $centerSphere/$box is supported by the in-memory backend")
+        else:
+            raise NotImplementedError(f"Query operator {op} is not supported by the in-memory backend")
+        if not ok:
+            return False
+    return True
+
+
+def _is_operator_spec(spec: Any) -> bool:
+    return isinstance(spec, Mapping) and bool(spec) and all(str(k).startswith("$") for k in spec)
+
+
+def text_score(doc: Mapping, search: str, text_weights: Optional[Mapping[str, int]]) -> float:
+    """Simplified $text score: weighted count of search tokens in text-indexed fields"""
+    if not text_weights:
+        raise ValueError("text index required for $text query")
+    terms = set(tokenize(search))
+    score = 0.0
+    for field, weight in text_weights.items():
+        value = get_path(doc, field)
+        if isinstance(value, str):
+            score += weight * sum(1 for token in tokenize(value) if token in terms)
+    return score
+
+
+def match(doc: Mapping, query: Optional[Mapping], text_weights: Optional[Mapping[str, int]] = None) -> bool:
+    """Whether doc matches a MongoDB query document ($text needs the collection's text_weights)"""
+    for key, spec in (query or {}).items():
+        if key == "$and":
+            ok = all(match(doc, q, text_weights) for q in spec)
+        elif key == "$or":
+            ok = any(match(doc, q, text_weights) for q in spec)
+        elif key == "$nor":
+            ok = not any(match(doc, q, text_weights) for q in spec)
+        elif key == "$text":
+            ok = text_score(doc, spec["$search"], text_weights) > 0
+        elif key == "$expr":
+            ok = bool(evaluate(spec, doc))
+        else:
+            values = _values(doc, key.split("."))
+            if _is_operator_spec(spec):
+                ok = _match_operators(values, spec)
+            elif spec is None:
+                ok = not values or any(v is None for v in _expand(values))
+            else:
+                ok = any(_equals(v, spec) for v in _expand(values))
+        if not ok:
+            return False
+    return True
+
+
+# ==================== AGGREGATION EXPRESSIONS ====================
+
+def evaluate(expr: Any, doc: Mapping) -> Any:
+    """Evaluate an aggregation expression against a document"""
+    if isinstance(expr, str) and expr.startswith("$$"):
+        if expr == "$$ROOT" or expr == "$$CURRENT":
+            return doc
+        raise NotImplementedError(f"Variable {expr} is not supported by the in-memory backend")
+    if isinstance(expr, str) and expr.startswith("$"):
+        path = expr[1:]
+        if any(isinstance(get_path(doc, prefix), list) for prefix in _prefixes(path)):
+            return _values(doc, path.split("."))  # "$items.price" -> list of prices
+        return get_path(doc, path)
+    if isinstance(expr, list):
+        return [evaluate(item, doc) for item in expr]
+    if not isinstance(expr, Mapping):
+        return expr
+    if len(expr) != 1 or not next(iter(expr)).startswith("$"):
+        return {key: evaluate(value, doc) for key, value in expr.items()}
+
+    op, arg = next(iter(expr.items()))
+    if op == "$literal":
+        return arg
+    args = arg if isinstance(arg, list) else [arg]
+    if op == "$cond":
+        if isinstance(arg, Mapping):
+            arg = [arg["if"], arg["then"], arg["else"]]
+        return evaluate(arg[1] if _truthy(evaluate(arg[0], doc)) else arg[2], doc)
+    if op == "$ifNull":
+        for item in args:
+            value = evaluate(item, doc)
+            if value is not None and value is not _MISSING:
+                return value
+        return None
+    values = [evaluate(item, doc) for item in args]
+    if op in ("$eq", "$ne", "$gt", "$gte", "$lt", "$lte"):
+        a, b = (_sort_key(None if v is _MISSING else v) for v in values)
+        return {"$eq": a == b, "$ne": a != b, "$gt": a > b, "$gte": a >= b, "$lt": a < b, "$lte": a <= b}[op]
+    present = [v for v in values if v is not None and v is not _MISSING]
+    if op in ("$max", "$min"):
+        items = present[0] if len(values) == 1 and present and isinstance(present[0], list) else present
+        if not items:
+            return None
+        return (max if op == "$max" else min)(items, key=_sort_key)
+    if op == "$add":
+        return sum(present) if len(present) == len(values) else None
+    if op == "$subtract":
+        return values[0] - values[1] if len(present) == 2 else None
+    if op == "$multiply":
+        result = 1
+        for v in present:
+            result *= v
+        return result if len(present) == len(values) else None
+    if op == "$divide":
+        return values[0] / values[1] if len(present) == 2 else None
+    if op == "$concatArrays":
+        return None if len(present) != len(values) else [item for v in values for item in v]
+    if op == "$size":
+        return len(values[0])
+    if op == "$and":
+        return all(_truthy(v) for v in values)
+    if op == "$or":
+        return any(_truthy(v) for v in values)
+    if op == "$not":
+        return not _truthy(values[0])
+    if op == "$in":
+        return any(_equals(v, values[0]) for v in values[1])
+    if op in ("$first", "$last", "$arrayElemAt"):
+        array = values[0]
+        if not isinstance(array, list) or not array:
+            return _MISSING
+        index = 0 if op == "$first" else -1 if op == "$last" else values[1]
+        return array[index] if -len(array) <= index < len(array) else _MISSING
+    raise NotImplementedError(f"Expression {op} is not supported by the in-memory backend")
+
+
+def _prefixes(path: str) -> List[str]:
+    parts = path.split(".")
+    return [".".join(parts[:i]) for i in range(1, len(parts))]
+
+
+def _truthy(value: Any) -> bool:
+    return value is not _MISSING and value not in (None, False, 0)
+
+
+def _apply_stage_set(doc: dict, spec: Mapping) -> dict:
+    result = copy.deepcopy(doc)
+    for path, expr in spec.items():
+        value = evaluate(expr, doc)
+        if value is _MISSING:
+            unset_path(result, path)
+        else:
+            set_path(result, path, copy.deepcopy(value))
+    return result
+
+
+def _apply_pipeline_update(doc: dict, pipeline: List[Mapping]) -> dict:
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name in ("$set", "$addFields"):
+            doc = _apply_stage_set(doc, spec)
+        elif name in ("$unset", "$project") and (name == "$unset" or all(v in (0, False) for v in spec.values())):
+            doc = copy.deepcopy(doc)
+            for path in ([spec] if isinstance(spec, str) else spec):
+                unset_path(doc, path)
+        elif name in ("$replaceWith", "$replaceRoot"):
+            replacement = evaluate(spec["newRoot"] if name == "$replaceRoot" else spec, doc)
+            doc = {"_id": doc.get("_id"), **copy.deepcopy(replacement)}
+        else:
+            raise NotImplementedError(f"Update stage {name} is not supported by the in-memory backend")
+    return doc
+
+
+# ==================== UPDATES ====================
+
+def _pull_matches(item: Any, condition: Any) -> bool:
+    if isinstance(condition, Mapping) and isinstance(item, Mapping) and not _is_operator_spec(condition):
+        return match(item, condition)
+    if _is_operator_spec(condition):
+        return _match_operators([item], condition)
+    return _equals(item, condition)
+
+
+def apply_update(doc: dict, update: Any, inserting: bool = False) -> dict:
+    """Return a copy of doc with an update document or pipeline applied"""
+    if isinstance(update, list):
+        return _apply_pipeline_update(doc, update)
+    doc = copy.deepcopy(doc)
+    for op, fields in update.items():
+        if op == "$setOnInsert" and not inserting:
+            continue
+        for path, value in fields.items():
+            current = get_path(doc, path)
+            if op in ("$set", "$setOnInsert"):
+                set_path(doc, path, copy.deepcopy(value))
+            elif op == "$unset":
+                unset_path(doc, path)
+            elif op == "$inc":
+                set_path(doc, path, (0 if current is _MISSING else current) + value)
+            elif op == "$min":
+                if current is _MISSING or _sort_key(value) < _sort_key(current):
+                    set_path(doc, path, value)
+            elif op == "$max":
+                if current is _MISSING or _sort_key(value) > _sort_key(current):
+                    set_path(doc, path, value)
+            elif op in ("$push", "$addToSet"):
+                items = value["$each"] if isinstance(value, Mapping) and "$each" in value else [value]
+                array = [] if current is _MISSING else current
+                if not isinstance(array, list):
+                    raise TypeError(f"{op} on non-array field {path}")
+                for item in items:
+                    if op == "$push" or not any(_equals(existing, item) for existing in array):
+                        array.append(copy.deepcopy(item))
+                set_path(doc, path, array)
+            elif op == "$pull":
+                if isinstance(current, list):
+                    set_path(doc, path, [item for item in current if not _pull_matches(item, value)])
+            else:
+                raise NotImplementedError(f"Update operator {op} is not supported by the in-memory backend")
+    return doc
+
+
+def _upsert_seed(query: Mapping) -> dict:
+    """Document an upsert starts from: the equality fields of the filter"""
+    seed = {}
+    for key, value in query.items():
+        if key.startswith("$"):
+            if key == "$and":
+                for clause in value:
+                    seed.update(_upsert_seed(clause))
+            continue
+        if _is_operator_spec(value):
+            if "$eq" in value:
+                set_path(seed, key, copy.deepcopy(value["$eq"]))
+            continue
+        set_path(seed, key, copy.deepcopy(value))
+    return seed
+
+
+# ==================== PROJECTION ====================
+
+def project(doc: Mapping, projection: Optional[Mapping]) -> dict:
+    if not projection:
+        return copy.deepcopy(doc)
+    spec = dict(projection)
+    include_id = spec.pop("_id", 1)
+    slices = {k: v["$slice"] for k, v in spec.items() if isinstance(v, Mapping) and "$slice" in v}
+    for key in slices:
+        spec.pop(key)
+    if any(isinstance(v, Mapping) for v in spec.values()):
+        raise NotImplementedError("Projection expressions are not supported by the in-memory backend")
+
+    inclusive = any(spec.values()) if spec else not slices
+    if inclusive:
+        result = {}
+        for path in spec:
+            value = get_path(doc, path)
+            if value is not _MISSING:
+                set_path(result, path, copy.deepcopy(value))
+        for path in slices:
+            value = get_path(doc, path)
+            if value is not _MISSING:
+                set_path(result, path, copy.deepcopy(value))
+    else:
+        result = copy.deepcopy(doc)
+        for path in spec:
+            unset_path(result, path)
+    for path, count in slices.items():
+        value = get_path(result, path)
+        if isinstance(value, list):
+            if isinstance(count, list):
+                skip, limit = count
+                set_path(result, path, value[skip:skip + limit])
+            else:
+                set_path(result, path, value[:count] if count >= 0 else value[count:])
+    if include_id and "_id" in doc:
+        result = {"_id": doc["_id"], **{k: v for k, v in result.items() if k != "_id"}}
+    else:
+        result.pop("_id", None)
+    return result
+
+
+def _sort_docs(docs: List[Mapping], sort: List[Tuple[str, Any]],
+               scores: Optional[Dict[Any, float]] = None) -> List[Mapping]:
+    for field, direction in reversed(sort):
+        if isinstance(direction, Mapping):  # {"$meta": "textScore"}: best first
+            docs = sorted(docs, key=lambda d: (scores or {}).get(d["_id"], 0.0), reverse=True)
+            continue
+        docs = sorted(docs, key=lambda d: _sort_key(evaluate(f"${field}", d) if field != "_id" else d.get("_id")),
+                      reverse=direction == -1)
+    return docs
+
+
+def _normalize_sort(key_or_list: Any, direction: Optional[int] = None) -> List[Tuple[str, int]]:
+    if key_or_list is None:
+        return []
+    if isinstance(key_or_list, str):
+        return [(key_or_list, direction or 1)]
+    if isinstance(key_or_list, Mapping):
+        return list(key_or_list.items())
+    return list(key_or_list)
+
+
+# ==================== AGGREGATION ====================
+
+def _group(docs: List[Mapping], spec: Mapping) -> List[dict]:
+    groups: Dict[Any, dict] = {}
+    order = []
+    accumulators = {k: v for k, v in spec.items() if k != "_id"}
+    for doc in docs:
+        key_value = evaluate(spec["_id"], doc)
+        key_value = None if key_value is _MISSING else key_value
+        key = repr(_sort_key(key_value))
+        if key not in groups:
+            groups[key] = {"_id": key_value, **{name: [] for name in accumulators}}
+            order.append(key)
+        for name, acc in accumulators.items():
+            (op, expr), = acc.items()
+            groups[key][name].append(evaluate(expr, doc))
+
+    results = []
+    for key in order:
+        group = groups[key]
+        out = {"_id": group["_id"]}
+        for name, acc in accumulators.items():
+            op = next(iter(acc))
+            values = [v for v in group[name] if v is not _MISSING]
+            numbers = [v for v in values if isinstance(v, (int, float)) and not isinstance(v, bool)]
+            if op == "$sum":
+                out[name] = sum(numbers)
+            elif op == "$avg":
+                out[name] = sum(numbers) / len(numbers) if numbers else None
+            elif op in ("$min", "$max"):
+                present = [v for v in values if v is not None]
+                out[name] = (min if op == "$min" else max)(present, key=_sort_key) if present else None
+            elif op == "$first":
+                out[name] = values[0] if values else None
+            elif op == "$last":
+                out[name] = values[-1] if values else None
+            elif op == "$push":
+                out[name] = values
+            elif op == "$addToSet":
+                out[name] = []
+                for v in values:
+                    if not any(_equals(v, existing) for existing in out[name]):
+                        out[name].append(v)
+            else:
+                raise NotImplementedError(f"Accumulator {op} is not supported by the in-memory backend")
+        results.append(out)
+    return results
+
+
+def run_pipeline(docs: List[Mapping], pipeline: List[Mapping],
+                 text_weights: Optional[Mapping[str, int]] = None) -> List[dict]:
+    docs = [copy.deepcopy(doc) for doc in docs]
+    for stage in pipeline:
+        (name, spec), = stage.items()
+        if name == "$match":
+            docs = [doc for doc in docs if match(doc, spec, text_weights)]
+        elif name == "$group":
+            docs = _group(docs, spec)
+        elif name == "$sort":
+            docs = _sort_docs(docs, list(spec.items()))
+        elif name == "$skip":
+            docs = docs[spec:]
+        elif name == "$limit":
+            docs = docs[:spec]
+        elif name == "$count":
+            docs = [{spec: len(docs)}] if docs else []
+        elif name == "$sample":
+            docs = random.sample(docs, min(spec["size"], len(docs)))
+        elif name in ("$set", "$addFields"):
+            docs = [_apply_stage_set(doc, spec) for doc in docs]
+        elif name == "$unset":
+            docs = [_apply_pipeline_update(doc, [stage]) for doc in docs]
+        elif name == "$project":
+            if all(v in (0, 1, True, False) for v in spec.values()):
+                docs = [project(doc, spec) for doc in docs]
+            else:
+                projected = []
+                for doc in docs:
+                    out = {"_id": doc.get("_id")} if spec.get("_id", 1) else {}
+                    for path, expr in spec.items():
+                        if path == "_id":
+                            continue
+                        value = get_path(doc, path) if expr in (1, True) else evaluate(expr, doc)
+                        if value is not _MISSING:
+                            set_path(out, path, value)
+                    projected.append(out)
+                docs = projected
+        elif name == "$unwind":
+            path = (spec["path"] if isinstance(spec, Mapping) else spec)[1:]
+            unwound = []
+            for doc in docs:
+                value = get_path(doc, path)
+                for item in value if isinstance(value, list) else ([] if value is _MISSING else [value]):
+                    copy_doc = copy.deepcopy(doc)
+                    set_path(copy_doc, path, item)
+                    unwound.append(copy_doc)
+            docs = unwound
+        else:
+            raise NotImplementedError(f"Aggregation stage {name} is not supported by the in-memory backend")
+    return docs
+
+
+# ==================== STORAGE ====================
+
+class _Index:
+    """Dict-based secondary index on the first field of an index key"""
+
+    def __init__(self, name: str, keys: List[Tuple[str, Any]], unique: bool = False,
+                 partial: Optional[Mapping] = None):
+        self.name = name
+        self.keys = keys
+        self.field = keys[0][0]
+        self.unique = unique
+        self.partial = partial
+        self.entries: Dict[Any, set] = {}
+
+    def info(self) -> Dict[str, Any]:
+        info = {"v": 2, "key": SON(self.keys), "name": self.name}
+        if self.unique:
+            info["unique"] = True
+        if self.partial:
+            info["partialFilterExpression"] = self.partial
+        return info
+
+    def _index_keys(self, doc: Mapping) -> List[Any]:
+        if self.partial and not match(doc, self.partial):
+            return []
+        values = _expand(_values(doc, self.field.split(".")))
+        keys = [_hashable(v) for v in values] or [None]
+        return [k for k in keys if k is not None or not values]
+
+    def _unique_key(self, doc: Mapping):
+        if self.partial and not match(doc, self.partial):
+            return None
+        return tuple(repr(_sort_key(get_path(doc, field, None))) for field, _ in self.keys)
+
+    def add(self, doc: Mapping) -> None:
+        for key in self._index_keys(doc):
+            self.entries.setdefault(key, set()).add(doc["_id"])
+
+    def remove(self, doc: Mapping) -> None:
+        for key in self._index_keys(doc):
+            ids = self.entries.get(key)
+            if ids is not None:
+                ids.discard(doc["_id"])
+                if not ids:
+                    del self.entries[key]
+
+    def candidates(self, spec: Any) -> Optional[set]:
+        """Ids possibly matching a filter on this field (None = cannot use the index)"""
+        if isinstance(spec, Mapping):
+            if set(spec) == {"$eq"}:
+                values = [spec["$eq"]]
+            elif set(spec) == {"$in"}:
+                values = list(spec["$in"])
+            else:
+                return None
+        else:
+            values = [spec]
+        ids = set()
+        for value in values:
+            if isinstance(value, (re.Pattern, list, Mapping)) or value is None:
+                return None
+            key = _hashable(value)
+            if key is None:
+                return None
+            ids |= self.entries.get(key, set())
+        return ids
+
+
+class _Store:
+    """Documents and indexes of one collection (shared by collection views)"""
+
+    def __init__(self):
+        self.docs: Dict[Any, dict] = {}
+        self.indexes: Dict[str, _Index] = {}
+        self.text_weights: Dict[str, int] = {}  # field -> weight, from the text index
+        self.lock = threading.RLock()
+
+    def text_scores(self, search: str) -> Dict[Any, float]:
+        """_id -> score for documents with a search token in a text-indexed field"""
+        scores = {}
+        for _id, doc in self.docs.items():
+            score = text_score(doc, search, self.text_weights)
+            if score:
+                scores[_id] = score
+        return scores
+
+    def check_unique(self, doc: Mapping, ignore_id: Any = _MISSING) -> None:
+        for index in self.indexes.values():
+            if not index.unique:
+                continue
+            key = index._unique_key(doc)
+            if key is None:
+                continue
+            for other in self.docs.values():
+                if other["_id"] != ignore_id and other["_id"] != doc["_id"] and index._unique_key(other) == key:
+                    raise DuplicateKeyError(f"E11000 duplicate key error index: {index.name}", 11000)
+        if ignore_id is _MISSING and doc["_id"] in self.docs:
+            raise DuplicateKeyError("E11000 duplicate key error index: _id_", 11000)
+
+    def put(self, doc: dict, old: Optional[dict] = None) -> None:
+        if old is not None:
+            for index in self.indexes.values():
+                index.remove(old)
+        self.docs[doc["_id"]] = doc
+        for index in self.indexes.values():
+            index.add(doc)
+
+    def delete(self, doc: dict) -> None:
+        for index in self.indexes.values():
+            index.remove(doc)
+        del self.docs[doc["_id"]]
+
+    def candidates(self, query: Optional[Mapping]) -> Iterable[dict]:
+        """Documents worth testing against query, narrowed by an index when possible"""
+        if query:
+            if "_id" in query:
+                spec = query["_id"]
+                if not isinstance(spec, Mapping) or set(spec) <= {"$eq", "$in"}:
+                    ids = [spec] if not isinstance(spec, Mapping) else spec.get("$in", [spec.get("$eq")])
+                    try:
+                        return [self.docs[i] for i in dict.fromkeys(ids) if i in self.docs]
+                    except TypeError:
+                        pass
+            for index in self.indexes.values():
+                if index.field in query and not index.partial:
+                    ids = index.candidates(query[index.field])
+                    if ids is not None:
+                        return [self.docs[i] for i in sorted(ids, key=_sort_key) if i in self.docs]
+        return list(self.docs.values())
+
+
+# ==================== PYMONGO-SHAPED API ====================
+
+class MemoryCursor:
+    """Lazy cursor supporting sort/skip/limit/batch_size and iteration"""
+
+    def __init__(self, collection: "MemoryCollection", query: Optional[Mapping], projection: Optional[Mapping]):
+        self._collection = collection
+        self._query = query or {}
+        self._projection = projection
+        self._sort: List[Tuple[str, int]] = []
+        self._skip = 0
+        self._limit = 0
+        self._results: Optional[List[Any]] = None
+        self._iter = None
+
+    def sort(self, key_or_list: Any, direction: Optional[int] = None) -> "MemoryCursor":
+        self._sort = _normalize_sort(key_or_list, direction)
+        return self
+
+    def skip(self, skip: int) -> "MemoryCursor":
+        self._skip = skip
+        return self
+
+    def limit(self, limit: int) -> "MemoryCursor":
+        self._limit = limit
+        return self
+
+    def batch_size(self, batch_size: int) -> "MemoryCursor":
+        return self
+
+    def _evaluate(self) -> List[Any]:
+        if self._results is None:
+            docs, scores = self._collection._search(self._query)
+            if self._sort:
+                docs = _sort_docs(docs, self._sort, scores)
+            docs = docs[self._skip:]
+            if self._limit:
+                docs = docs[:self._limit]
+            projection = {k: v for k, v in (self._projection or {}).items()
+                          if not (isinstance(v, Mapping) and "$meta" in v)}
+            meta = [k for k in (self._projection or {}) if k not in projection]
+            results = []
+            for doc in docs:
+                out = project(doc, projection or None)
+                for field in meta:
+                    out[field] = scores.get(doc["_id"], 0.0)
+                results.append(self._collection._out(out))
+            self._results = results
+        return self._results
+
+    def __iter__(self):
+        return iter(self._evaluate())
+
+    def __next__(self):
+        if self._iter is None:
+            self._iter = iter(self._evaluate())
+        return next(self._iter)
+
+    def to_list(self) -> List[Any]:
+        return list(self._evaluate())
+
+    def close(self) -> None:
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class MemoryCollection:
+    """In-memory counterpart of pymongo.collection.Collection"""
+
+    def __init__(self, database: "MemoryDatabase", name: str, store: _Store, document_class: type = dict):
+        self.database = database
+        self.name = name
+        self.full_name = f"{database.name}.{name}"
+        self._store = store
+        self._document_class = document_class
+
+    def __getattr__(self, name: str) -> "MemoryCollection":
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.database[f"{self.name}.{name}"]
+
+    def __getitem__(self, name: str) -> "MemoryCollection":
+        return self.database[f"{self.name}.{name}"]
+
+    def with_options(self, codec_options=None, **_options) -> "MemoryCollection":
+        document_class = getattr(codec_options, "document_class", dict) if codec_options else self._document_class
+        return MemoryCollection(self.database, self.name, self._store, document_class)
+
+    def _out(self, doc: dict):
+        if self._document_class is RawBSONDocument:
+            return RawBSONDocument(bson.encode(doc))
+        return doc
+
+    def _search(self, query: Optional[Mapping]) -> Tuple[List[dict], Dict[Any, float]]:
+        """Matching documents (nearest first for $near) and their $text scores"""
+        near = [(field, spec) for field, spec in (query or {}).items()
+                if isinstance(spec, Mapping) and ("$near" in spec or "$nearSphere" in spec)]
+        if near:
+            field, spec = near[0]
+            center = near_spec(spec)[0]
+            docs = sorted(self._matching(query),
+                          key=lambda doc: _geo_distance(_values(doc, field.split(".")), center))
+            return docs, {}
+        if not query or "$text" not in query:
+            return self._matching(query), {}
+        query = dict(query)
+        text = query.pop("$text")
+        with self._store.lock:
+            scores = self._store.text_scores(text["$search"])
+            docs = [doc for doc in self._matching(query) if doc["_id"] in scores]
+        return docs, scores
+
+    def _matching(self, query: Optional[Mapping]) -> List[dict]:
+        with self._store.lock:
+            if query and "$text" in query:
+                return self._search(query)[0]
+            return [doc for doc in self._store.candidates(query) if match(doc, query, self._store.text_weights)]
+
+    # ---- reads ----
+
+    def find(self, filter: Optional[Mapping] = None, projection: Optional[Mapping] = None, *,
+             sort=None, skip: int = 0, limit: int = 0, session=None, **_options) -> MemoryCursor:
+        cursor = MemoryCursor(self, filter, projection)
+        if sort:
+            cursor.sort(sort)
+        return cursor.skip(skip).limit(limit)
+
+    def find_one(self, filter: Any = None, projection: Optional[Mapping] = None, *, sort=None,
+                 session=None, **_options):
+        if filter is not None and not isinstance(filter, Mapping):
+            filter = {"_id": filter}
+        for doc in self.find(filter, projection, sort=sort).limit(1):
+            return doc
+        return None
+
+    def count_documents(self, filter: Mapping, *, skip: int = 0, limit: int = 0, session=None, **_options) -> int:
+        count = max(0, len(self._matching(filter)) - skip)
+        return min(count, limit) if limit else count
+
+    def estimated_document_count(self, **_options) -> int:
+        return len(self._store.docs)
+
+    def distinct(self, key: str, filter: Optional[Mapping] = None, *, session=None, **_options) -> List[Any]:
+        values = []
+        for doc in self._matching(filter):
+            for value in _expand(_values(doc, key.split("."))):
+                if not isinstance(value, list) and not any(_equals(value, v) for v in values):
+                    values.append(value)
+        return values
+
+    def aggregate(self, pipeline: List[Mapping], *, session=None, **_options) -> MemoryCursor:
+        with self._store.lock:
+            docs = list(self._store.docs.values())
+        results = run_pipeline(docs, pipeline, self._store.text_weights)
+        cursor = MemoryCursor(self, None, None)
+        cursor._results = [self._out(doc) for doc in results]
+        return cursor
+
+    # ---- writes ----
+
+    def insert_one(self, document: dict, *, session=None, **_options) -> InsertOneResult:
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        doc = copy.deepcopy(dict(document))
+        with self._store.lock:
+            self._store.check_unique(doc)
+            self._store.put(doc)
+        return InsertOneResult(doc["_id"], True)
+
+    def insert_many(self, documents: Iterable[dict], ordered: bool = True, *, session=None,
+                    **_options) -> InsertManyResult:
+        inserted, errors = [], []
+        for i, document in enumerate(documents):
+            try:
+                inserted.append(self.insert_one(document).inserted_id)
+            except DuplicateKeyError as e:
+                errors.append({"index": i, "code": 11000, "errmsg": str(e)})
+                if ordered:
+                    break
+        if errors:
+            raise BulkWriteError({"writeErrors": errors, "nInserted": len(inserted), "writeConcernErrors": [],
+                                  "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0, "upserted": []})
+        return InsertManyResult(inserted, True)
+
+    def _update(self, filter: Mapping, update: Any, upsert: bool, multi: bool,
+                replacement: bool = False, sort=None) -> Tuple[int, int, Any, Optional[dict], Optional[dict]]:
+        """Returns (matched, modified, upserted_id, before, after) for the first document"""
+        with self._store.lock:
+            docs = self._matching(filter)
+            if sort:
+                docs = _sort_docs(docs, _normalize_sort(sort))
+            if not multi:
+                docs = docs[:1]
+            matched = modified = 0
+            first_before = first_after = None
+            for old in docs:
+                if replacement:
+                    new = {"_id": old["_id"], **copy.deepcopy(dict(update))}
+                else:
+                    new = apply_update(old, update)
+                if new.get("_id") != old["_id"]:
+                    raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'",
+                                     66, {"code": 66, "codeName": "ImmutableField"})
+                matched += 1
+                if first_before is None:
+                    first_before, first_after = old, new
+                if new != old:
+                    self._store.check_unique(new, ignore_id=old["_id"])
+                    self._store.put(new, old)
+                    modified += 1
+            if matched or not upsert:
+                return matched, modified, None, first_before, first_after
+
+            seed = _upsert_seed(filter)
+            if replacement:
+                new = {**({"_id": seed["_id"]} if "_id" in seed else {}), **copy.deepcopy(dict(update))}
+            else:
+                new = apply_update(seed, update, inserting=True)
+            new.setdefault("_id", ObjectId())
+            self._store.check_unique(new)
+            self._store.put(new)
+            return 0, 0, new["_id"], None, new
+
+    @staticmethod
+    def _update_result(matched: int, modified: int, upserted_id: Any) -> UpdateResult:
+        raw = {"n": matched + (upserted_id is not None), "nModified": modified, "ok": 1.0}
+        if upserted_id is not None:
+            raw["upserted"] = upserted_id
+        return UpdateResult(raw, True)
+
+    def update_one(self, filter: Mapping, update: Any, upsert: bool = False, *, session=None,
+                   **_options) -> UpdateResult:
+        matched, modified, upserted_id, _, _ = self._update(filter, update, upsert, multi=False)
+        return self._update_result(matched, modified, upserted_id)
+
+    def update_many(self, filter: Mapping, update: Any, upsert: bool = False, *, session=None,
+                    **_options) -> UpdateResult:
+        matched, modified, upserted_id, _, _ = self._update(filter, update, upsert, multi=True)
+        return self._update_result(matched, modified, upserted_id)
+
+    def replace_one(self, filter: Mapping, replacement: Mapping, upsert: bool = False, *, session=None,
+                    **_options) -> UpdateResult:
+        matched, modified, upserted_id, _, _ = self._update(filter, replacement, upsert, multi=False,
+                                                            replacement=True)
+        return self._update_result(matched, modified, upserted_id)
+
+    def find_one_and_update(self, filter: Mapping, update: Any, projection: Optional[Mapping] = None,
+                            sort=None, upsert: bool = False, return_document: bool = ReturnDocument.BEFORE,
+                            *, session=None, **_options):
+        _, _, _, before, after = self._update(filter, update, upsert, multi=False, sort=sort)
+        doc = after if return_document == ReturnDocument.AFTER else before
+        return None if doc is None else self._out(project(doc, projection))
+
+    def find_one_and_delete(self, filter: Mapping, projection: Optional[Mapping] = None, sort=None, *,
+                            session=None, **_options):
+        with self._store.lock:
+            docs = self._matching(filter)
+            if sort:
+                docs = _sort_docs(docs, _normalize_sort(sort))
+            if not docs:
+                return None
+            self._store.delete(docs[0])
+        return self._out(project(docs[0], projection))
+
+    def delete_one(self, filter: Mapping, *, session=None, **_options) -> DeleteResult:
+        with self._store.lock:
+            docs = self._matching(filter)[:1]
+            for doc in docs:
+                self._store.delete(doc)
+        return DeleteResult({"n": len(docs), "ok": 1.0}, True)
+
+    def delete_many(self, filter: Mapping, *, session=None, **_options) -> DeleteResult:
+        with self._store.lock:
+            docs = self._matching(filter)
+            for doc in docs:
+                self._store.delete(doc)
+        return DeleteResult({"n": len(docs), "ok": 1.0}, True)
+
+    def bulk_write(self, requests: List[Any], ordered: bool = True, *, session=None,
+                   **_options) -> BulkWriteResult:
+        result = {"nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+                  "upserted": [], "writeErrors": [], "writeConcernErrors": []}
+        for i, request in enumerate(requests):
+            try:
+                if isinstance(request, InsertOne):
+                    self.insert_one(request._doc)
+                    result["nInserted"] += 1
+                elif isinstance(request, (UpdateOne, UpdateMany, ReplaceOne)):
+                    matched, modified, upserted_id, _, _ = self._update(
+                        request._filter, request._doc, request._upsert, multi=isinstance(request, UpdateMany),
+                        replacement=isinstance(request, ReplaceOne))
+                    result["nMatched"] += matched
+                    result["nModified"] += modified
+                    if upserted_id is not None:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": i, "_id": upserted_id})
+                elif isinstance(request, (DeleteOne, DeleteMany)):
+                    delete = self.delete_many if isinstance(request, DeleteMany) else self.delete_one
+                    result["nRemoved"] += delete(request._filter).deleted_count
+                else:
+                    raise NotImplementedError(f"{type(request).__name__} is not supported by the in-memory backend")
+            except WriteError as e:  # DuplicateKeyError, ImmutableField
+                result["writeErrors"].append({"index": i, "code": e.code, "errmsg": str(e)})
+                if ordered:
+                    break
+        if result["writeErrors"]:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # ---- indexes ----
+
+    def create_index(self, keys: Any, **options) -> str:
+        keys = [(keys, 1)] if isinstance(keys, str) else list(keys.items() if isinstance(keys, Mapping) else keys)
+        name = options.get("name") or "_".join(f"{field}_{direction}" for field, direction in keys)
+        if any(direction == "text" for _, direction in keys):
+            weights = options.get("weights") or {}
+            self._store.text_weights = {field: weights.get(field, 1) for field, direction in keys
+                                        if direction == "text"}
+            return name
+        if any(not isinstance(direction, int) for _, direction in keys):
+            return name  # 2dsphere/hashed: geo operators scan (no geo index), hashed adds nothing here
+        with self._store.lock:
+            if name not in self._store.indexes:
+                index = _Index(name, keys, unique=options.get("unique", False),
+                               partial=options.get("partialFilterExpression"))
+                for doc in self._store.docs.values():
+                    index.add(doc)
+                self._store.indexes[name] = index
+        return name
+
+    def create_indexes(self, indexes: List[Any], *, session=None, **_options) -> List[str]:
+        names = []
+        for model in indexes:
+            document = dict(model.document)
+            keys = list(document.pop("key").items())
+            names.append(self.create_index(keys, **document))
+        return names
+
+    def list_indexes(self, *, session=None, **_options) -> List[Dict[str, Any]]:
+        infos = [{"v": 2, "key": SON([("_id", 1)]), "name": "_id_"}]
+        return infos + [index.info() for index in self._store.indexes.values()]
+
+    def index_information(self) -> Dict[str, Any]:
+        return {info["name"]: {"key": list(info["key"].items())} for info in self.list_indexes()}
+
+    def drop_index(self, name: str, **_options) -> None:
+        with self._store.lock:
+            self._store.indexes.pop(name, None)
+
+    def drop(self, **_options) -> None:
+        self.database.drop_collection(self.name)
+
+
+class MemoryDatabase:
+    """In-memory counterpart of pymongo.database.Database"""
+
+    def __init__(self, client: "MemoryClient", name: str):
+        self.client = client
+        self.name = name
+        self._stores: Dict[str, _Store] = {}
+        self._lock = threading.Lock()
+
+    def __getitem__(self, name: str) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def __getattr__(self, name: str) -> MemoryCollection:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self.get_collection(name)
+
+    def get_collection(self, name: str, codec_options=None, **options) -> MemoryCollection:
+        with self._lock:
+            store = self._stores.setdefault(name, _Store())
+        collection = MemoryCollection(self, name, store)
+        return collection.with_options(codec_options=codec_options) if codec_options else collection
+
+    def create_collection(self, name: str, **_options) -> MemoryCollection:
+        return self.get_collection(name)
+
+    def list_collection_names(self, filter: Optional[Mapping] = None, **_options) -> List[str]:
+        names = [name for name, store in self._stores.items() if store.docs or store.indexes]
+        if filter and "name" in filter:
+            names = [name for name in names if name == filter["name"]]
+        return names
+
+    def drop_collection(self, name: str, **_options) -> None:
+        with self._lock:
+            self._stores.pop(name, None)
+
+    def command(self, command: Any, *args, **_options) -> Dict[str, Any]:
+        name = command if isinstance(command, str) else next(iter(command))
+        if name in ("ping", "hello", "isMaster", "ismaster"):
+            return {"ok": 1.0}
+        raise NotImplementedError(f"Command {name} is not supported by the in-memory backend")
+
+    def apply_index_specs(self, index_specs: Mapping[str, List]) -> None:
+        """Create indexes from init_db-style specs: collection -> [(keys, options)]"""
+        for collection, specs in index_specs.items():
+            for keys, options in specs:
+                self[collection].create_index(keys, **{k: v for k, v in options.items()
+                                                       if k in ("name", "unique", "partialFilterExpression",
+                                                                "weights")})
+
+
+class MemorySession:
+    """No-op session: transactions run without isolation or rollback"""
+
+    def __init__(self, client: "MemoryClient"):
+        self.client = client
+        self.in_transaction = False
+
+    def start_transaction(self, **_options):
+        self.in_transaction = True
+        return self
+
+    def commit_transaction(self) -> None:
+        self.in_transaction = False
+
+    def abort_transaction(self) -> None:
+        self.in_transaction = False
+
+    def with_transaction(self, callback, **_options):
+        self.start_transaction()
+        try:
+            result = callback(self)
+        except BaseException:
+            self.abort_transaction()
+            raise
+        self.commit_transaction()
+        return result
+
+    def end_session(self) -> None:
+        self.in_transaction = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end_session()
+
+
+class MemoryClient:
+    """In-memory counterpart of pymongo.MongoClient"""
+
+    def __init__(self, *_args, **_options):
+        self._databases: Dict[str, MemoryDatabase] = {}
+        self._lock = threading.Lock()
+        self.admin = self["admin"]
+
+    def __getitem__(self, name: str) -> MemoryDatabase:
+        with self._lock:
+            if name not in self._databases:
+                self._databases[name] = MemoryDatabase(self, name)
+            return self._databases[name]
+
+    def __getattr__(self, name: str) -> MemoryDatabase:
+        if name.startswith("_"):
+            raise AttributeError(name)
+        return self[name]
+
+    def get_database(self, name: str, **_options) -> MemoryDatabase:
+        return self[name]
+
+    def list_database_names(self) -> List[str]:
+        return [name for name in self._databases if name != "admin"]
+
+    def start_session(self, **_options) -> MemorySession:
+        return MemorySession(self)
+
+    def close(self) -> None:
+        pass
+
+
+_shared_client: Optional[MemoryClient] = None
+
+
+def shared_client() -> MemoryClient:
+    """Process-wide client behind MONGO_URL=memory:// (data lives until the process exits)"""
+    global _shared_client
+    if _shared_client is None:
+        _shared_client = MemoryClient()
+    return _shared_client
+
+
+def memory_database(name: str = "real_estate_db", indexes: bool = True) -> MemoryDatabase:
+    """
+    A fresh in-memory database, with the init_db.INDEX_SPECS indexes
+
+    Unlike MONGO_URL=memory://, each call starts from an empty client, so
+    tests do not see each other's data.
+
+    Args:
+        name: Database name
+        indexes: Build the dict-based secondary indexes from INDEX_SPECS
+    """
+    db = MemoryClient()[name]
+    if indexes:
+        from init_db import INDEX_SPECS
+        db.apply_index_specs(INDEX_SPECS)
+    return db
@@ -0,0 +1,306 @@
+"""
+MongoDB Migration Runner
+Idempotent index builds and versioned schema migrations for the Real Estate database
+"""
+
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import IndexModel, UpdateOne, TEXT
+from pymongo.errors import PyMongoError
+
+# Collection recording applied migrations and backfill checkpoints
+MIGRATIONS_COLLECTION = "schema_migrations"
+
+# Index options that change index semantics and are compared when diffing
+_COMPARED_OPTIONS = ("unique", "sparse", "partialFilterExpression", "expireAfterSeconds", "weights")
+
+
+def _normalize_key(keys: List[Tuple[str, Any]]) -> Tuple[Tuple[str, Any], ...]:
+    """Normalize a desired key spec to the form reported by list_indexes"""
+    if any(direction == TEXT for _, direction in keys):
+        # Text indexes are stored as {_fts: 'text', _ftsx: 1} plus any non-text prefix/suffix fields
+        normalized = [(field, direction) for field, direction in keys if direction != TEXT]
+        return tuple(normalized) + (("_fts", "text"), ("_ftsx", 1))
+    return tuple(keys)
+
+
+def _desired_options(keys: List[Tuple[str, Any]], options: Dict[str, Any]) -> Dict[str, Any]:
+    compared = {k: v for k, v in options.items() if k in _COMPARED_OPTIONS}
+    if any(direction == TEXT for _, direction in keys):
+        text_fields = [field for field, direction in keys if direction == TEXT]
+        compared.setdefault("weights", {field: 1 for field in text_fields})
+    return compared
+
+
+def diff_indexes(collection, specs: List[Tuple[List[Tuple[str, Any]], Dict[str, Any]]]) -> Dict[str, List]:
+    """
+    Compare desired index specs with the indexes that exist on a collection
+
+    Args:
+        collection: pymongo Collection
+        specs: List of (keys, options) tuples
+
+    Returns:
+        dict: {"missing": [IndexModel], "unchanged": [name], "changed": [(name, IndexModel)]}
+    """
+    existing = {}
+    for info in collection.list_indexes():
+        existing[tuple(info["key"].items())] = info
+
+    result = {"missing": [], "unchanged": [], "changed": []}
+    for keys, options in specs:
+        model = IndexModel(keys, **options)
+        info = existing.get(_normalize_key(keys))
+        if info is None:
+            result["missing"].append(model)
+            continue
+
+        wanted = _desired_options(keys, options)
+        actual = {k: info[k] for k in _COMPARED_OPTIONS if k in info}
+        if wanted == actual:
+            result["unchanged"].append(info["name"])
+        else:
+            result["changed"].append((info["name"], model))
+    return result
+
+
+def _sync_collection(db, name: str, specs, rebuild_changed: bool) -> Dict[str, Any]:
+    start = time.perf_counter()
+    collection = db[name]
+    diff = diff_indexes(collection, specs)
+
+    to_build = list(diff["missing"])
+    if rebuild_changed:
+        for index_name, model in diff["changed"]:
+            collection.drop_index(index_name)
+            to_build.append(model)
+
+    # One createIndexes command per collection: the server builds them in a single scan
+    built = collection.create_indexes(to_build) if to_build else []
+    return {
+        "collection": name,
+        "built": built,
+        "unchanged": diff["unchanged"],
+        "changed": [index_name for index_name, _ in diff["changed"]],
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def sync_indexes(db, index_specs: Dict[str, List], workers: int = 4, rebuild_changed: bool = False) -> List[Dict[str, Any]]:
+    """
+    Build missing indexes, concurrently across collections
+
+    Existing indexes with the same key and options are skipped. Indexes with
+    the same key but different options are reported, and only dropped and
+    rebuilt when rebuild_changed is True.
+
+    Args:
+        db: MongoDB database instance
+        index_specs: Collection name -> list of (keys, options)
+        workers: Maximum number of collections indexed at once
+        rebuild_changed: Drop and rebuild indexes whose options changed
+
+    Returns:
+        list: Per-collection report dicts
+    """
+    with ThreadPoolExecutor(max_workers=max(1, workers)) as pool:
+        futures = [
+            pool.submit(_sync_collection, db, name, specs, rebuild_changed)
+            for name, specs in index_specs.items()
+        ]
+        reports = [f.result() for f in futures]
+
+    for report in reports:
+        status = f"{len(report['built'])} built, {len(report['unchanged'])} unchanged"
+        if report["changed"]:
+            action = "rebuilt" if rebuild_changed else "differ (not rebuilt)"
+            status += f", {len(report['changed'])} {action}: {', '.join(report['changed'])}"
+        print(f"✓ {report['collection']}: {status} ({report['seconds']:.2f}s)")
+    return reports
+
+
+# ==================== VERSIONED MIGRATIONS ====================
+
+class Migration:
+    """A single versioned migration step"""
+
+    def __init__(self, version: int, name: str, up: Callable):
+        self.version = version
+        self.name = name
+        self.up = up
+
+
+class MigrationRunner:
+    """Applies registered migrations once each, in version order"""
+
+    def __init__(self, db, migrations: Optional[List[Migration]] = None):
+        self.db = db
+        self.migrations = sorted(migrations or [], key=lambda m: m.version)
+
+    @property
+    def versions(self):
+        return self.db[MIGRATIONS_COLLECTION]
+
+    def applied_versions(self) -> set:
+        return {doc["_id"] for doc in self.versions.find({"applied_at": {"$exists": True}}, {"_id": 1})}
+
+    def pending(self) -> List[Migration]:
+        applied = self.applied_versions()
+        return [m for m in self.migrations if m.version not in applied]
+
+    def run(self) -> List[int]:
+        """
+        Apply all pending migrations
+
+        Returns:
+            list: Versions applied in this run
+        """
+        applied = []
+        for migration in self.pending():
+            print(f"Applying migration {migration.version}: {migration.name}")
+            start = time.perf_counter()
+            migration.up(self)
+            self.versions.update_one(
+                {"_id": migration.version},
+                {"$set": {
+                    "name": migration.name,
+                    "applied_at": datetime.now(timezone.utc),
+                    "duration_ms": round((time.perf_counter() - start) * 1000, 1),
+                }},
+                upsert=True
+            )
+            applied.append(migration.version)
+            print(f"✓ Migration {migration.version} applied")
+        if not applied:
+            print("✓ No pending migrations")
+        return applied
+
+    def backfill(self, version: int, collection: str, query: Dict[str, Any],
+                 update_fn: Callable[[Dict[str, Any]], Optional[Dict[str, Any]]],
+                 projection: Optional[Dict[str, Any]] = None, batch_size: int = 1000) -> int:
+        """
+        Rewrite matching documents in resumable _id-ordered batches
+
+        The last processed _id is checkpointed on the migration's version
+        document after every batch, so an interrupted backfill resumes where
+        it stopped instead of rescanning the collection.
+
+        Args:
+            version: Owning migration version (checkpoint key)
+            collection: Collection name
+            query: Filter selecting documents to backfill
+            update_fn: Maps a document to an update document, or None to skip
+            projection: Fields needed by update_fn
+            batch_size: Documents per bulk_write
+
+        Returns:
+            int: Number of documents modified
+        """
+        state = self.versions.find_one({"_id": version}) or {}
+        last_id = state.get("checkpoint")
+        modified = 0
+
+        while True:
+            batch_query = dict(query)
+            if last_id is not None:
+                batch_query["_id"] = {"$gt": last_id}
+            batch = list(self.db[collection].find(batch_query, projection).sort("_id", 1).limit(batch_size))
+            if not batch:
+                break
+
+            ops = []
+            for doc in batch:
+                update = update_fn(doc)
+                if update:
+                    ops.append(UpdateOne({"_id": doc["_id"]}, update))
+            if ops:
+                modified += self.db[collection].bulk_write(ops, ordered=False).modified_count
+
+            last_id = batch[-1]["_id"]
+            self.versions.update_one({"_id": version}, {"$set": {"checkpoint": last_id}}, upsert=True)
+            print(f"  … {collection}: {modified} documents backfilled")
+
+        return modified
+
+
+# ==================== REGISTERED MIGRATIONS ====================
+
+def derive_geo(doc):
+    """location.geo update for a property with location.latitude/longitude"""
+    loc = doc["location"]
+    return {"$set": {"location.geo": {"type": "Point", "coordinates": [loc["longitude"], loc["latitude"]]}}}
+
+
+def derive_region(doc):
+    """region (shard key) update for a property with location.geo, None if it has no cell"""
+    from sharding import property_region
+    region = property_region(doc)
+    return {"$set": {"region": region}} if region else None
+
+
+def _add_missing_geo(runner: MigrationRunner):
+    """Derive location.geo for properties stored with only latitude/longitude"""
+    runner.backfill(
+        2, "properties",
+        {"location.latitude": {"$exists": True}, "location.longitude": {"$exists": True}, "location.geo": {"$exists": False}},
+        derive_geo,
+        projection={"location.latitude": 1, "location.longitude": 1},
+    )
+
+
+def _add_missing_region(runner: MigrationRunner):
+    """Derive the properties shard key (geo cell) for documents written before it existed"""
+    runner.backfill(
+        3, "properties",
+        {"region": {"$exists": False}, "location.geo": {"$exists": True}},
+        derive_region,
+        projection={"location": 1},
+    )
+
+
+# Single-field indexes superseded by compound indexes with the same prefix
+_SUPERSEDED_INDEXES = {"notifications": "user_firebase_uid_1", "audit_logs": "user_firebase_uid_1"}
+
+
+def _query_plan_indexes(runner: MigrationRunner):
+    """Build the indexes query_plans.py requires and drop the prefixes they replace"""
+    from init_db import INDEX_SPECS
+    sync_indexes(runner.db, INDEX_SPECS)
+    for collection, name in _SUPERSEDED_INDEXES.items():
+        if name in runner.db[collection].index_information():
+            runner.db[collection].drop_index(name)
+
+
+def default_migrations() -> List[Migration]:
+    """Migrations shipped with this package"""
+    from init_db import INDEX_SPECS
+    return [
+        Migration(1, "initial indexes", lambda runner: sync_indexes(runner.db, INDEX_SPECS)),
+        Migration(2, "backfill location.geo", _add_missing_geo),
+        Migration(3, "backfill properties.region shard key", _add_missing_region),
+        Migration(4, "rebuild weighted properties text index", lambda runner: sync_indexes(
+            runner.db, {"properties": INDEX_SPECS["properties"]}, rebuild_changed=True
+        )),
+        Migration(5, "search, notification and audit log indexes", _query_plan_indexes),
+    ]
+
+
+def run_migrations():
+    """Apply all pending migrations to the configured database"""
+    from config import get_database, close_connection
+
+    client, db = get_database()
+    try:
+        MigrationRunner(db, default_migrations()).run()
+    except PyMongoError as e:
+        print(f"✗ Migration failed: {e}")
+        raise
+    finally:
+        close_connection(client)
+
+
+if __name__ == "__main__":
+    run_migrations()
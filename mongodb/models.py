@@ -3,8 +3,12 @@ MongoDB Data Models
 Real Estate Listing Database Schema
 """
 
+import struct
 from datetime import datetime
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Tuple
+
+from bson import decode as bson_decode
+from bson.codec_options import CodecOptions
 
 class UserRole:
     VISITOR = "visitor"
@@ -48,6 +52,7 @@ COLLECTIONS_SCHEMA = {
         "two_factor_enabled": "boolean",
         "is_suspended": "boolean",
         "is_banned": "boolean",
+        "version": "int (optional)", # Optimistic concurrency (see contention.py)
         "created_at": "datetime",
         "updated_at": "datetime"
     },
@@ -84,6 +89,7 @@ COLLECTIONS_SCHEMA = {
         "images": ["string"],
         "documents": ["string"],
         "virtual_tour_url": "string (optional)",
+        "region": "string (optional)", # Shard key: geo cell "lat:lon" (see sharding.py)
         "created_at": "datetime",
         "updated_at": "datetime"
     },
@@ -98,6 +104,7 @@ COLLECTIONS_SCHEMA = {
         "verified_by_admin_uid": "string (optional)",
         "rejection_reason": "string (optional)",
         "expires_at": "datetime (optional)",
+        "version": "int (optional)", # Optimistic concurrency (see contention.py)
         "created_at": "datetime",
         "updated_at": "datetime"
     },
@@ -146,10 +153,76 @@ COLLECTIONS_SCHEMA = {
         "title": "string",
         "message": "string",
         "notification_type": "string",
+        "property_id": "ObjectId (optional)", # Saved-search alerts: the matching property
+        "saved_search_id": "ObjectId (optional)", # References saved_searches._id
         "is_read": "boolean",
         "created_at": "datetime"
     },
     
+    "saved_searches": {
+        "_id": "ObjectId (PK)",
+        "user_firebase_uid": "string", # References users.firebase_uid
+        "name": "string",
+        "filters": "object", # Canonical search_properties filters
+        "filters_key": "string", # Canonical JSON of filters (one per user)
+        "match_keys": ["string"], # Reverse index keys (see saved_searches.py)
+        "is_active": "boolean",
+        "last_notified_at": "datetime (optional)",
+        "created_at": "datetime"
+    },
+
+    "conversations": {
+        "_id": "string (PK)", # "<uid>:<uid>" with the two firebase_uids sorted
+        "participants": ["string"], # References users.firebase_uid
+        "listing_id": "ObjectId (optional)", # Listing the conversation started about
+        "message_count": "int", # Also the sequence number of the last message
+        "last_message": {
+            "sender_firebase_uid": "string",
+            "preview": "string",
+            "sent_at": "datetime"
+        },
+        "created_at": "datetime",
+        "updated_at": "datetime"
+    },
+
+    "message_buckets": {
+        "_id": "ObjectId (PK)",
+        "conversation_id": "string", # References conversations._id
+        "seq": "int", # Bucket number: messages (seq * size + 1) .. ((seq + 1) * size)
+        "count": "int",
+        "messages": [
+            {
+                "n": "int", # Message sequence number within the conversation
+                "sender_firebase_uid": "string",
+                "content": "string",
+                "listing_id": "ObjectId (optional)",
+                "sent_at": "datetime"
+            }
+        ],
+        "first_at": "datetime",
+        "last_at": "datetime"
+    },
+
+    "user_conversations": {
+        "_id": "string (PK)", # "<user uid>|<conversation_id>"
+        "user_firebase_uid": "string", # References users.firebase_uid
+        "conversation_id": "string", # References conversations._id
+        "other_firebase_uid": "string",
+        "last_message": "object", # Same preview as conversations.last_message
+        "last_message_at": "datetime",
+        "last_n": "int",
+        "read_through": "int", # Highest message n this user has read
+        "unread_count": "int"
+    },
+
+    "listing_view_stats": {
+        "_id": "string (PK)", # "<listing_id>:<YYYY-MM-DD>", one bucket per listing per day
+        "listing_id": "ObjectId", # References listings._id
+        "day": "datetime", # Midnight UTC
+        "views": "int",
+        "hours": "object" # Hour of day ("0".."23") -> views
+    },
+
     "audit_logs": {
         "_id": "ObjectId (PK)",
         "user_firebase_uid": "string (optional)",
@@ -160,3 +233,165 @@ COLLECTIONS_SCHEMA = {
         "timestamp": "datetime"
     }
 }
+
+
+# ==================== TYPED DOCUMENT MODELS ====================
+
+_MISSING = object()
+
+# Value sizes of fixed-width BSON element types
+_FIXED_SIZES = {0x01: 8, 0x06: 0, 0x07: 12, 0x08: 1, 0x09: 8, 0x0A: 0, 0x10: 4, 0x11: 8, 0x12: 8,
+                0x13: 16, 0xFF: 0, 0x7F: 0}
+_INT32 = struct.Struct("<i")
+_DECODE_OPTIONS = CodecOptions(tz_aware=True)
+
+
+def _element_span(data: bytes, name: str) -> Optional[Tuple[int, int]]:
+    """(start, end) of a top-level element in raw BSON, skipping other values without decoding them"""
+    target = name.encode("utf-8")
+    pos, end = 4, len(data) - 1
+    while pos < end:
+        start = pos
+        kind = data[pos]
+        name_end = data.index(b"\x00", pos + 1)
+        pos = name_end + 1
+        if kind in _FIXED_SIZES:
+            pos += _FIXED_SIZES[kind]
+        elif kind in (0x02, 0x0D, 0x0E):  # string, code, symbol: int32 length + bytes
+            pos += 4 + _INT32.unpack_from(data, pos)[0]
+        elif kind in (0x03, 0x04, 0x0F):  # document, array, code with scope: int32 total size
+            pos += _INT32.unpack_from(data, pos)[0]
+        elif kind == 0x05:  # binary: int32 length + subtype + bytes
+            pos += 5 + _INT32.unpack_from(data, pos)[0]
+        elif kind == 0x0B:  # regex: two cstrings
+            pos = data.index(b"\x00", data.index(b"\x00", pos) + 1) + 1
+        elif kind == 0x0C:  # DBPointer: string + ObjectId
+            pos += 4 + _INT32.unpack_from(data, pos)[0] + 12
+        else:
+            raise ValueError(f"Unknown BSON element type {kind:#x}")
+        if data[start + 1:name_end] == target:
+            return start, pos
+    return None
+
+
+class Model:
+    """
+    Compact, read-only view of a stored document
+
+    Subclasses are generated from COLLECTIONS_SCHEMA and declare one slot per
+    top-level field, so instances carry no per-object __dict__. Built from a
+    RawBSONDocument, a field is located by skipping over the raw bytes of the
+    elements before it and decoded from its own slice on first access, so
+    untouched fields are never decoded.
+    """
+
+    __slots__ = ('_raw', '_extra')
+    _fields = ()
+    collection = None
+
+    def __init__(self, **fields):
+        self._raw = None
+        self._extra = None
+        for name, value in fields.items():
+            if name in self._fields:
+                object.__setattr__(self, name, value)
+            else:
+                if self._extra is None:
+                    self._extra = {}
+                self._extra[name] = value
+
+    @classmethod
+    def from_document(cls, doc):
+        """Eagerly build a model from a decoded document (dict)"""
+        return cls(**doc)
+
+    @classmethod
+    def from_raw(cls, raw):
+        """Wrap a RawBSONDocument; each field is decoded from the raw bytes on first access"""
+        obj = cls.__new__(cls)
+        obj._raw = raw
+        obj._extra = None
+        return obj
+
+    def _decode_field(self, name, default=None):
+        """Decode one top-level field from the raw bytes (default if absent)"""
+        if self._raw is None:
+            return default
+        data = self._raw.raw
+        span = _element_span(data, name)
+        if span is None:
+            return default
+        element = data[span[0]:span[1]]
+        return bson_decode(_INT32.pack(len(element) + 5) + element + b"\x00", _DECODE_OPTIONS)[name]
+
+    def __getattr__(self, name):
+        # Only called for slots that have not been set yet
+        if name in self._fields:
+            value = self._decode_field(name)
+            object.__setattr__(self, name, value)
+            return value
+        raise AttributeError(f"{type(self).__name__!r} object has no attribute {name!r}")
+
+    def get(self, key, default=None):
+        if key in self._fields:
+            value = getattr(self, key)
+            return default if value is None else value
+        if self._extra is not None and key in self._extra:
+            return self._extra[key]
+        return self._decode_field(key, default)
+
+    def __getitem__(self, key):
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            raise KeyError(key)
+        return value
+
+    def to_dict(self):
+        """Decode every field into a plain dict"""
+        if self._raw is not None:
+            return dict(self._raw)
+        doc = {}
+        for name in self._fields:
+            try:
+                doc[name] = object.__getattribute__(self, name)
+            except AttributeError:
+                continue
+        if self._extra:
+            doc.update(self._extra)
+        return doc
+
+    def __repr__(self):
+        return f"{type(self).__name__}(_id={self.get('_id')!r})"
+
+
+def make_model(class_name, collection):
+    """Generate a slotted Model subclass for a collection in COLLECTIONS_SCHEMA"""
+    fields = tuple(COLLECTIONS_SCHEMA[collection])
+    return type(class_name, (Model,), {
+        '__slots__': fields,
+        '_fields': frozenset(fields),
+        'collection': collection,
+    })
+
+
+User = make_model('User', 'users')
+Property = make_model('Property', 'properties')
+Listing = make_model('Listing', 'listings')
+VerificationDocument = make_model('VerificationDocument', 'verification_documents')
+SavedListing = make_model('SavedListing', 'saved_listings')
+PropertyComparison = make_model('PropertyComparison', 'property_comparisons')
+Review = make_model('Review', 'reviews')
+Notification = make_model('Notification', 'notifications')
+AuditLog = make_model('AuditLog', 'audit_logs')
+SavedSearch = make_model('SavedSearch', 'saved_searches')
+Conversation = make_model('Conversation', 'conversations')
+MessageBucket = make_model('MessageBucket', 'message_buckets')
+UserConversation = make_model('UserConversation', 'user_conversations')
+ListingViewStats = make_model('ListingViewStats', 'listing_view_stats')
+
+# Collection name -> model class
+MODEL_CLASSES = {cls.collection: cls for cls in (
+    User, Property, Listing, VerificationDocument, SavedListing,
+    PropertyComparison, Review, Notification, AuditLog,
+    SavedSearch, Conversation, MessageBucket, UserConversation, ListingViewStats,
+)}
@@ -3,21 +3,158 @@ MongoDB CRUD Operations
 Real Estate Listing Database
 """
 
-from datetime import datetime, timezone
+import random
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta, timezone
 from typing import List, Optional, Dict, Any
-from config import get_database
+from config import get_database, check_ready, wait_until_ready, get_read_preference, get_settings
 from bson.objectid import ObjectId  # <-- For converting string IDs to ObjectIds
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+from models import MODEL_CLASSES, ListingStatus
+from validation import validate_document
+from sharding import property_region, cells_within
+import market_analytics
+from transactions import run_transaction, TransactionMetrics
+import saved_searches
+import cascade
+from recommendations import SIMILAR_COLLECTION
+import listing_stats
+from contention import ContentionMetrics, VersionConflictError, version_filter
+from resilience import Resilience, guarded
+from pymongo import ReturnDocument, UpdateOne
 from pymongo.errors import PyMongoError  # <-- For transaction error handling
 
 
 class DatabaseOperations:
     """Class containing all database CRUD operations"""
 
-    def __init__(self):
-        self.client, self.db = get_database()  # Store client for transactions
+    def __init__(self, client=None, db=None, autocomplete_backend=None, search_cache=None,
+                 property_snapshot=None, view_counter=None, search_alerts: bool = True, resilience=None,
+                 view_stats=None):
+        # The client is created on first query rather than here, so constructing
+        # DatabaseOperations never blocks or fails while MongoDB is unavailable.
+        self._client = client if client is not None else getattr(db, 'client', None)
+        self._db = db
+        self._routed = {}  # (collection, category) -> collection with read preference
+        self._local = threading.local()  # per-thread causal session
+        # Add shard keys to filters when they can be derived (sharded clusters only)
+        self.shard_targeting = get_settings()["SHARD_TARGETING"]
+        # Optional prefix index (e.g. text_index.InvertedIndex), kept in sync on property writes
+        self.autocomplete_backend = autocomplete_backend
+        # Optional search_cache.SearchCache in front of search_properties
+        self.search_cache = search_cache
+        # Optional property_snapshot.PropertySnapshot for in-memory numeric filters
+        self.property_snapshot = property_snapshot
+        self.transaction_metrics = TransactionMetrics()
+        # Optional contention.ShardedCounter for listing views (keeps hot listings write-free)
+        self.view_counter = view_counter
+        # Optional listing_stats.ViewRecorder for per-day view statistics
+        self.view_stats = view_stats
+        self.contention_metrics = ContentionMetrics()
+        # Match new properties and price changes against saved searches
+        self.search_alerts = search_alerts
+        # Circuit breakers, deadlines and load shedding (resilience.py); False disables
+        self.resilience = Resilience.from_settings() if resilience is None else (resilience or None)
+
+    @classmethod
+    def in_memory(cls, indexes: bool = True, **kwargs) -> "DatabaseOperations":
+        """
+        DatabaseOperations over a fresh memory_backend database
+
+        $text is simplified (token match, weighted by the text index, no stemming),
+        geo operators scan instead of using an index, and transactions do not roll back.
+
+        Args:
+            indexes: Build secondary indexes from init_db.INDEX_SPECS
+            **kwargs: Passed to the constructor (search_cache, view_counter, ...)
+        """
+        from memory_backend import memory_database
+        return cls(db=memory_database(get_settings()["DB_NAME"], indexes=indexes), **kwargs)
+
+    def _connect(self):
+        if self._db is None:
+            client, db = get_database(ping=False)
+            self._client = self._client or client
+            self._db = db
+
+    @property
+    def client(self):
+        """MongoDB client (created lazily, stored for transactions)"""
+        self._connect()
+        return self._client
+
+    @property
+    def db(self):
+        """Database handle (created lazily)"""
+        self._connect()
+        return self._db
+
+    @property
+    def is_connected(self) -> bool:
+        """Whether a client has been created (does not contact the server)"""
+        return self._client is not None
+
+    def is_ready(self, timeout: float = 0.5) -> bool:
+        """Non-blocking readiness check: ping with a short timeout"""
+        return check_ready(self.client, timeout=timeout)
+
+    def wait_until_ready(self, retries: int = 5, initial_delay: float = 0.2, max_delay: float = 5.0) -> bool:
+        """Wait for the server with exponential backoff between pings"""
+        return wait_until_ready(self.client, retries=retries, initial_delay=initial_delay, max_delay=max_delay)
+
+    # ==================== READ ROUTING ====================
+
+    def _read(self, collection: str, category: str):
+        """Collection handle using the read preference configured for a category"""
+        key = (collection, category)
+        routed = self._routed.get(key)
+        if routed is None:
+            routed = self._routed[key] = self.db.get_collection(
+                collection, read_preference=get_read_preference(category)
+            )
+        return routed
+
+    def _guarded_call(self, collection: str, kind: str, fn):
+        """Run fn through self.resilience, for calls whose collection is only known at runtime (see guarded)"""
+        if self.resilience is None:
+            return fn()
+        return self.resilience.call(collection, kind, fn)
+
+    @property
+    def _session(self):
+        """Causal session active on this thread (None outside causal_session())"""
+        return getattr(self._local, 'session', None)
+
+    @contextmanager
+    def causal_session(self):
+        """
+        Read-your-own-writes scope
+
+        Every operation issued through this object on the current thread inside
+        the block shares one causally consistent session, so searches routed to
+        secondaries wait until they have replicated the writes made earlier in
+        the block.
+
+            with db_ops.causal_session():
+                db_ops.create_listing({...})
+                db_ops.get_listings_by_lister(uid)  # includes the new listing
+        """
+        if self._session is not None:
+            yield self._session
+            return
+        with self.client.start_session(causal_consistency=True) as session:
+            self._local.session = session
+            try:
+                yield session
+            finally:
+                self._local.session = None
 
     # ==================== USER OPERATIONS ====================
 
+    @guarded("users", "write")
     def create_user(self, user_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new user"""
         user_data['created_at'] = datetime.now(timezone.utc)
@@ -28,35 +165,62 @@ class DatabaseOperations:
         user_data.setdefault('two_factor_enabled', False)
         user_data.setdefault('is_suspended', False)
         user_data.setdefault('is_banned', False)
+        user_data.setdefault('version', 0)
 
-        result = self.db.users.insert_one(user_data)
+        validate_document('users', user_data)
+        result = self.db.users.insert_one(user_data, session=self._session)
         user_data['_id'] = result.inserted_id
         return user_data
 
+    @guarded("users", "read", fallback=True)
     def get_user_by_firebase_uid(self, firebase_uid: str) -> Optional[Dict[str, Any]]:
         """Get user by Firebase UID"""
-        return self.db.users.find_one({"firebase_uid": firebase_uid})
+        return self.db.users.find_one({"firebase_uid": firebase_uid}, session=self._session)
 
+    @guarded("users")
+    def get_users_by_firebase_uids(self, firebase_uids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """Get many users in one query (keyed by firebase_uid; missing uids are absent)"""
+        cursor = self.db.users.find({"firebase_uid": {"$in": list(set(firebase_uids))}}, session=self._session)
+        return {user['firebase_uid']: user for user in cursor}
+
+    @guarded("users", "search")
     def get_users_by_role(self, role: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get users by role"""
-        return list(self.db.users.find({"role": role}).limit(limit))
+        return list(self._read("users", "search").find({"role": role}, session=self._session).limit(limit))
+
+    @guarded("users", "write")
+    def update_user(self, firebase_uid: str, update_data: Dict[str, Any],
+                    expected_version: Optional[int] = None) -> bool:
+        """
+        Update user information
 
-    def update_user(self, firebase_uid: str, update_data: Dict[str, Any]) -> bool:
-        """Update user information"""
+        Raises:
+            VersionConflictError: If expected_version is given and the user has
+                been modified since that version was read
+        """
         update_data['updated_at'] = datetime.now(timezone.utc)
-        result = self.db.users.update_one(
-            {"firebase_uid": firebase_uid},
-            {"$set": update_data}
-        )
-        return result.modified_count > 0
+        validate_document('users', update_data, partial=True)
+        return self._versioned_update('users', {"firebase_uid": firebase_uid}, update_data, expected_version)
 
-    def delete_user(self, firebase_uid: str) -> bool:
-        """Delete a user"""
-        result = self.db.users.delete_one({"firebase_uid": firebase_uid})
+    @guarded("users", "write")
+    def delete_user(self, firebase_uid: str, cascade_dependents: bool = False, archive: bool = False) -> bool:
+        """
+        Delete a user
+
+        Args:
+            cascade_dependents: Also remove the user's listings, saved items,
+                reviews, notifications, etc. in a background job
+            archive: Move the user (and dependents) to *_archive instead
+        """
+        if cascade_dependents or archive:
+            return self.cascade_delete('user', firebase_uid, archive=archive,
+                                       dependents=cascade_dependents).root_deleted
+        result = self.db.users.delete_one({"firebase_uid": firebase_uid}, session=self._session)
         return result.deleted_count > 0
 
     # ==================== PROPERTY OPERATIONS ====================
 
+    @guarded("properties", "write")
     def create_property(self, property_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new property"""
         property_data['created_at'] = datetime.now(timezone.utc)
@@ -84,18 +248,63 @@ class DatabaseOperations:
                 ]
             }
 
-        result = self.db.properties.insert_one(property_data)
+        # Shard key: coarse geo cell of the property
+        region = property_region(property_data)
+        if region is not None:
+            property_data['region'] = region
+
+        validate_document('properties', property_data)
+        result = self.db.properties.insert_one(property_data, session=self._session)
         property_data['_id'] = result.inserted_id
+        if self.autocomplete_backend is not None:
+            self.autocomplete_backend.add(property_data['_id'], property_data)
+        self._property_changed()
+        if self.search_alerts:
+            saved_searches.notify_matches(self.db, property_data, session=self._session)
         return property_data
 
-    def get_property_by_id(self, property_id: str) -> Optional[Dict[str, Any]]:
-        """Get property by ID"""
-        return self.db.properties.find_one({"_id": ObjectId(property_id)})
+    def _property_filter(self, property_id: str, region: Optional[str] = None) -> Dict[str, Any]:
+        """_id filter, plus the shard key when the caller knows it"""
+        query = {"_id": ObjectId(property_id)}
+        if region is not None:
+            query['region'] = region
+        return query
 
-    def search_properties(self, filters: Dict[str, Any], limit: int = 100) -> List[Dict[str, Any]]:
+    def _shard_key_filter(self, db, property_id: str, region: Optional[str] = None,
+                          session=None) -> Optional[Dict[str, Any]]:
         """
-        Search properties with filters.
-        Supports: property_type, price range, city/state, text search, and geospatial.
+        _id filter with the full shard key, looking the region up when not given
+
+        Returns:
+            dict: The filter, or None when the property does not exist
+        """
+        if region is not None:
+            return self._property_filter(property_id, region)
+        current = db.properties.find_one({"_id": ObjectId(property_id)}, {"region": 1}, session=session)
+        if current is None:
+            return None
+        # A property without coordinates has no region; the shard key value is then null
+        return {"_id": current['_id'], "region": current.get('region')}
+
+    def _property_changed(self):
+        """Invalidate derived property caches after a write"""
+        if self.search_cache is not None:
+            self.search_cache.bump_generation('properties')
+
+    @guarded("properties", "read", fallback=True)
+    def get_property_by_id(self, property_id: str, region: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get property by ID (pass region to target a single shard)"""
+        return self.db.properties.find_one(self._property_filter(property_id, region), session=self._session)
+
+    # Earth radius used by $centerSphere (radians = meters / radius)
+    EARTH_RADIUS_M = 6378100
+
+    def build_search_query(self, filters: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Translate search_properties filters into a MongoDB query.
+
+        $near cannot be combined with $text, so with a search_term the radius
+        is expressed as an (unsorted) $geoWithin/$centerSphere instead.
         """
         query = {}
 
@@ -105,15 +314,27 @@ class DatabaseOperations:
 
         # Geospatial search
         if 'near_lon' in filters and 'near_lat' in filters:
-            query['location.geo'] = {
-                '$near': {
-                    '$geometry': {
-                        'type': "Point",
-                        'coordinates': [filters['near_lon'], filters['near_lat']]
-                    },
-                    '$maxDistance': filters.get('max_dist_meters', 10000)
+            center = [filters['near_lon'], filters['near_lat']]
+            max_dist = filters.get('max_dist_meters', 10000)
+            if '$text' in query:
+                query['location.geo'] = {
+                    '$geoWithin': {'$centerSphere': [center, max_dist / self.EARTH_RADIUS_M]}
                 }
-            }
+            else:
+                query['location.geo'] = {
+                    '$near': {
+                        '$geometry': {
+                            'type': "Point",
+                            'coordinates': center
+                        },
+                        '$maxDistance': max_dist
+                    }
+                }
+            # Target only the shards owning nearby geo cells
+            if self.shard_targeting:
+                cells = cells_within(filters['near_lat'], filters['near_lon'], max_dist)
+                if cells:
+                    query['region'] = {'$in': cells}
 
         # Property type
         if 'property_type' in filters:
@@ -139,26 +360,186 @@ class DatabaseOperations:
         if 'min_bedrooms' in filters:
             query['bedrooms'] = {"$gte": filters['min_bedrooms']}
 
-        return list(self.db.properties.find(query).limit(limit))
+        # Area range (sqft)
+        if 'min_area' in filters or 'max_area' in filters:
+            query['area_sqft'] = {}
+            if 'min_area' in filters:
+                query['area_sqft']['$gte'] = filters['min_area']
+            if 'max_area' in filters:
+                query['area_sqft']['$lte'] = filters['max_area']
+
+        # Bounding box: bbox=(min_lat, min_lon, max_lat, max_lon)
+        if 'bbox' in filters:
+            min_lat, min_lon, max_lat, max_lon = filters['bbox']
+            within = {'$geoWithin': {'$box': [[min_lon, min_lat], [max_lon, max_lat]]}}
+            if 'location.geo' in query:
+                query['$and'] = [{'location.geo': within}]
+            else:
+                query['location.geo'] = within
+
+        return query
+
+    @guarded("properties")
+    def get_properties_by_ids(self, property_ids: List[Any]) -> Dict[ObjectId, Dict[str, Any]]:
+        """Get many properties in one query (keyed by ObjectId; missing ids are absent)"""
+        ids = list({ObjectId(pid) for pid in property_ids})
+        return {doc['_id']: doc for doc in self.db.properties.find({"_id": {"$in": ids}}, session=self._session)}
+
+    @guarded("properties", "search")
+    def search_properties(self, filters: Dict[str, Any], limit: int = 100) -> List[Dict[str, Any]]:
+        """
+        Search properties with filters.
+        Supports: property_type, price and area ranges, city/state, text search,
+        and geospatial (radius or bbox=(min_lat, min_lon, max_lat, max_lon)).
 
-    def update_property(self, property_id: str, update_data: Dict[str, Any]) -> bool:
-        """Update property and manage price history"""
-        update_data['updated_at'] = datetime.now(timezone.utc)
+        Text searches are ranked by relevance (each result carries its `score`);
+        geo-only searches are ordered by distance. With a search_cache configured,
+        result ids are served from the cache and only the page is fetched.
+        """
+        if self.search_cache is None:
+            return self._run_search(filters, limit)
 
-        # Handle price change
-        if 'current_price' in update_data:
-            property = self.get_property_by_id(property_id)
-            if property and property['current_price'] != update_data['current_price']:
-                self.db.properties.update_one(
-                    {"_id": ObjectId(property_id)},
-                    {"$push": {
-                        "price_history": {
-                            "price": update_data['current_price'],
-                            "changed_at": datetime.now(timezone.utc),
-                            "reason": update_data.get('price_change_reason', 'Price updated')
-                        }
-                    }}
-                )
+        ranked = self.search_cache.get_or_load(
+            'properties', filters, limit,
+            lambda: [(doc['_id'], doc.get('score')) for doc in self._run_search(filters, limit, ids_only=True)]
+        )
+        return self._fetch_ranked(ranked)
+
+    @guarded("properties", "search")
+    def search_property_ids(self, filters: Dict[str, Any], limit: int = 100) -> List[ObjectId]:
+        """
+        Property _ids matching filters, answered from the in-memory snapshot
+        when one is configured and every filter is numeric/geo (see
+        property_snapshot.SUPPORTED_FILTERS); otherwise via search_properties.
+
+        When the snapshot holds only actively listed properties, the fallback
+        is restricted to them as well, so both paths return the same set.
+        """
+        snapshot = self.property_snapshot
+        if snapshot is not None and snapshot.supports(filters):
+            return snapshot.query(filters, limit)
+        if snapshot is not None and snapshot.active_only:
+            # Depends on listings as well, so not served from the properties search cache
+            return [doc['_id'] for doc in self._run_search(filters, limit, ids_only=True, active_only=True)]
+        if self.search_cache is not None:
+            return [_id for _id, _ in self.search_cache.get_or_load(
+                'properties', filters, limit,
+                lambda: [(doc['_id'], doc.get('score')) for doc in self._run_search(filters, limit, ids_only=True)]
+            )]
+        return [doc['_id'] for doc in self._run_search(filters, limit, ids_only=True)]
+
+    def _fetch_ranked(self, ranked: List) -> List[Dict[str, Any]]:
+        """Fetch properties for (id, score) pairs in one query, preserving order"""
+        if not ranked:
+            return []
+        docs = {
+            doc['_id']: doc
+            for doc in self._read("properties", "search").find(
+                {'_id': {'$in': [_id for _id, _ in ranked]}}, session=self._session
+            )
+        }
+        results = []
+        for _id, score in ranked:
+            doc = docs.get(_id)
+            if doc is not None:
+                if score is not None:
+                    doc['score'] = score
+                results.append(doc)
+        return results
+
+    # Candidates checked against listings per round trip by _take_active
+    ACTIVE_BATCH_SIZE = 500
+
+    def _take_active(self, cursor, limit: int) -> List[Dict[str, Any]]:
+        """
+        Semi-join: the first `limit` cursor documents whose property is actively listed
+
+        Candidates are checked in cursor order, one bounded $in on
+        listings.property_id per batch, so the set of active properties is
+        never materialized and ranking order is preserved.
+        """
+        results = []
+        batch_size = max(limit, self.ACTIVE_BATCH_SIZE)
+        batch = []
+        for doc in cursor.batch_size(batch_size):
+            batch.append(doc)
+            if len(batch) < batch_size:
+                continue
+            results.extend(self._active_in(batch))
+            if len(results) >= limit:
+                break
+            batch = []
+        else:
+            results.extend(self._active_in(batch))
+        cursor.close()
+        return results[:limit]
+
+    def _active_in(self, docs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        if not docs:
+            return []
+        active = set(self.db.listings.distinct(
+            'property_id',
+            {'property_id': {'$in': [doc['_id'] for doc in docs]}, 'status': ListingStatus.ACTIVE},
+            session=self._session
+        ))
+        return [doc for doc in docs if doc['_id'] in active]
+
+    def _run_search(self, filters: Dict[str, Any], limit: int, ids_only: bool = False,
+                    active_only: bool = False) -> List[Dict[str, Any]]:
+        query = self.build_search_query(filters)
+        properties = self._read("properties", "search")
+        projection = {'_id': 1} if ids_only else None
+
+        def take(cursor):
+            return self._take_active(cursor, limit) if active_only else list(cursor.limit(limit))
+
+        if '$text' not in query:
+            return take(properties.find(query, projection, session=self._session))
+
+        score = {'score': {'$meta': 'textScore'}}
+        if 'location.geo' not in query:
+            return take(
+                properties.find(query, {**(projection or {}), **score}, session=self._session)
+                .sort([('score', {'$meta': 'textScore'})])
+            )
+
+        # Text + geo: phase 1 ranks matching ids only (small in-memory sort),
+        # phase 2 fetches the full documents for the page and restores the order.
+        ranked = take(
+            properties.find(query, {'_id': 1, **score}, session=self._session)
+            .sort([('score', {'$meta': 'textScore'})])
+        )
+        if ids_only:
+            return ranked
+        return self._fetch_ranked([(doc['_id'], doc['score']) for doc in ranked])
+
+    def autocomplete(self, prefix: str, limit: int = 10) -> Dict[str, Any]:
+        """
+        Prefix search for search-as-you-type (requires an autocomplete backend)
+
+        Returns:
+            dict: {"suggestions": [(term, count)], "property_ids": [ObjectId]}
+        """
+        if self.autocomplete_backend is None:
+            raise RuntimeError("No autocomplete backend configured (see text_index.build_property_index)")
+        return {
+            "suggestions": self.autocomplete_backend.suggest(prefix, limit),
+            "property_ids": self.autocomplete_backend.search_prefix(prefix, limit),
+        }
+
+    @guarded("properties", "write")
+    def update_property(self, property_id: str, update_data: Dict[str, Any], region: Optional[str] = None) -> bool:
+        """
+        Update property and manage price history
+
+        properties is sharded on {region, _id}, and a single-document
+        findAndModify needs the full shard key, so pass the property's current
+        region when known (as for get_property_by_id); otherwise it is looked
+        up first. A location change rewrites the shard key and runs in a
+        transaction, with the current key in the filter.
+        """
+        update_data['updated_at'] = datetime.now(timezone.utc)
+        validate_document('properties', update_data, partial=True)
 
         # Update GeoJSON if location changes
         if (
@@ -173,120 +554,390 @@ class DatabaseOperations:
                     update_data['location']['latitude']
                 ]
             }
+            update_data['region'] = property_region(update_data)
 
-        result = self.db.properties.update_one(
-            {"_id": ObjectId(property_id)},
-            {"$set": update_data}
-        )
-        return result.modified_count > 0
+        # One atomic pipeline update instead of read + $push + $set: the first
+        # stage appends to price_history only if current_price really changes.
+        pipeline = [{"$set": {key: {"$literal": value} for key, value in update_data.items()}}]
+        if 'current_price' in update_data:
+            entry = {
+                "price": update_data['current_price'],
+                "changed_at": datetime.now(timezone.utc),
+                "reason": update_data.get('price_change_reason', 'Price updated')
+            }
+            pipeline.insert(0, {"$set": {"price_history": {"$cond": [
+                {"$ne": ["$current_price", {"$literal": update_data['current_price']}]},
+                {"$concatArrays": [{"$ifNull": ["$price_history", []]}, {"$literal": [entry]}]},
+                "$price_history"
+            ]}}})
+
+        def apply(db, session):
+            query = self._shard_key_filter(db, property_id, region, session)
+            if query is None:
+                return None
+            return db.properties.find_one_and_update(
+                query,
+                pipeline,
+                projection={"current_price": 1},
+                session=session
+            )
 
-    def delete_property(self, property_id: str) -> bool:
-        """Delete a property"""
-        result = self.db.properties.delete_one({"_id": ObjectId(property_id)})
+        if 'region' in update_data and update_data['region'] != region:
+            before = self.unit_of_work(lambda uow: apply(uow.db, uow.session))
+        else:
+            before = apply(self.db, self._session)
+        region = update_data.get('region', region)
+        modified = before is not None
+        if self.autocomplete_backend is not None and modified and (
+            {'title', 'description', 'location'} & update_data.keys()
+        ):
+            self.autocomplete_backend.add(ObjectId(property_id), self.get_property_by_id(property_id, region))
+        if modified:
+            self._property_changed()
+        if (
+            self.search_alerts and modified and 'current_price' in update_data
+            and before.get('current_price') != update_data['current_price']
+        ):
+            updated = self.get_property_by_id(property_id, region)
+            saved_searches.notify_matches(
+                self.db, updated, previous={**updated, 'current_price': before.get('current_price')},
+                session=self._session
+            )
+        return modified
+
+    @guarded("properties", "write")
+    def delete_property(self, property_id: str, region: Optional[str] = None,
+                        cascade_dependents: bool = False, archive: bool = False) -> bool:
+        """Delete a property (optionally cascading to listings, reviews, comparisons; see delete_user)"""
+        if cascade_dependents or archive:
+            return self.cascade_delete('property', property_id, archive=archive,
+                                       dependents=cascade_dependents, region=region).root_deleted
+        result = self.db.properties.delete_one(self._property_filter(property_id, region), session=self._session)
+        if self.autocomplete_backend is not None and result.deleted_count:
+            self.autocomplete_backend.remove(ObjectId(property_id))
+        if result.deleted_count:
+            self._property_changed()
         return result.deleted_count > 0
 
     # ==================== LISTING OPERATIONS ====================
 
+    @guarded("listings", "write")
     def create_listing(self, listing_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a new listing"""
         listing_data['created_at'] = datetime.now(timezone.utc)
         listing_data['updated_at'] = datetime.now(timezone.utc)
         listing_data.setdefault('status', 'pending')
         listing_data.setdefault('views_count', 0)
+        listing_data.setdefault('version', 0)
 
         if 'property_id' in listing_data and isinstance(listing_data['property_id'], str):
             listing_data['property_id'] = ObjectId(listing_data['property_id'])
 
-        result = self.db.listings.insert_one(listing_data)
+        validate_document('listings', listing_data)
+        result = self.db.listings.insert_one(listing_data, session=self._session)
         listing_data['_id'] = result.inserted_id
         return listing_data
 
-    def get_listing_by_id(self, listing_id: str, increment_view: bool = False) -> Optional[Dict[str, Any]]:
-        """Get listing by ID (optionally increment view count)"""
-        if increment_view:
+    def _listing_filter(self, listing_id: str, lister_firebase_uid: Optional[str] = None) -> Dict[str, Any]:
+        """_id filter, plus the shard key when the caller knows it"""
+        query = {"_id": ObjectId(listing_id)}
+        if lister_firebase_uid is not None:
+            query['lister_firebase_uid'] = lister_firebase_uid
+        return query
+
+    @guarded("listings", "read", fallback=True)
+    def get_listing_by_id(self, listing_id: str, increment_view: bool = False,
+                          lister_firebase_uid: Optional[str] = None) -> Optional[Dict[str, Any]]:
+        """Get listing by ID (optionally increment view count; pass the lister to target one shard)"""
+        query = self._listing_filter(listing_id, lister_firebase_uid)
+        if increment_view and self.view_counter is None:
             self.db.listings.update_one(
-                {"_id": ObjectId(listing_id)},
-                {"$inc": {"views_count": 1}}
+                query,
+                {"$inc": {"views_count": 1}},
+                session=self._session
             )
-        return self.db.listings.find_one({"_id": ObjectId(listing_id)})
-
+        listing = self.db.listings.find_one(query, session=self._session)
+        # Views of unknown (or another lister's) ids must not create counter shards or stats buckets
+        if increment_view and listing is not None:
+            if self.view_counter is not None:
+                self.view_counter.increment(listing['_id'], session=self._session)
+            if self.view_stats is not None:
+                self.view_stats.record(listing['_id'])
+        if listing is not None and self.view_counter is not None:
+            listing['views_count'] = listing.get('views_count', 0) + self.view_counter.get(listing['_id'], session=self._session)
+        return listing
+
+    @guarded("listings")
+    def get_listings_by_ids(self, listing_ids: List[Any]) -> Dict[ObjectId, Dict[str, Any]]:
+        """Get many listings in one query (keyed by ObjectId; missing ids are absent)"""
+        ids = list({ObjectId(lid) for lid in listing_ids})
+        listings = {doc['_id']: doc for doc in self.db.listings.find({"_id": {"$in": ids}}, session=self._session)}
+        if listings and self.view_counter is not None:
+            pending = self.view_counter.get_many(listings, session=self._session)
+            for lid, listing in listings.items():
+                listing['views_count'] = listing.get('views_count', 0) + pending.get(lid, 0)
+        return listings
+
+    @guarded("listings", "search")
     def get_listings_by_status(self, status: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get listings by status"""
-        return list(self.db.listings.find({"status": status}).limit(limit))
+        return list(self._read("listings", "search").find({"status": status}, session=self._session).limit(limit))
 
+    @guarded("listings", "search")
     def get_listings_by_lister(self, lister_firebase_uid: str, limit: int = 100) -> List[Dict[str, Any]]:
         """Get listings by lister"""
-        return list(self.db.listings.find({"lister_firebase_uid": lister_firebase_uid}).limit(limit))
+        return list(self._read("listings", "search").find({"lister_firebase_uid": lister_firebase_uid}, session=self._session).limit(limit))
+
+    @guarded("listings", "write")
+    def update_listing(self, listing_id: str, update_data: Dict[str, Any],
+                       lister_firebase_uid: Optional[str] = None, expected_version: Optional[int] = None) -> bool:
+        """
+        Update listing
 
-    def update_listing(self, listing_id: str, update_data: Dict[str, Any]) -> bool:
-        """Update listing"""
+        Raises:
+            VersionConflictError: If expected_version is given and the listing
+                has been modified since that version was read
+        """
         update_data['updated_at'] = datetime.now(timezone.utc)
+        validate_document('listings', update_data, partial=True)
 
         if update_data.get('status') == 'verified' and 'verified_at' not in update_data:
             update_data['verified_at'] = datetime.now(timezone.utc)
 
-        result = self.db.listings.update_one(
-            {"_id": ObjectId(listing_id)},
-            {"$set": update_data}
+        return self._versioned_update(
+            'listings', self._listing_filter(listing_id, lister_firebase_uid), update_data, expected_version
         )
-        return result.modified_count > 0
 
-    def delete_listing(self, listing_id: str) -> bool:
-        """Delete a listing"""
-        result = self.db.listings.delete_one({"_id": ObjectId(listing_id)})
+    @guarded("listings", "write")
+    def delete_listing(self, listing_id: str, lister_firebase_uid: Optional[str] = None,
+                       cascade_dependents: bool = False, archive: bool = False) -> bool:
+        """Delete a listing (optionally cascading to saved listings and view counters; see delete_user)"""
+        if cascade_dependents or archive:
+            return self.cascade_delete('listing', listing_id, archive=archive, dependents=cascade_dependents,
+                                       lister_firebase_uid=lister_firebase_uid).root_deleted
+        result = self.db.listings.delete_one(self._listing_filter(listing_id, lister_firebase_uid), session=self._session)
         return result.deleted_count > 0
 
+    # ==================== CASCADE / ARCHIVAL OPERATIONS ====================
+
+    def cascade_delete(self, kind: str, key: str, archive: bool = False, dependents: bool = True,
+                       background: bool = True, region: Optional[str] = None,
+                       lister_firebase_uid: Optional[str] = None, **job_options) -> cascade.CascadeJob:
+        """
+        Delete (or archive) a user, property or listing, then its dependents
+
+        The root document is removed immediately; dependents are drained in
+        throttled batches by a CascadeJob (in a background thread unless
+        background=False). Progress is in job.progress and cascade_jobs.
+
+        Args:
+            kind: "user", "property" or "listing"
+            key: firebase_uid for users, _id for properties/listings
+            archive: Copy removed documents into <collection>_archive
+            dependents: Also remove dependents (False removes the root only)
+            background: Return immediately and run the cascade in a thread
+            job_options: batch_size / pause for CascadeJob
+
+        Returns:
+            CascadeJob: With root_deleted set
+        """
+        counters = [self.view_counter.name] if self.view_counter is not None else []
+        if kind == 'user':
+            collection, query = 'users', {"firebase_uid": key}
+            steps = cascade.user_steps(key, counters)
+        elif kind == 'property':
+            collection, query = 'properties', self._property_filter(key, region)
+            steps = cascade.property_steps(query['_id'], counters)
+        elif kind == 'listing':
+            collection, query = 'listings', self._listing_filter(key, lister_firebase_uid)
+            steps = cascade.listing_steps([query['_id']], counters)
+        else:
+            raise ValueError(f"Unknown cascade kind {kind!r} (expected user, property or listing)")
+
+        def delete_root():
+            if archive:
+                root = self.db[collection].find_one(query, session=self._session)
+                if root is not None:
+                    cascade.copy_to_archive(self.db, collection, [root])
+            return self.db[collection].delete_one(query, session=self._session).deleted_count > 0
+
+        # Only the root delete runs under the write deadline; the dependents are
+        # drained in throttled batches that may take far longer
+        deleted = self._guarded_call(collection, 'write', delete_root)
+        if deleted and kind == 'property':
+            if self.autocomplete_backend is not None:
+                self.autocomplete_backend.remove(query['_id'])
+            self._property_changed()
+
+        job = cascade.CascadeJob(self.db, f"{kind}:{key}", steps if dependents else [], archive=archive,
+                                 **job_options)
+        job.root_deleted = deleted
+        if not deleted:
+            job.done.set()
+        elif background:
+            job.start()
+        else:
+            job.run()
+        return job
+
+    @guarded("cascade_jobs")
+    def get_cascade_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Progress record of a cascade job (status, per-collection counts)"""
+        return self.db[cascade.JOBS_COLLECTION].find_one({"_id": ObjectId(job_id)}, session=self._session)
+
+    def archive_stale(self, **options) -> Dict[str, int]:
+        """Archive expired/rejected listings and old notifications (see cascade.archive_stale)"""
+        counters = [self.view_counter.name] if self.view_counter is not None else []
+        return cascade.archive_stale(self.db, counter_names=counters, **options)
+
+    # ==================== OPTIMISTIC CONCURRENCY ====================
+
+    def _versioned_update(self, collection: str, query: Dict[str, Any], update_data: Dict[str, Any],
+                          expected_version: Optional[int] = None) -> bool:
+        """$set update_data and bump `version`; with expected_version, only if it still matches"""
+        update_data.pop('version', None)
+        version_query = {**query, **version_filter(expected_version)} if expected_version is not None else query
+        result = self.db[collection].update_one(
+            version_query,
+            {"$set": update_data, "$inc": {"version": 1}},
+            session=self._session
+        )
+        conflict = (
+            expected_version is not None and result.matched_count == 0
+            and self.db[collection].count_documents(query, limit=1, session=self._session) > 0
+        )
+        self.contention_metrics.record(collection, conflicts=int(conflict))
+        if conflict:
+            raise VersionConflictError(collection, query, expected_version)
+        return result.modified_count > 0
+
+    def optimistic_update(self, collection: str, query: Dict[str, Any], mutate, max_retries: int = 5) -> bool:
+        """
+        Read-modify-write without locks or transactions
+
+        mutate(doc) returns the fields to $set (or None to skip the write). If
+        another writer bumps the version in between, the document is re-read
+        and mutate is called again, up to max_retries times.
+
+        Args:
+            collection: "users" or "listings" (any collection with a version field)
+            query: Filter matching exactly one document
+            mutate: Callable computing the update from the current document
+            max_retries: Retries after a version conflict
+
+        Returns:
+            bool: True if the document was modified
+
+        Raises:
+            VersionConflictError: If every attempt conflicted
+        """
+        return self._guarded_call(collection, 'write',
+                                  lambda: self._optimistic_update(collection, query, mutate, max_retries))
+
+    def _optimistic_update(self, collection: str, query: Dict[str, Any], mutate, max_retries: int) -> bool:
+        conflicts = 0
+        for attempt in range(max_retries + 1):
+            doc = self.db[collection].find_one(query, session=self._session)
+            if doc is None:
+                break
+            update_data = mutate(doc)
+            if not update_data:
+                break
+            update_data['updated_at'] = datetime.now(timezone.utc)
+            validate_document(collection, update_data, partial=True)
+            update_data.pop('version', None)
+            result = self.db[collection].update_one(
+                {**query, **version_filter(doc.get('version', 0))},
+                {"$set": update_data, "$inc": {"version": 1}},
+                session=self._session
+            )
+            if result.matched_count:
+                self.contention_metrics.record(collection, conflicts=conflicts, retries=attempt)
+                return result.modified_count > 0
+            conflicts += 1
+            time.sleep(random.uniform(0, min(0.2, 0.005 * (2 ** attempt))))
+        else:
+            self.contention_metrics.record(collection, conflicts=conflicts, retries=max_retries)
+            raise VersionConflictError(collection, query, doc.get('version', 0))
+        self.contention_metrics.record(collection, conflicts=conflicts, retries=conflicts)
+        return False
+
+    def fold_view_counts(self, listing_ids: Optional[List[Any]] = None) -> int:
+        """Move sharded view counts into listings.views_count (run periodically)"""
+        if self.view_counter is None:
+            return 0
+        ids = [ObjectId(lid) for lid in listing_ids] if listing_ids is not None else None
+        return self.view_counter.fold(self.db.listings, 'views_count', ids)
+
     # ==================== VERIFICATION DOCUMENT OPERATIONS ====================
 
+    @guarded("verification_documents", "write")
     def create_verification_document(self, doc_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create verification document"""
         doc_data['created_at'] = datetime.now(timezone.utc)
         doc_data.setdefault('status', 'pending')
 
-        result = self.db.verification_documents.insert_one(doc_data)
+        validate_document('verification_documents', doc_data)
+        result = self.db.verification_documents.insert_one(doc_data, session=self._session)
         doc_data['_id'] = result.inserted_id
         return doc_data
 
+    @guarded("transactions", "write")
+    def unit_of_work(self, callback, max_retries: int = 5):
+        """
+        Run callback(uow) as one transaction with bounded retries
+
+        The callback writes through uow.db with session=uow.session and queues
+        audit logs/notifications with uow.add_audit_log/uow.add_notification;
+        those are bulk-inserted at commit. Latency and retry counts are
+        recorded in self.transaction_metrics.
+
+        Raises:
+            PyMongoError: If the transaction cannot be committed
+        """
+        return run_transaction(self.client, self.db, callback, self.transaction_metrics, max_retries=max_retries)
+
+    @guarded("verification_documents", "write")
     def verify_document(self, document_id: str, admin_uid: str, status: str, rejection_reason: str = None) -> bool:
         """Verify or reject a document using transaction-safe logic"""
-        try:
-            def transaction_callback(session):
-                update_data = {
-                    'status': status,
-                    'verified_by_admin_uid': admin_uid,
-                    'verified_at': datetime.now(timezone.utc)
-                }
-                if rejection_reason:
-                    update_data['rejection_reason'] = rejection_reason
-
-                # Update verification document
-                result = self.db.verification_documents.update_one(
-                    {"_id": ObjectId(document_id)},
-                    {"$set": update_data},
-                    session=session
+        def transaction_callback(uow):
+            update_data = {
+                'status': status,
+                'verified_by_admin_uid': admin_uid,
+                'verified_at': datetime.now(timezone.utc)
+            }
+            if rejection_reason:
+                update_data['rejection_reason'] = rejection_reason
+
+            # Update verification document and read it back in one round trip
+            doc = uow.db.verification_documents.find_one_and_update(
+                {"_id": ObjectId(document_id)},
+                {"$set": update_data},
+                projection={"document_type": 1, "user_firebase_uid": 1},
+                session=uow.session
+            )
+            if doc is None:
+                raise PyMongoError(f"Document {document_id} not found.")
+
+            # If identity proof verified, update user verification status
+            if status == 'verified' and doc.get('document_type') == 'identity_proof':
+                user_update_result = uow.db.users.update_one(
+                    {"firebase_uid": doc['user_firebase_uid']},
+                    {"$set": {"verification_status": "verified"}},
+                    session=uow.session
                 )
+                if user_update_result.modified_count == 0:
+                    print(f"⚠️ User {doc['user_firebase_uid']} may already be verified.")
 
-                if result.modified_count == 0:
-                    raise PyMongoError(f"Document {document_id} not found or not modified.")
-
-                # If identity proof verified, update user verification status
-                if status == 'verified':
-                    doc = self.db.verification_documents.find_one(
-                        {"_id": ObjectId(document_id)},
-                        session=session
-                    )
-                    if doc and doc.get('document_type') == 'identity_proof':
-                        user_update_result = self.db.users.update_one(
-                            {"firebase_uid": doc['user_firebase_uid']},
-                            {"$set": {"verification_status": "verified"}},
-                            session=session
-                        )
-                        if user_update_result.modified_count == 0:
-                            print(f"⚠️ User {doc['user_firebase_uid']} may already be verified.")
-
-            with self.client.start_session() as session:
-                session.with_transaction(transaction_callback)
+            uow.add_audit_log({
+                'user_firebase_uid': admin_uid,
+                'action': f'document_{status}',
+                'resource_type': 'verification_document',
+                'resource_id': document_id
+            })
 
+        try:
+            self.unit_of_work(transaction_callback)
             print("✓ Transaction successful: Document and User updated.")
             return True
 
@@ -294,20 +945,69 @@ class DatabaseOperations:
             print(f"✗ Transaction failed: {e}")
             return False
 
+    @guarded("listings", "write")
+    def verify_listing(self, listing_id: str, admin_uid: str, status: str, rejection_reason: str = None) -> bool:
+        """
+        Verify or reject a listing, notify the lister and audit-log the
+        decision atomically (one transaction)
+        """
+        def transaction_callback(uow):
+            update_data = {
+                'status': status,
+                'verified_by_admin_uid': admin_uid,
+                'updated_at': datetime.now(timezone.utc)
+            }
+            if status == 'verified':
+                update_data['verified_at'] = update_data['updated_at']
+            if rejection_reason:
+                update_data['rejection_reason'] = rejection_reason
+            validate_document('listings', update_data, partial=True)
+
+            listing = uow.db.listings.find_one_and_update(
+                {"_id": ObjectId(listing_id)},
+                {"$set": update_data, "$inc": {"version": 1}},
+                projection={"lister_firebase_uid": 1},
+                session=uow.session
+            )
+            if listing is None:
+                raise PyMongoError(f"Listing {listing_id} not found.")
+
+            uow.add_notification({
+                'user_firebase_uid': listing['lister_firebase_uid'],
+                'title': f'Listing {status}',
+                'message': rejection_reason or f'Your listing has been {status}.',
+                'notification_type': 'verification'
+            })
+            uow.add_audit_log({
+                'user_firebase_uid': admin_uid,
+                'action': f'listing_{status}',
+                'resource_type': 'listing',
+                'resource_id': listing_id
+            })
+
+        try:
+            self.unit_of_work(transaction_callback)
+            return True
+        except PyMongoError as e:
+            print(f"✗ Transaction failed: {e}")
+            return False
+
+    @guarded("verification_documents", "analytics")
     def get_pending_verifications(self, limit: int = 100) -> List[Dict[str, Any]]:
         """Get all pending verification documents"""
-        return list(self.db.verification_documents.find({"status": "pending"}).limit(limit))
+        return list(self.db.verification_documents.find({"status": "pending"}, session=self._session).limit(limit))
 
     # ==================== SAVED LISTING OPERATIONS ====================
 
+    @guarded("saved_listings", "write")
     def save_listing(self, user_firebase_uid: str, listing_id: str, notes: str = None) -> Dict[str, Any]:
         """Save a listing for a user"""
         listing_obj_id = ObjectId(listing_id)
 
-        existing = self.db.saved_listings.find_one({
-            "user_firebase_uid": user_firebase_uid,
-            "listing_id": listing_obj_id
-        })
+        existing = self.db.saved_listings.find_one(
+            {"user_firebase_uid": user_firebase_uid, "listing_id": listing_obj_id},
+            session=self._session
+        )
 
         if existing:
             return existing
@@ -319,30 +1019,243 @@ class DatabaseOperations:
             "saved_at": datetime.now(timezone.utc)
         }
 
-        result = self.db.saved_listings.insert_one(saved_data)
+        validate_document('saved_listings', saved_data)
+        result = self.db.saved_listings.insert_one(saved_data, session=self._session)
         saved_data['_id'] = result.inserted_id
         return saved_data
 
+    @guarded("saved_listings")
     def get_saved_listings(self, user_firebase_uid: str) -> List[Dict[str, Any]]:
         """Get all saved listings for a user"""
-        return list(self.db.saved_listings.find({"user_firebase_uid": user_firebase_uid}))
+        return list(self.db.saved_listings.find({"user_firebase_uid": user_firebase_uid}, session=self._session))
 
+    @guarded("saved_listings", "write")
     def remove_saved_listing(self, saved_id: str) -> bool:
         """Remove a saved listing"""
-        result = self.db.saved_listings.delete_one({"_id": ObjectId(saved_id)})
+        result = self.db.saved_listings.delete_one({"_id": ObjectId(saved_id)}, session=self._session)
+        return result.deleted_count > 0
+
+    # ==================== SAVED SEARCH OPERATIONS ====================
+
+    @guarded("saved_searches", "write")
+    def create_saved_search(self, user_firebase_uid: str, filters: Dict[str, Any],
+                            name: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Save search_properties filters; the user is notified when a new
+        property (or a price change) matches them
+
+        Returns the existing saved search if the user already saved
+        equivalent filters.
+        """
+        search = saved_searches.make_saved_search(user_firebase_uid, filters, name)
+        validate_document('saved_searches', search)
+        existing = self.db.saved_searches.find_one_and_update(
+            {"user_firebase_uid": user_firebase_uid, "filters_key": search['filters_key']},
+            {"$setOnInsert": search},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=self._session
+        )
+        return existing
+
+    @guarded("saved_searches")
+    def get_saved_searches(self, user_firebase_uid: str) -> List[Dict[str, Any]]:
+        """Get a user's saved searches"""
+        return list(self.db.saved_searches.find(
+            {"user_firebase_uid": user_firebase_uid}, {"match_keys": 0}, session=self._session
+        ).sort("created_at", -1))
+
+    @guarded("saved_searches", "write")
+    def delete_saved_search(self, saved_search_id: str, user_firebase_uid: str) -> bool:
+        """Delete a saved search owned by the user"""
+        result = self.db.saved_searches.delete_one(
+            {"_id": ObjectId(saved_search_id), "user_firebase_uid": user_firebase_uid}, session=self._session
+        )
         return result.deleted_count > 0
 
+    # ==================== MESSAGING OPERATIONS ====================
+
+    # Messages are appended to per-conversation bucket documents of this size
+    MESSAGE_BUCKET_SIZE = 50
+    MESSAGE_PREVIEW_CHARS = 100
+
+    @staticmethod
+    def conversation_id(uid_a: str, uid_b: str) -> str:
+        """Conversation key for a participant pair (independent of order)"""
+        return ":".join(sorted((uid_a, uid_b)))
+
+    def _inbox_update(self, user_firebase_uid: str, other_firebase_uid: str, conversation_id: str,
+                      n: int, preview: Dict[str, Any], read: bool) -> UpdateOne:
+        """Upsert one user's inbox entry for message n (out-of-order safe)"""
+        return UpdateOne(
+            {"_id": f"{user_firebase_uid}|{conversation_id}"},
+            [
+                {"$set": {
+                    "user_firebase_uid": user_firebase_uid,
+                    "conversation_id": conversation_id,
+                    "other_firebase_uid": other_firebase_uid,
+                    "last_message": {"$cond": [
+                        {"$gte": [n, {"$ifNull": ["$last_n", 0]}]}, {"$literal": preview}, "$last_message"
+                    ]},
+                    "last_message_at": {"$max": ["$last_message_at", preview['sent_at']]},
+                    "last_n": {"$max": [{"$ifNull": ["$last_n", 0]}, n]},
+                    "read_through": {"$max": [{"$ifNull": ["$read_through", 0]}, n if read else 0]},
+                }},
+                {"$set": {"unread_count": {"$subtract": ["$last_n", "$read_through"]}}},
+            ],
+            upsert=True
+        )
+
+    @guarded("message_buckets", "write")
+    def send_message(self, sender_firebase_uid: str, receiver_firebase_uid: str, content: str,
+                     listing_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Append a message to the conversation between sender and receiver
+
+        Three writes regardless of conversation length: bump the conversation
+        counter (which numbers the message), push into its bucket, and update
+        both participants' inbox entries.
+
+        Returns:
+            dict: The stored message plus conversation_id and message_id
+        """
+        now = datetime.now(timezone.utc)
+        conversation_id = self.conversation_id(sender_firebase_uid, receiver_firebase_uid)
+        message = {'sender_firebase_uid': sender_firebase_uid, 'content': content, 'sent_at': now}
+        if listing_id is not None:
+            message['listing_id'] = ObjectId(listing_id)
+        validate_document('message_buckets', {'messages': [message]}, partial=True)
+        preview = {
+            'sender_firebase_uid': sender_firebase_uid,
+            'preview': content[:self.MESSAGE_PREVIEW_CHARS],
+            'sent_at': now
+        }
+
+        conversation = self.db.conversations.find_one_and_update(
+            {"_id": conversation_id},
+            {
+                "$inc": {"message_count": 1},
+                "$set": {"last_message": preview, "updated_at": now},
+                "$setOnInsert": {
+                    "participants": sorted((sender_firebase_uid, receiver_firebase_uid)),
+                    "listing_id": message.get('listing_id'),
+                    "created_at": now
+                }
+            },
+            projection={"message_count": 1},
+            upsert=True,
+            return_document=ReturnDocument.AFTER,
+            session=self._session
+        )
+        n = message['n'] = conversation['message_count']
+
+        self.db.message_buckets.update_one(
+            {"conversation_id": conversation_id, "seq": (n - 1) // self.MESSAGE_BUCKET_SIZE},
+            {
+                "$push": {"messages": message},
+                "$inc": {"count": 1},
+                "$min": {"first_at": now},
+                "$max": {"last_at": now}
+            },
+            upsert=True,
+            session=self._session
+        )
+        self.db.user_conversations.bulk_write([
+            self._inbox_update(sender_firebase_uid, receiver_firebase_uid, conversation_id, n, preview, read=True),
+            self._inbox_update(receiver_firebase_uid, sender_firebase_uid, conversation_id, n, preview, read=False),
+        ], ordered=False, session=self._session)
+
+        message['conversation_id'] = conversation_id
+        message['message_id'] = f"{conversation_id}#{n}"
+        return message
+
+    @guarded("message_buckets")
+    def get_conversation_page(self, user_firebase_uid: str, other_firebase_uid: str,
+                              before_seq: Optional[int] = None, min_messages: int = 20) -> Dict[str, Any]:
+        """
+        Get a page of a conversation, newest first by page (messages oldest first)
+
+        A page is one bucket; if the newest bucket holds fewer than
+        min_messages, the previous bucket is included (at most two reads).
+
+        Args:
+            before_seq: Return buckets older than this seq (the previous page's "seq")
+
+        Returns:
+            dict: {"conversation_id", "seq", "messages", "has_more"}
+        """
+        conversation_id = self.conversation_id(user_firebase_uid, other_firebase_uid)
+        query = {"conversation_id": conversation_id}
+        if before_seq is not None:
+            query["seq"] = {"$lt": before_seq}
+        buckets = list(self.db.message_buckets.find(query, session=self._session).sort("seq", -1).limit(1))
+        if buckets and buckets[0]['count'] < min_messages and buckets[0]['seq'] > 0:
+            previous = self.db.message_buckets.find_one(
+                {"conversation_id": conversation_id, "seq": buckets[0]['seq'] - 1}, session=self._session
+            )
+            if previous is not None:
+                buckets.append(previous)
+        if not buckets:
+            return {"conversation_id": conversation_id, "seq": None, "messages": [], "has_more": False}
+
+        messages = sorted((m for bucket in buckets for m in bucket['messages']), key=lambda m: m['n'])
+        seq = buckets[-1]['seq']
+        return {"conversation_id": conversation_id, "seq": seq, "messages": messages, "has_more": seq > 0}
+
+    @guarded("user_conversations")
+    def get_conversations(self, user_firebase_uid: str, limit: int = 50) -> List[Dict[str, Any]]:
+        """Get a user's inbox: conversations with preview and unread count, most recent first"""
+        return list(self.db.user_conversations.find(
+            {"user_firebase_uid": user_firebase_uid}, session=self._session
+        ).sort("last_message_at", -1).limit(limit))
+
+    @guarded("user_conversations", "write")
+    def mark_conversation_read(self, user_firebase_uid: str, other_firebase_uid: str,
+                               through_n: Optional[int] = None) -> bool:
+        """Mark messages up to through_n (default: all) as read for this user"""
+        conversation_id = self.conversation_id(user_firebase_uid, other_firebase_uid)
+        read_to = "$last_n" if through_n is None else {"$min": ["$last_n", through_n]}
+        result = self.db.user_conversations.update_one(
+            {"_id": f"{user_firebase_uid}|{conversation_id}"},
+            [
+                {"$set": {"read_through": {"$max": ["$read_through", read_to]}}},
+                {"$set": {"unread_count": {"$subtract": ["$last_n", "$read_through"]}}},
+            ],
+            session=self._session
+        )
+        return result.modified_count > 0
+
+    @guarded("user_conversations", "write")
+    def mark_message_read(self, user_firebase_uid: str, message_id: str) -> bool:
+        """Mark a message (and everything before it) as read; message_id comes from send_message"""
+        conversation_id, n = message_id.rsplit("#", 1)
+        uid_a, uid_b = conversation_id.split(":", 1)
+        other_firebase_uid = uid_b if uid_a == user_firebase_uid else uid_a
+        return self.mark_conversation_read(user_firebase_uid, other_firebase_uid, through_n=int(n))
+
+    @guarded("user_conversations")
+    def get_unread_message_count(self, user_firebase_uid: str) -> int:
+        """Total unread messages across a user's conversations"""
+        totals = list(self.db.user_conversations.aggregate([
+            {"$match": {"user_firebase_uid": user_firebase_uid, "unread_count": {"$gt": 0}}},
+            {"$group": {"_id": None, "unread": {"$sum": "$unread_count"}}},
+        ], session=self._session))
+        return totals[0]['unread'] if totals else 0
+
     # ==================== NOTIFICATION OPERATIONS ====================
 
+    @guarded("notifications", "write")
     def create_notification(self, notification_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create a notification"""
         notification_data['created_at'] = datetime.now(timezone.utc)
         notification_data.setdefault('is_read', False)
 
-        result = self.db.notifications.insert_one(notification_data)
+        validate_document('notifications', notification_data)
+        result = self.db.notifications.insert_one(notification_data, session=self._session)
         notification_data['_id'] = result.inserted_id
         return notification_data
 
+    @guarded("notifications")
     def get_notifications(self, user_firebase_uid: str) -> List[Dict[str, Any]]:
         """Get notifications for a user (includes broadcasts)"""
         query = {
@@ -351,40 +1264,186 @@ class DatabaseOperations:
                 {"user_firebase_uid": None}
             ]
         }
-        return list(self.db.notifications.find(query).sort("created_at", -1))
+        return list(self.db.notifications.find(query, session=self._session).sort("created_at", -1))
 
+    @guarded("notifications", "write")
     def mark_notification_read(self, notification_id: str) -> bool:
         """Mark notification as read"""
         result = self.db.notifications.update_one(
             {"_id": ObjectId(notification_id)},
-            {"$set": {"is_read": True}}
+            {"$set": {"is_read": True}},
+            session=self._session
         )
         return result.modified_count > 0
 
     # ==================== AUDIT LOG OPERATIONS ====================
 
+    @guarded("audit_logs", "write")
     def create_audit_log(self, log_data: Dict[str, Any]) -> Dict[str, Any]:
         """Create an audit log entry"""
         log_data['timestamp'] = datetime.now(timezone.utc)
         log_data.setdefault('metadata', {})
 
-        result = self.db.audit_logs.insert_one(log_data)
+        validate_document('audit_logs', log_data)
+        result = self.db.audit_logs.insert_one(log_data, session=self._session)
         log_data['_id'] = result.inserted_id
         return log_data
 
+    @guarded("audit_logs", "analytics")
     def get_audit_logs(self, filters: Dict[str, Any] = None, limit: int = 100) -> List[Dict[str, Any]]:
         """Get audit logs with optional filters"""
         query = filters if filters else {}
-        return list(self.db.audit_logs.find(query).sort("timestamp", -1).limit(limit))
+        return list(self._read("audit_logs", "analytics").find(query, session=self._session).sort("timestamp", -1).limit(limit))
 
     # ==================== ANALYTICS OPERATIONS ====================
 
+    @guarded("analytics", "analytics")
     def get_analytics(self) -> Dict[str, int]:
         """Get database analytics"""
+        def count(collection, query):
+            return self._read(collection, "analytics").count_documents(query, session=self._session)
+
         return {
-            "total_users": self.db.users.count_documents({}),
-            "total_properties": self.db.properties.count_documents({}),
-            "total_listings": self.db.listings.count_documents({}),
-            "active_listings": self.db.listings.count_documents({"status": "active"}),
-            "pending_verifications": self.db.verification_documents.count_documents({"status": "pending"})
+            "total_users": count("users", {}),
+            "total_properties": count("properties", {}),
+            "total_listings": count("listings", {}),
+            "active_listings": count("listings", {"status": "active"}),
+            "pending_verifications": count("verification_documents", {"status": "pending"})
         }
+
+    # ==================== MARKET ANALYTICS OPERATIONS ====================
+
+    @guarded("properties", "analytics")
+    def get_price_per_sqft(self, city: str = None, property_type: str = None,
+                           group_by_type: bool = True) -> List[Dict[str, Any]]:
+        """Current price per sqft statistics (median, quartiles, mean) by city and type"""
+        pipeline = market_analytics.price_per_sqft_pipeline(group_by_type, city, property_type)
+        return list(self._read("properties", "analytics").aggregate(pipeline, session=self._session))
+
+    @guarded("properties", "analytics")
+    def get_price_drops(self, days: int = 7, min_drop_pct: float = 5.0, limit: int = 100) -> List[Dict[str, Any]]:
+        """Properties whose price dropped by at least min_drop_pct in the last `days` days"""
+        since = datetime.now(timezone.utc) - timedelta(days=days)
+        pipeline = market_analytics.price_drop_pipeline(since, min_drop_pct, limit)
+        return list(self._read("properties", "analytics").aggregate(pipeline, session=self._session))
+
+    @guarded("properties", "analytics")
+    def get_price_trends(self, months: int = 12, city: str = None, property_type: str = None,
+                         unit: str = "month", materialized: bool = False) -> List[Dict[str, Any]]:
+        """
+        Price-per-sqft percentiles per time bucket from price_history
+
+        With materialized=True, monthly buckets are read from market_stats
+        (see refresh_market_stats) instead of being recomputed.
+        """
+        start = datetime.now(timezone.utc) - timedelta(days=31 * months)
+        if materialized:
+            query = {"bucket": {"$gte": start}}
+            if city:
+                query["city"] = city
+            if property_type:
+                query["property_type"] = property_type
+            return list(
+                self._read(market_analytics.MARKET_STATS_COLLECTION, "analytics")
+                .find(query, session=self._session).sort("bucket", 1)
+            )
+        pipeline = market_analytics.price_trend_pipeline(start, unit, city, property_type)
+        return list(self._read("properties", "analytics").aggregate(pipeline, allowDiskUse=True, session=self._session))
+
+    def refresh_market_stats(self, full: bool = False) -> Dict[str, Any]:
+        """Recompute market_stats buckets touched since the last refresh"""
+        return market_analytics.refresh_market_stats(self.db, full=full)
+
+    # ==================== LISTING STATS OPERATIONS ====================
+
+    @guarded(listing_stats.VIEW_STATS_COLLECTION)
+    def get_listing_view_stats(self, listing_id: str, start: Optional[datetime] = None,
+                               end: Optional[datetime] = None) -> Dict[str, Any]:
+        """
+        Views per day for a listing (default: the last 30 days, including today)
+
+        Returns:
+            dict: {"listing_id", "start", "end", "total", "daily": [{"day", "views"}]}
+        """
+        end = end or datetime.now(timezone.utc)
+        start = start or end - timedelta(days=29)
+        listing_id = ObjectId(listing_id)
+        pending = self.view_stats.pending(listing_id) if self.view_stats is not None else None
+        return listing_stats.view_stats(self.db, listing_id, start, end, pending)
+
+    @guarded(listing_stats.TRENDING_COLLECTION, "read", fallback=True)
+    def get_trending_listings(self, window: str = "7d", limit: int = 20) -> List[Dict[str, Any]]:
+        """
+        Most viewed active listings over a rolling window ("1d", "7d" or "30d")
+
+        Reads the list stored by refresh_trending_listings; each entry has
+        listing_id, property_id, lister_firebase_uid, price, listing_type and views.
+        """
+        return listing_stats.trending(self.db, window, limit)
+
+    def refresh_trending_listings(self, top_n: int = listing_stats.DEFAULT_TOP_N) -> Dict[str, int]:
+        """Recompute listing_trending from the daily view buckets (run periodically)"""
+        if self.view_stats is not None:
+            self.view_stats.flush()
+        return listing_stats.refresh_trending(self.db, top_n=top_n)
+
+    # ==================== RECOMMENDATION OPERATIONS ====================
+
+    @guarded("property_similar", "read", fallback=True)
+    def get_similar_properties(self, property_id: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """
+        Get precomputed similar properties (one read by _id)
+
+        Each entry has property_id, score and a display summary (title,
+        price, bedrooms, area, city, image). Empty until
+        refresh_similar_properties() has covered the property.
+        """
+        doc = self.db[SIMILAR_COLLECTION].find_one(
+            {"_id": ObjectId(property_id)}, {"similar": {"$slice": limit}}, session=self._session
+        )
+        return doc['similar'] if doc else []
+
+    def refresh_similar_properties(self, full: bool = False, top_n: int = 10) -> Dict[str, Any]:
+        """Recompute property_similar (incrementally unless full=True); requires numpy"""
+        import recommendations
+        return recommendations.refresh_similar(self.db, top_n=top_n, full=full)
+
+    # ==================== MAINTENANCE SCANS ====================
+
+    def scan_collection(self, job: str, collection: str, update_fn, query: Optional[Dict[str, Any]] = None,
+                        projection: Optional[Dict[str, Any]] = None, workers: int = 4, **kwargs) -> Dict[str, Any]:
+        """
+        Apply update_fn to every matching document in parallel _id ranges, resumable per range
+
+        update_fn maps a document to an update document (or None); with
+        workers > 1 it must be a module-level function. See partitioned_scan.py.
+        """
+        from partitioned_scan import partitioned_scan
+        return partitioned_scan(self.db, job, collection, update_fn, query, projection, workers=workers, **kwargs)
+
+    # ==================== TYPED READ OPERATIONS ====================
+
+    # Documents come back as undecoded BSON; models decode fields on first access
+    RAW_CODEC_OPTIONS = CodecOptions(document_class=RawBSONDocument, tz_aware=True)
+
+    def raw_collection(self, collection: str):
+        """Collection handle that returns RawBSONDocument instead of dicts"""
+        return self.db.get_collection(collection, codec_options=self.RAW_CODEC_OPTIONS)
+
+    def find_models(self, collection: str, query: Dict[str, Any] = None, projection: Dict[str, Any] = None,
+                    sort: List = None, limit: int = 100, batch_size: int = None) -> List[Any]:
+        """
+        Find documents as compact typed models (see models.MODEL_CLASSES)
+
+        Intended for large list pages and exports: each result keeps only its
+        raw BSON bytes until a field is read, and the model has no __dict__.
+        """
+        model = MODEL_CLASSES[collection]
+        cursor = self.raw_collection(collection).find(query or {}, projection, session=self._session)
+        if sort:
+            cursor = cursor.sort(sort)
+        if limit:
+            cursor = cursor.limit(limit)
+        if batch_size:
+            cursor = cursor.batch_size(batch_size)
+        return [model.from_raw(raw) for raw in cursor]
@@ -0,0 +1,277 @@
+"""
+Partitioned Scans
+Full-collection maintenance split into _id ranges and run across processes
+
+The collection is split into half-open _id ranges at quantiles of a $sample
+of _ids. A process pool drains the ranges (several per worker, so a slow
+range does not leave the other cores idle); each worker streams its range
+in _id order, applies update_fn to every document and writes the results
+back with unordered bulk writes. Progress is checkpointed per range after
+every batch in scan_jobs, so an interrupted job resumes from the last
+checkpoint of each range with the same boundaries.
+
+update_fn follows MigrationRunner.backfill: it maps a document to an update
+document (applied to that _id) or None to skip it. It may also return a
+pymongo write operation (e.g. ReplaceOne into another collection with
+target=...). With workers > 1 it must be a module-level function so it can
+be sent to the worker processes. A batch that was written but not yet
+checkpointed is processed again on resume, so update_fn should be idempotent.
+
+Usage:
+    python partitioned_scan.py geo --workers 8       # re-derive location.geo
+    python partitioned_scan.py region --restart      # recompute properties.region
+"""
+
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from pymongo import UpdateOne
+from pymongo.operations import DeleteMany, DeleteOne, InsertOne, ReplaceOne, UpdateMany
+
+SCAN_JOBS_COLLECTION = "scan_jobs"
+DEFAULT_BATCH_SIZE = 1000
+# Ranges per worker: finer ranges balance uneven work and shorten resumes
+PARTITIONS_PER_WORKER = 4
+
+_WRITE_OPS = (InsertOne, UpdateOne, UpdateMany, ReplaceOne, DeleteOne, DeleteMany)
+
+
+def split_id_ranges(db, collection: str, partitions: int, query: Optional[Dict[str, Any]] = None,
+                    sample_size: int = 1000) -> List[Tuple[Any, Any]]:
+    """
+    Split a collection into roughly equal half-open _id ranges
+
+    Boundaries are quantiles of a $sample of _ids, so ranges stay balanced
+    even when _ids are not uniformly distributed in time.
+    """
+    if partitions <= 1:
+        return [(None, None)]
+    pipeline = ([{"$match": query}] if query else []) + [
+        {"$sample": {"size": max(sample_size, partitions * 20)}},
+        {"$project": {"_id": 1}},
+    ]
+    sampled = sorted(doc["_id"] for doc in db[collection].aggregate(pipeline))
+    if len(sampled) < partitions:
+        return [(None, None)]
+    bounds = sorted({sampled[len(sampled) * i // partitions] for i in range(1, partitions)})
+    edges = [None] + bounds + [None]
+    return list(zip(edges[:-1], edges[1:]))
+
+
+def range_query(query: Optional[Dict[str, Any]], low: Any = None, high: Any = None,
+                after: Any = None) -> Dict[str, Any]:
+    """query restricted to low <= _id < high (and _id > after when resuming)"""
+    bounds = {}
+    if after is not None:
+        bounds["$gt"] = after
+    elif low is not None:
+        bounds["$gte"] = low
+    if high is not None:
+        bounds["$lt"] = high
+    query = dict(query or {})
+    if not bounds:
+        return query
+    if "_id" in query:
+        return {"$and": [query, {"_id": bounds}]}
+    query["_id"] = bounds
+    return query
+
+
+# ==================== WORKERS ====================
+
+# Per-process database reused across ranges handled by the same worker
+_worker_db = None
+
+
+def _get_worker_db():
+    global _worker_db
+    if _worker_db is None:
+        from config import get_database
+        _, _worker_db = get_database(ping=False)
+    return _worker_db
+
+
+def _write_op(doc: Dict[str, Any], result: Any):
+    if isinstance(result, _WRITE_OPS):
+        return result
+    return UpdateOne({"_id": doc["_id"]}, result)
+
+
+def scan_partition(db, job: str, collection: str, index: int, query: Optional[Dict[str, Any]],
+                   update_fn: Callable[[Dict[str, Any]], Any], projection: Optional[Dict[str, Any]] = None,
+                   target: Optional[str] = None, batch_size: int = DEFAULT_BATCH_SIZE) -> Dict[str, Any]:
+    """
+    Process one range of a job, resuming from its checkpoint
+
+    Returns:
+        dict: {"partition", "scanned", "written", "seconds"} for this run
+    """
+    progress = db[SCAN_JOBS_COLLECTION]
+    state = progress.find_one({"_id": f"{job}:{index:05d}"})
+    source, sink = db[collection], db[target or collection]
+    cursor = source.find(range_query(query, state["low"], state["high"], state.get("last_id")),
+                         projection, batch_size=batch_size).sort("_id", 1)
+
+    start = time.perf_counter()
+    scanned = written = 0
+    batch, ops = 0, []
+
+    def checkpoint(last_id, status="running"):
+        progress.update_one({"_id": state["_id"]}, {
+            "$set": {"last_id": last_id, "status": status, "updated_at": datetime.now(timezone.utc)},
+            "$inc": {"scanned": batch, "written": len(ops)},
+        })
+
+    last_id = state.get("last_id")
+    for doc in cursor:
+        result = update_fn(doc)
+        if result:
+            ops.extend(_write_op(doc, r) for r in (result if isinstance(result, list) else [result]))
+        batch += 1
+        last_id = doc["_id"]
+        if batch >= batch_size:
+            if ops:
+                sink.bulk_write(ops, ordered=False)
+            checkpoint(last_id)
+            scanned, written = scanned + batch, written + len(ops)
+            batch, ops = 0, []
+
+    if ops:
+        sink.bulk_write(ops, ordered=False)
+    checkpoint(last_id, status="done")
+    scanned, written = scanned + batch, written + len(ops)
+    return {"partition": index, "scanned": scanned, "written": written, "seconds": time.perf_counter() - start}
+
+
+def _scan_partition_worker(args) -> Dict[str, Any]:
+    return scan_partition(_get_worker_db(), *args)
+
+
+# ==================== JOBS ====================
+
+def partitioned_scan(db, job: str, collection: str, update_fn: Callable[[Dict[str, Any]], Any],
+                     query: Optional[Dict[str, Any]] = None, projection: Optional[Dict[str, Any]] = None,
+                     target: Optional[str] = None, workers: int = 4, partitions: Optional[int] = None,
+                     batch_size: int = DEFAULT_BATCH_SIZE, restart: bool = False) -> Dict[str, Any]:
+    """
+    Apply update_fn to every document matching query, in parallel _id ranges
+
+    Args:
+        db: MongoDB database instance (ranges and checkpoints; workers open their own client)
+        job: Job name; a job that was interrupted resumes when started again with the same name
+        collection: Collection to scan
+        update_fn: Document -> update document, write operation(s) or None
+        query: Filter selecting the documents to scan
+        projection: Fields update_fn needs
+        target: Collection write operations apply to (default: collection)
+        workers: Worker processes (1 runs in this process)
+        partitions: _id ranges (default: workers * PARTITIONS_PER_WORKER)
+        batch_size: Documents per bulk write and checkpoint
+        restart: Discard the checkpoints of an earlier run of this job
+
+    Returns:
+        dict: {"scanned", "written", "seconds", "docs_per_second", "partitions"} for this run
+    """
+    jobs = db[SCAN_JOBS_COLLECTION]
+    if restart:
+        jobs.delete_many({"job": job})
+        jobs.delete_one({"_id": job})
+
+    state = jobs.find_one({"_id": job})
+    if state is not None and state.get("status") == "done":
+        print(f"✓ Scan {job} already finished ({state.get('scanned', 0)} documents); pass restart=True to rerun")
+        return {key: state.get(key) for key in ("scanned", "written", "seconds", "docs_per_second", "partitions")}
+
+    if state is None:
+        ranges = split_id_ranges(db, collection, partitions or workers * PARTITIONS_PER_WORKER, query)
+        now = datetime.now(timezone.utc)
+        jobs.insert_one({"_id": job, "collection": collection, "partitions": len(ranges),
+                         "status": "running", "started_at": now})
+        jobs.insert_many([{
+            "_id": f"{job}:{i:05d}", "job": job, "partition": i, "low": low, "high": high,
+            "last_id": None, "scanned": 0, "written": 0, "status": "pending", "updated_at": now,
+        } for i, (low, high) in enumerate(ranges)])
+    pending = [doc["partition"] for doc in jobs.find({"job": job, "status": {"$ne": "done"}}, {"partition": 1})]
+    total_partitions = jobs.count_documents({"job": job})
+    print(f"Scan {job}: {collection}, {len(pending)}/{total_partitions} range(s) pending, {workers} worker(s)")
+
+    start = time.perf_counter()
+    tasks = [(job, collection, i, query, update_fn, projection, target, batch_size) for i in pending]
+    scanned = written = 0
+
+    def report(result):
+        nonlocal scanned, written
+        scanned += result["scanned"]
+        written += result["written"]
+        rate = result["scanned"] / max(result["seconds"], 1e-9)
+        print(f"  … range {result['partition']}: {result['scanned']} scanned, {result['written']} written "
+              f"({rate:,.0f} docs/s)")
+
+    if workers <= 1:
+        for task in tasks:
+            report(scan_partition(db, *task))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for future in as_completed([pool.submit(_scan_partition_worker, task) for task in tasks]):
+                report(future.result())
+
+    elapsed = time.perf_counter() - start
+    totals = {
+        "scanned": scanned,
+        "written": written,
+        "seconds": round(elapsed, 3),
+        "docs_per_second": round(scanned / max(elapsed, 1e-9), 1),
+        "partitions": total_partitions,
+    }
+    # The job document keeps totals across resumed runs; the return value covers this run
+    ranges_done = list(jobs.find({"job": job}, {"scanned": 1, "written": 1}))
+    jobs.update_one({"_id": job}, {"$set": {
+        "scanned": sum(doc["scanned"] for doc in ranges_done),
+        "written": sum(doc["written"] for doc in ranges_done),
+        "seconds": totals["seconds"],
+        "docs_per_second": totals["docs_per_second"],
+        "partitions": total_partitions,
+        "status": "done",
+        "finished_at": datetime.now(timezone.utc),
+    }})
+    print(f"✓ Scan {job}: {scanned} scanned, {written} written in {elapsed:.1f}s "
+          f"({totals['docs_per_second']:,.0f} docs/s)")
+    return totals
+
+
+# Named maintenance scans for the CLI: name -> (collection, query, update_fn, projection)
+def _tasks() -> Dict[str, Tuple[str, Dict[str, Any], Callable, Dict[str, Any]]]:
+    from migrations import derive_geo, derive_region
+    return {
+        "geo": ("properties", {"location.latitude": {"$exists": True}, "location.longitude": {"$exists": True}},
+                derive_geo, {"location.latitude": 1, "location.longitude": 1}),
+        "region": ("properties", {"location.geo": {"$exists": True}}, derive_region, {"location": 1}),
+    }
+
+
+def main():
+    import argparse
+    from config import get_database, close_connection
+
+    tasks = _tasks()
+    parser = argparse.ArgumentParser(description="Run a full-collection maintenance scan in parallel")
+    parser.add_argument("task", choices=sorted(tasks))
+    parser.add_argument("--workers", type=int, default=4, help="worker processes")
+    parser.add_argument("--partitions", type=int, help="_id ranges (default: workers x 4)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--restart", action="store_true", help="ignore checkpoints of an earlier run")
+    args = parser.parse_args()
+
+    collection, query, update_fn, projection = tasks[args.task]
+    client, db = get_database()
+    try:
+        partitioned_scan(db, args.task, collection, update_fn, query, projection, workers=args.workers,
+                         partitions=args.partitions, batch_size=args.batch_size, restart=args.restart)
+    finally:
+        close_connection(client)
+
+
+if __name__ == "__main__":
+    main()
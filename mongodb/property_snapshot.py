@@ -0,0 +1,242 @@
+"""
+In-Memory Property Snapshot
+NumPy column arrays of active properties for vectorized filter queries
+
+Requires numpy (optional dependency: pip install numpy).
+
+The snapshot holds properties that have an active listing. It is loaded with
+one projected scan and kept fresh by polling properties and listings whose
+updated_at moved past the last refresh. Hard-deleted properties are only
+dropped on the next full reload().
+"""
+
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+from models import ListingStatus, PropertyType
+
+# search_properties filters the snapshot can answer; anything else falls back
+SUPPORTED_FILTERS = frozenset({
+    "min_price", "max_price", "property_type", "bedrooms", "min_bedrooms",
+    "min_area", "max_area", "bbox", "near_lat", "near_lon", "max_dist_meters",
+})
+
+_TYPE_CODES = {
+    PropertyType.RESIDENTIAL: 0,
+    PropertyType.COMMERCIAL: 1,
+    PropertyType.LAND: 2,
+    PropertyType.RENTAL: 3,
+}
+
+_PROJECTION = {
+    "current_price": 1,
+    "bedrooms": 1,
+    "area_sqft": 1,
+    "property_type": 1,
+    "location.geo.coordinates": 1,
+    "updated_at": 1,
+}
+
+_EARTH_RADIUS_M = 6371008.8
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("property_snapshot.py requires numpy: pip install numpy") from e
+    return numpy
+
+
+class PropertySnapshot:
+    """Columnar, vectorized view of active properties"""
+
+    def __init__(self, db, active_only: bool = True, batch_size: int = 10000):
+        self.np = _import_numpy()
+        self.db = db
+        self.active_only = active_only
+        self.batch_size = batch_size
+        self._lock = threading.Lock()
+        self.watermark: Optional[datetime] = None
+        self.size = 0
+        self._allocate(0)
+
+    # ==================== STORAGE ====================
+
+    def _allocate(self, capacity: int):
+        np = self.np
+        self.ids = np.empty(capacity, dtype=object)
+        self.price = np.full(capacity, np.nan)
+        self.bedrooms = np.full(capacity, np.nan)
+        self.area = np.full(capacity, np.nan)
+        self.type_code = np.full(capacity, -1, dtype=np.int8)
+        self.lat = np.full(capacity, np.nan)
+        self.lon = np.full(capacity, np.nan)
+        self.alive = np.zeros(capacity, dtype=bool)
+        self._row: Dict[Any, int] = {}
+
+    def _grow(self, needed: int):
+        np = self.np
+        capacity = len(self.ids)
+        if needed <= capacity:
+            return
+        new_capacity = max(needed, capacity * 2, 1024)
+        for name, fill in (("ids", None), ("price", np.nan), ("bedrooms", np.nan), ("area", np.nan),
+                           ("type_code", -1), ("lat", np.nan), ("lon", np.nan), ("alive", False)):
+            old = getattr(self, name)
+            new = np.empty(new_capacity, dtype=old.dtype)
+            if fill is not None:
+                new.fill(fill)
+            new[:capacity] = old
+            setattr(self, name, new)
+
+    def _set_row(self, i: int, doc: Dict[str, Any]):
+        coords = ((doc.get("location") or {}).get("geo") or {}).get("coordinates") or (None, None)
+        self.ids[i] = doc["_id"]
+        self.price[i] = doc.get("current_price") if doc.get("current_price") is not None else self.np.nan
+        self.bedrooms[i] = doc.get("bedrooms") if doc.get("bedrooms") is not None else self.np.nan
+        self.area[i] = doc.get("area_sqft") if doc.get("area_sqft") is not None else self.np.nan
+        self.type_code[i] = _TYPE_CODES.get(doc.get("property_type"), -1)
+        self.lon[i] = coords[0] if coords[0] is not None else self.np.nan
+        self.lat[i] = coords[1] if coords[1] is not None else self.np.nan
+        self.alive[i] = True
+
+    def _upsert(self, doc: Dict[str, Any]):
+        i = self._row.get(doc["_id"])
+        if i is None:
+            i = self.size
+            self._grow(i + 1)
+            self._row[doc["_id"]] = i
+            self.size += 1
+        self._set_row(i, doc)
+
+    def _deactivate(self, property_id):
+        i = self._row.get(property_id)
+        if i is not None:
+            self.alive[i] = False
+
+    # ==================== LOADING ====================
+
+    def _active_property_ids(self, query: Dict[str, Any]) -> Dict[Any, bool]:
+        """property_id -> has an active listing, for listings matching query"""
+        active = {}
+        for listing in self.db.listings.find(query, {"property_id": 1, "status": 1}, batch_size=self.batch_size):
+            pid = listing.get("property_id")
+            active[pid] = active.get(pid, False) or listing.get("status") == ListingStatus.ACTIVE
+        return active
+
+    def reload(self) -> int:
+        """Full load via one projected scan; returns the number of rows"""
+        start = time.perf_counter()
+        now = datetime.now(timezone.utc)
+        query = {}
+        if self.active_only:
+            active = [pid for pid, is_active in self._active_property_ids({"status": ListingStatus.ACTIVE}).items()]
+            query = {"_id": {"$in": active}}
+
+        docs = list(self.db.properties.find(query, _PROJECTION, batch_size=self.batch_size))
+        with self._lock:
+            self.size = 0
+            self._allocate(len(docs))
+            for doc in docs:
+                self._upsert(doc)
+            self.watermark = now
+        print(f"✓ Property snapshot loaded: {self.size} properties ({time.perf_counter() - start:.2f}s)")
+        return self.size
+
+    def refresh(self) -> int:
+        """
+        Apply changes since the last load/refresh (updated_at polling)
+
+        Returns:
+            int: Number of rows inserted, updated or deactivated
+        """
+        if self.watermark is None:
+            return self.reload()
+        now = datetime.now(timezone.utc)
+        since = {"updated_at": {"$gte": self.watermark}}
+
+        changed = {doc["_id"]: doc for doc in self.db.properties.find(since, _PROJECTION)}
+        listing_changes = self._active_property_ids(since) if self.active_only else {}
+
+        if self.active_only:
+            # Re-check activity for every property touched by a listing change
+            touched = set(listing_changes) | set(changed)
+            still_active = set(self._active_property_ids({
+                "property_id": {"$in": list(touched)}, "status": ListingStatus.ACTIVE
+            })) if touched else set()
+            missing = [pid for pid in still_active if pid not in changed]
+            for doc in self.db.properties.find({"_id": {"$in": missing}}, _PROJECTION) if missing else []:
+                changed[doc["_id"]] = doc
+        else:
+            touched, still_active = set(changed), set(changed)
+
+        with self._lock:
+            for pid in touched:
+                if pid in still_active and pid in changed:
+                    self._upsert(changed[pid])
+                else:
+                    self._deactivate(pid)
+            self.watermark = now
+        return len(touched)
+
+    # ==================== QUERIES ====================
+
+    def supports(self, filters: Dict[str, Any]) -> bool:
+        return set(filters) <= SUPPORTED_FILTERS
+
+    def query(self, filters: Dict[str, Any], limit: int = 100) -> List[Any]:
+        """
+        Evaluate search_properties-style filters vectorized in memory
+
+        Extra filters: min_area/max_area (sqft) and
+        bbox=(min_lat, min_lon, max_lat, max_lon). With near_lat/near_lon the
+        results are ordered by distance like $near.
+
+        Returns:
+            list: Matching property _ids
+        """
+        np = self.np
+        with self._lock:
+            n = self.size
+            mask = self.alive[:n].copy()
+            price, bedrooms, area = self.price[:n], self.bedrooms[:n], self.area[:n]
+            lat, lon, ids = self.lat[:n], self.lon[:n], self.ids[:n]
+
+            if "min_price" in filters:
+                mask &= price >= filters["min_price"]
+            if "max_price" in filters:
+                mask &= price <= filters["max_price"]
+            if "property_type" in filters:
+                mask &= self.type_code[:n] == _TYPE_CODES.get(filters["property_type"], -2)
+            if "bedrooms" in filters:
+                mask &= bedrooms == filters["bedrooms"]
+            if "min_bedrooms" in filters:
+                mask &= bedrooms >= filters["min_bedrooms"]
+            if "min_area" in filters:
+                mask &= area >= filters["min_area"]
+            if "max_area" in filters:
+                mask &= area <= filters["max_area"]
+            if "bbox" in filters:
+                min_lat, min_lon, max_lat, max_lon = filters["bbox"]
+                mask &= (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+
+            rows = np.flatnonzero(mask)
+            if "near_lat" in filters and "near_lon" in filters:
+                dist = self._haversine(filters["near_lat"], filters["near_lon"], lat[rows], lon[rows])
+                within = dist <= filters.get("max_dist_meters", 10000)
+                rows, dist = rows[within], dist[within]
+                order = np.argsort(dist, kind="stable")[:limit]
+                rows = rows[order]
+            else:
+                rows = rows[:limit]
+            return ids[rows].tolist()
+
+    def _haversine(self, lat0: float, lon0: float, lat, lon):
+        np = self.np
+        lat0, lon0 = np.radians(lat0), np.radians(lon0)
+        lat, lon = np.radians(lat), np.radians(lon)
+        a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat0) * np.cos(lat) * np.sin((lon - lon0) / 2) ** 2
+        return 2 * _EARTH_RADIUS_M * np.arcsin(np.sqrt(a))
@@ -0,0 +1,464 @@
+"""
+Query Plan Regression Check
+Explains every query DatabaseOperations sends against a generated dataset
+
+A scenario calls each DatabaseOperations method (and search_properties with
+every combination of its filter groups) while a command listener records
+the find/aggregate/count/distinct/update/delete/findAndModify commands the
+driver actually sends. Each distinct command shape is re-run with
+explain("executionStats") and checked for:
+
+    - COLLSCAN
+    - a blocking in-memory SORT (textScore sorts excepted)
+    - more than --max-ratio documents examined per document returned
+
+The winning plan of every shape is compared with query_plan_baseline.json,
+so a plan change (e.g. an index removed from init_db.INDEX_SPECS) fails
+the check and shows up as a diff of that file in review.
+
+The same check runs as tests/test_query_plans.py (skipped when no MongoDB
+server is reachable at MONGO_URL).
+
+Usage:
+    python -m pytest tests/test_query_plans.py
+    python query_plans.py                    # check (exit status 1 on failure)
+    python query_plans.py --update-baseline  # accept the current plans
+    python query_plans.py --users 5000 --reload
+"""
+
+import argparse
+import copy
+import json
+import os
+import sys
+import threading
+from itertools import combinations
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from bson.son import SON
+from pymongo import monitoring
+
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "query_plan_baseline.json")
+
+DEFAULT_MAX_RATIO = 10.0
+# Below this many documents examined the ratio rule is not applied
+MIN_DOCS_EXAMINED = 100
+
+RECORDED_COMMANDS = ("find", "aggregate", "count", "distinct", "update", "delete", "findAndModify")
+
+# Session, transaction and routing fields that explain rejects or that do not affect the plan
+_STRIP_FIELDS = {"lsid", "$db", "$clusterTime", "$readPreference", "txnNumber", "startTransaction",
+                 "autocommit", "readConcern", "writeConcern", "maxTimeMS", "apiVersion", "apiStrict",
+                 "apiDeprecationErrors", "ordered", "bypassDocumentValidation"}
+
+# Stages a plan passes through before reaching the documents it examined
+_PASS_THROUGH = {"GROUP", "SORT", "LIMIT", "SKIP", "PROJECTION_SIMPLE", "PROJECTION_DEFAULT",
+                 "PROJECTION_COVERED", "SORT_KEY_GENERATOR", "SHARDING_FILTER", "UPDATE", "DELETE",
+                 "COUNT", "SUBPLAN", "CACHED_PLAN"}
+
+# Accepted violations: scenario label -> rules, with the reason
+EXEMPTIONS = {
+    # Unfiltered totals count every document by design
+    "get_analytics": {"COLLSCAN"},
+    # Browsing without filters reads the first page in natural order
+    "search_properties[]": {"COLLSCAN"},
+    # Market-wide statistics aggregate every property
+    "get_price_per_sqft[all]": {"COLLSCAN"},
+    # The (city, property_type, bucket) index cannot order buckets across property
+    # types; a city has at most months x types buckets, sorted in memory
+    "get_price_trends[materialized]": {"SORT"},
+}
+
+
+# ==================== RECORDING ====================
+
+class CommandRecorder(monitoring.CommandListener):
+    """Records the commands sent while a label is set"""
+
+    def __init__(self):
+        self.label: Optional[str] = None
+        self.commands: List[Tuple[str, str, Dict[str, Any]]] = []
+        self._lock = threading.Lock()
+
+    def started(self, event):
+        if self.label is None or event.command_name not in RECORDED_COMMANDS:
+            return
+        with self._lock:
+            self.commands.append((self.label, event.database_name, copy.deepcopy(dict(event.command))))
+
+    def succeeded(self, event):
+        pass
+
+    def failed(self, event):
+        pass
+
+
+def _shape(value: Any) -> Any:
+    """Query shape: keys and operators kept, values replaced by their type"""
+    if isinstance(value, dict):
+        return {key: _shape(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        shapes = []
+        for item in value:
+            shape = _shape(item)
+            if shape not in shapes:
+                shapes.append(shape)
+        return shapes
+    return f"<{type(value).__name__}>"
+
+
+def _explainable(command_name: str, command: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Commands to explain for one recorded command (one per update/delete statement)"""
+    command = {key: value for key, value in command.items() if key not in _STRIP_FIELDS}
+    if command_name in ("update", "delete"):
+        field = "updates" if command_name == "update" else "deletes"
+        return [SON([(command_name, command[command_name]), (field, [statement])])
+                for statement in command.get(field, [])]
+    ordered = SON([(command_name, command.pop(command_name))])
+    ordered.update(command)
+    return [ordered]
+
+
+def _statement_shape(command_name: str, command: Dict[str, Any]) -> Dict[str, Any]:
+    skip = {command_name, "cursor", "batchSize", "singleBatch", "allowDiskUse", "comment", "let"}
+    shape = {key: _shape(value) for key, value in command.items() if key not in skip}
+    return {"command": command_name, "collection": command[command_name], **shape}
+
+
+def collect_shapes(recorder: CommandRecorder) -> Dict[str, Dict[str, Any]]:
+    """
+    Deduplicate recorded commands into named shapes
+
+    Returns:
+        dict: "<label> <command> <collection>[#n]" -> {"database", "explain", "shape"}
+    """
+    shapes: Dict[str, Dict[str, Any]] = {}
+    seen = set()
+    for label, database, command in recorder.commands:
+        command_name = next(iter(command))
+        for explain in _explainable(command_name, command):
+            shape = _statement_shape(command_name, explain)
+            fingerprint = (label, json.dumps(shape, sort_keys=True, default=str))
+            if fingerprint in seen:
+                continue
+            seen.add(fingerprint)
+            key = base = f"{label} {command_name} {explain[command_name]}"
+            n = 1
+            while key in shapes:
+                n += 1
+                key = f"{base}#{n}"
+            shapes[key] = {"database": database, "explain": explain, "shape": shape}
+    return shapes
+
+
+# ==================== PLAN ANALYSIS ====================
+
+def _plan_stages(node: Any) -> List[str]:
+    """Winning plan stages in tree order, e.g. ["FETCH", "IXSCAN(status_1)"]"""
+    if isinstance(node, list):
+        return [stage for item in node for stage in _plan_stages(item)]
+    if not isinstance(node, dict):
+        return []
+    if "queryPlan" in node:  # slot-based engine: the classic-shaped tree is under queryPlan
+        return _plan_stages(node["queryPlan"])
+    if "winningPlan" in node:  # one shard
+        return _plan_stages(node["winningPlan"])
+    stages = []
+    if "stage" in node:
+        name = node["stage"]
+        if node.get("indexName"):
+            name += f"({node['indexName']})"
+        elif name == "SORT" and "$meta" in json.dumps(node.get("sortPattern", {}), default=str):
+            name = "SORT(textScore)"
+        stages.append(name)
+    for key in ("inputStage", "inputStages", "shards"):
+        stages += _plan_stages(node.get(key))
+    return stages
+
+
+def _sections(explain: Any) -> List[Dict[str, Any]]:
+    """Every {queryPlanner, executionStats} section (aggregate $cursor stages, shards)"""
+    if isinstance(explain, list):
+        return [section for item in explain for section in _sections(item)]
+    if not isinstance(explain, dict):
+        return []
+    if "queryPlanner" in explain:
+        return [explain]
+    return [section for value in explain.values() for section in _sections(value)]
+
+
+def _rows_examined_for(stage: Dict[str, Any]) -> int:
+    """nReturned of the first stage below sorts, groups, limits and write stages"""
+    if "shards" in stage:
+        return sum(_rows_examined_for(shard.get("executionStages", {})) for shard in stage["shards"])
+    while stage.get("stage") in _PASS_THROUGH and isinstance(stage.get("inputStage"), dict):
+        stage = stage["inputStage"]
+    return stage.get("nReturned", 0)
+
+
+def summarize(explain: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Plan summary of one explain("executionStats") result
+
+    Returns:
+        dict: {"plan": "FETCH > IXSCAN(...)" per section joined by " | ",
+               "docs_examined", "keys_examined", "returned", "ratio"}
+    """
+    plans, docs, keys, returned, ratio_applies = [], 0, 0, 0, True
+    for section in _sections(explain):
+        winning = section["queryPlanner"].get("winningPlan", {})
+        stages = _plan_stages(winning)
+        plans.append(" > ".join(stages) or "EOF")
+        stats = section.get("executionStats") or {}
+        docs += stats.get("totalDocsExamined", 0)
+        keys += stats.get("totalKeysExamined", 0)
+        execution = stats.get("executionStages") or {}
+        if "slotBasedPlan" in winning and any(stage.startswith("GROUP") for stage in stages):
+            ratio_applies = False  # pushed-down $group: nReturned counts groups, not matches
+        returned += _rows_examined_for(execution) if execution else stats.get("nReturned", 0)
+    ratio = docs / max(returned, 1) if ratio_applies else None
+    return {"plan": " | ".join(plans), "docs_examined": docs, "keys_examined": keys,
+            "returned": returned, "ratio": ratio}
+
+
+def violations(summary: Dict[str, Any], max_ratio: float = DEFAULT_MAX_RATIO) -> List[str]:
+    """Rules a plan summary breaks"""
+    stages = {stage for plan in summary["plan"].split(" | ") for stage in plan.split(" > ")}
+    found = []
+    if "COLLSCAN" in stages:
+        found.append("COLLSCAN")
+    if "SORT" in stages:
+        found.append("SORT")
+    if (summary["ratio"] is not None and summary["docs_examined"] >= MIN_DOCS_EXAMINED
+            and summary["ratio"] > max_ratio):
+        found.append("RATIO")
+    return found
+
+
+def exempted(key: str) -> set:
+    label = key.rsplit(" ", 2)[0]
+    return set().union(*(rules for prefix, rules in EXEMPTIONS.items() if label == prefix))
+
+
+def explain_shapes(client, shapes: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+    """Run explain for each shape (queryPlanner only for pipelines that write)"""
+    results = {}
+    for key, spec in shapes.items():
+        command = spec["explain"]
+        writes = any(stage in ("$out", "$merge") for stage in
+                     (next(iter(s)) for s in command.get("pipeline", [])))
+        verbosity = "queryPlanner" if writes else "executionStats"
+        explain = client[spec["database"]].command(SON([("explain", command), ("verbosity", verbosity)]))
+        results[key] = {**summarize(explain), "shape": spec["shape"]}
+    return results
+
+
+# ==================== SCENARIO ====================
+
+def _sample(db) -> Dict[str, Any]:
+    """Representative ids and values from the loaded dataset"""
+    from models import UserRole, ListingStatus
+
+    lister = db.users.find_one({"role": UserRole.LISTER}, {"firebase_uid": 1})
+    buyer = db.users.find_one({"role": UserRole.BUYER}, {"firebase_uid": 1})
+    listing = db.listings.find_one({"status": ListingStatus.ACTIVE})
+    prop = db.properties.find_one({"_id": listing["property_id"]})
+    coordinates = prop["location"]["geo"]["coordinates"]
+    return {
+        "lister": lister["firebase_uid"],
+        "buyer": buyer["firebase_uid"],
+        "property": prop,
+        "listing": listing,
+        "search_groups": {
+            "type": {"property_type": prop["property_type"]},
+            "price": {"min_price": prop["current_price"] * 0.8, "max_price": prop["current_price"] * 1.2},
+            "city": {"city": prop["location"]["city"], "state": prop["location"]["state"]},
+            "bedrooms": {"min_bedrooms": prop.get("bedrooms") or 1},
+            "text": {"search_term": prop["title"].split()[0]},
+            "geo": {"near_lat": coordinates[1], "near_lon": coordinates[0], "max_dist_meters": 5000},
+        },
+    }
+
+
+def scenario(sample: Dict[str, Any]) -> List[Tuple[str, Callable]]:
+    """(label, call(db_ops)) for every DatabaseOperations query path"""
+    lister, buyer = sample["lister"], sample["buyer"]
+    pid, lid = str(sample["property"]["_id"]), str(sample["listing"]["_id"])
+    price = sample["property"]["current_price"]
+    city = sample["property"]["location"]["city"]
+    calls = [
+        ("get_user_by_firebase_uid", lambda ops: ops.get_user_by_firebase_uid(buyer)),
+        ("get_users_by_firebase_uids", lambda ops: ops.get_users_by_firebase_uids([buyer, lister])),
+        ("get_users_by_role", lambda ops: ops.get_users_by_role("lister")),
+        ("update_user", lambda ops: ops.update_user(buyer, {"phone": "555-0100"})),
+        ("get_property_by_id", lambda ops: ops.get_property_by_id(pid)),
+        ("get_properties_by_ids", lambda ops: ops.get_properties_by_ids([pid])),
+        ("update_property", lambda ops: ops.update_property(pid, {"current_price": price})),
+        ("get_similar_properties", lambda ops: ops.get_similar_properties(pid)),
+        ("get_listing_by_id", lambda ops: ops.get_listing_by_id(lid, increment_view=True)),
+        ("get_listing_by_id[lister]", lambda ops: ops.get_listing_by_id(lid, lister_firebase_uid=lister)),
+        ("get_listings_by_ids", lambda ops: ops.get_listings_by_ids([lid])),
+        ("get_listings_by_status", lambda ops: ops.get_listings_by_status("active")),
+        ("get_listings_by_lister", lambda ops: ops.get_listings_by_lister(lister)),
+        ("update_listing", lambda ops: ops.update_listing(lid, {"description": "Updated"})),
+        ("fold_view_counts", lambda ops: ops.fold_view_counts([lid])),
+        ("save_listing", lambda ops: sample.update(saved=ops.save_listing(buyer, lid))),
+        ("get_saved_listings", lambda ops: ops.get_saved_listings(buyer)),
+        ("remove_saved_listing", lambda ops: ops.remove_saved_listing(str(sample["saved"]["_id"]))),
+        ("create_saved_search", lambda ops: sample.update(
+            search=ops.create_saved_search(buyer, {"city": city, "max_price": price * 2}))),
+        ("get_saved_searches", lambda ops: ops.get_saved_searches(buyer)),
+        ("delete_saved_search", lambda ops: ops.delete_saved_search(str(sample["search"]["_id"]), buyer)),
+        ("send_message", lambda ops: ops.send_message(buyer, lister, "Is it still available?", listing_id=lid)),
+        ("get_conversation_page", lambda ops: ops.get_conversation_page(lister, buyer)),
+        ("get_conversations", lambda ops: ops.get_conversations(lister)),
+        ("mark_conversation_read", lambda ops: ops.mark_conversation_read(lister, buyer)),
+        ("get_unread_message_count", lambda ops: ops.get_unread_message_count(lister)),
+        ("get_notifications", lambda ops: ops.get_notifications(buyer)),
+        ("get_pending_verifications", lambda ops: ops.get_pending_verifications()),
+        ("get_audit_logs", lambda ops: ops.get_audit_logs()),
+        ("get_audit_logs[user]", lambda ops: ops.get_audit_logs({"user_firebase_uid": buyer})),
+        ("get_analytics", lambda ops: ops.get_analytics()),
+        ("get_price_per_sqft[all]", lambda ops: ops.get_price_per_sqft()),
+        ("get_price_per_sqft[city]", lambda ops: ops.get_price_per_sqft(city=city)),
+        ("get_price_drops", lambda ops: ops.get_price_drops()),
+        ("get_price_trends", lambda ops: ops.get_price_trends(months=6, city=city)),
+        ("get_price_trends[materialized]", lambda ops: ops.get_price_trends(materialized=True, city=city)),
+    ]
+    groups = sample["search_groups"]
+    for r in range(len(groups) + 1):
+        for names in combinations(groups, r):
+            filters = {key: value for name in names for key, value in groups[name].items()}
+            calls.append((f"search_properties[{'+'.join(names)}]",
+                          lambda ops, filters=filters: ops.search_properties(filters)))
+    return calls
+
+
+def record_scenario(db_ops, recorder: CommandRecorder, calls: List[Tuple[str, Callable]]) -> None:
+    for label, call in calls:
+        recorder.label = label
+        try:
+            call(db_ops)
+        finally:
+            recorder.label = None
+
+
+# ==================== CHECK ====================
+
+def load_baseline(path: str = BASELINE_PATH) -> Dict[str, Dict[str, Any]]:
+    if not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+
+def write_baseline(results: Dict[str, Dict[str, Any]], path: str = BASELINE_PATH) -> None:
+    baseline = {key: {"plan": result["plan"], "shape": result["shape"]} for key, result in sorted(results.items())}
+    with open(path, "w") as f:
+        json.dump(baseline, f, indent=2, sort_keys=True, default=str)
+        f.write("\n")
+    print(f"✓ Baseline written: {len(baseline)} query shapes -> {path}")
+
+
+def check(results: Dict[str, Dict[str, Any]], baseline: Dict[str, Dict[str, Any]],
+          max_ratio: float = DEFAULT_MAX_RATIO) -> List[str]:
+    """
+    Compare explained shapes with the rules and the baseline
+
+    Returns:
+        list: One message per failure (empty when everything passes)
+    """
+    failures = []
+    for key, result in sorted(results.items()):
+        broken = [rule for rule in violations(result, max_ratio) if rule not in exempted(key)]
+        expected = baseline.get(key, {}).get("plan")
+        ratio = f"{result['ratio']:.1f}" if result["ratio"] is not None else "-"
+        detail = f"{result['plan']}  (docs {result['docs_examined']}, returned {result['returned']}, ratio {ratio})"
+        if broken:
+            failures.append(f"{key}: {', '.join(broken)}: {detail}")
+        if expected is None:
+            failures.append(f"{key}: not in baseline: {result['plan']}")
+        elif expected != result["plan"]:
+            failures.append(f"{key}: plan changed: {expected} -> {result['plan']}")
+        print(f"{'✗' if broken or expected != result['plan'] else '✓'} {key}: {detail}")
+    for key in sorted(set(baseline) - set(results)):
+        failures.append(f"{key}: in baseline but no longer emitted")
+    return failures
+
+
+def collect_plans(client, db, recorder: CommandRecorder, users: int = 2000, seed: int = 42,
+                  reload: bool = False) -> Dict[str, Dict[str, Any]]:
+    """
+    Load the dataset, run the scenario and explain every recorded shape
+
+    Args:
+        client: MongoClient created with event_listeners=[recorder]
+        db: Database the dataset is loaded into (dropped first with reload=True)
+
+    Returns:
+        dict: Shape key -> summarize() result plus the shape
+    """
+    from contention import ShardedCounter
+    from data_generator import DataGenerator, load_dataset
+    from init_db import create_indexes
+    from operations import DatabaseOperations
+
+    if reload:
+        client.drop_database(db.name)
+    load_dataset(db, DataGenerator(users=users, seed=seed), workers=1)
+    create_indexes(db)
+
+    db_ops = DatabaseOperations(client=client, db=db, view_counter=ShardedCounter(db, "listing_views"),
+                                resilience=False)
+    record_scenario(db_ops, recorder, scenario(_sample(db)))
+    return explain_shapes(client, collect_shapes(recorder))
+
+
+def connect(timeout_ms: int = 5000):
+    """(client, db, recorder) for the configured server and the *_query_plans database"""
+    from pymongo import MongoClient
+    from config import get_settings, client_options
+
+    settings = get_settings()
+    recorder = CommandRecorder()
+    options = {**client_options(), "serverSelectionTimeoutMS": timeout_ms}
+    client = MongoClient(settings["MONGO_URL"], event_listeners=[recorder], **options)
+    return client, client[f"{settings['DB_NAME']}_query_plans"], recorder
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Check DatabaseOperations query plans against rules and a baseline")
+    parser.add_argument("--users", type=int, default=2000, help="dataset size (see data_generator.plan_counts)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--max-ratio", type=float, default=DEFAULT_MAX_RATIO,
+                        help="max documents examined per document returned")
+    parser.add_argument("--reload", action="store_true", help="drop and regenerate the dataset")
+    parser.add_argument("--update-baseline", action="store_true", help="write the current plans to the baseline")
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    args = parser.parse_args()
+
+    client, db, recorder = connect()
+    try:
+        results = collect_plans(client, db, recorder, args.users, args.seed, args.reload)
+
+        baseline = load_baseline(args.baseline)
+        if args.update_baseline:
+            write_baseline(results, args.baseline)
+            return
+        if not baseline:
+            print(f"✗ No baseline at {args.baseline}: run with --update-baseline and commit the file")
+            sys.exit(1)
+        failures = check(results, baseline, args.max_ratio)
+        if failures:
+            print(f"\n✗ {len(failures)} query plan failure(s):")
+            for failure in failures:
+                print(f"  {failure}")
+            print("\nAdd an index, or accept an intended change with --update-baseline and commit the file.")
+            sys.exit(1)
+        print(f"\n✓ {len(results)} query shapes match the baseline")
+    finally:
+        client.close()
+
+
+if __name__ == "__main__":
+    main()
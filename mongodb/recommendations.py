@@ -0,0 +1,257 @@
+"""
+Similar-Property Recommendations
+Precomputes the top-N similar active properties into property_similar
+
+Requires numpy (optional dependency: pip install numpy).
+
+Similarity combines property type, price, bedrooms, area, amenity overlap
+and distance. Properties are scored in batches per geo cell (sharding.py)
+against the active properties of that cell and its neighbours, so the job
+never builds an all-pairs matrix. After the first run only cells touched by
+property or listing changes since the last run are recomputed. Each stored
+entry carries a summary of the similar property, so a detail page needs one
+read by _id.
+"""
+
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterable, List, Optional, Set
+
+from pymongo import DeleteMany, ReplaceOne
+
+from models import ListingStatus
+from sharding import neighbor_cells
+
+SIMILAR_COLLECTION = "property_similar"
+_WATERMARK_ID = "_watermark"
+
+# Score weights (sum to 1)
+WEIGHTS = {
+    "type": 0.25,
+    "price": 0.25,
+    "bedrooms": 0.15,
+    "area": 0.10,
+    "amenities": 0.10,
+    "distance": 0.15,
+}
+PRICE_SCALE = 0.25      # |log price ratio| at which price similarity is 1/e
+AREA_SCALE = 0.30       # same, for area_sqft
+DISTANCE_SCALE_M = 5000.0
+
+# Target rows scored per matrix (bounds memory to chunk x candidates)
+TARGET_CHUNK = 256
+
+_PROJECTION = {
+    "title": 1,
+    "property_type": 1,
+    "current_price": 1,
+    "bedrooms": 1,
+    "area_sqft": 1,
+    "amenities": 1,
+    "images": {"$slice": 1},
+    "location.city": 1,
+    "location.geo.coordinates": 1,
+    "region": 1,
+}
+
+_METERS_PER_DEGREE = 111320.0
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError as e:
+        raise ImportError("recommendations.py requires numpy: pip install numpy") from e
+    return numpy
+
+
+def _summary(doc: Dict[str, Any], score: float) -> Dict[str, Any]:
+    """What a detail page shows for one similar property"""
+    return {
+        "property_id": doc["_id"],
+        "score": round(float(score), 4),
+        "title": doc.get("title"),
+        "property_type": doc.get("property_type"),
+        "current_price": doc.get("current_price"),
+        "bedrooms": doc.get("bedrooms"),
+        "area_sqft": doc.get("area_sqft"),
+        "city": (doc.get("location") or {}).get("city"),
+        "image": (doc.get("images") or [None])[0],
+    }
+
+
+class _Features:
+    """Column arrays for a set of property documents"""
+
+    def __init__(self, np, docs: List[Dict[str, Any]], amenity_ids: Dict[str, int]):
+        n = len(docs)
+        self.type = np.array([hash(doc.get("property_type")) for doc in docs], dtype=np.int64)
+        self.log_price = np.log(np.array([doc.get("current_price") or np.nan for doc in docs], dtype=np.float32))
+        self.bedrooms = np.array([doc.get("bedrooms") if doc.get("bedrooms") is not None else np.nan
+                                  for doc in docs], dtype=np.float32)
+        self.log_area = np.log(np.array([doc.get("area_sqft") or np.nan for doc in docs], dtype=np.float32))
+        coords = [((doc.get("location") or {}).get("geo") or {}).get("coordinates") or (np.nan, np.nan)
+                  for doc in docs]
+        self.lon = np.radians(np.array([c[0] for c in coords], dtype=np.float32))
+        self.lat = np.radians(np.array([c[1] for c in coords], dtype=np.float32))
+        self.amenities = np.zeros((n, max(len(amenity_ids), 1)), dtype=np.float32)
+        for i, doc in enumerate(docs):
+            for amenity in doc.get("amenities") or ():
+                self.amenities[i, amenity_ids[amenity]] = 1.0
+        self.amenity_counts = self.amenities.sum(axis=1)
+
+    def rows(self, sl: slice) -> Dict[str, Any]:
+        return {name: getattr(self, name)[sl] for name in
+                ("type", "log_price", "bedrooms", "log_area", "lon", "lat", "amenities", "amenity_counts")}
+
+
+def score_matrix(np, targets: Dict[str, Any], candidates: "_Features"):
+    """Similarity of each target row to each candidate (targets x candidates)"""
+    def closeness(a, b, scale):
+        # exp(-|a-b|/scale); 0.5 when either side is unknown
+        sim = np.exp(-np.abs(a[:, None] - b[None, :]) / scale)
+        return np.where(np.isnan(sim), 0.5, sim)
+
+    score = WEIGHTS["type"] * (targets["type"][:, None] == candidates.type[None, :])
+    score = score + WEIGHTS["price"] * closeness(targets["log_price"], candidates.log_price, PRICE_SCALE)
+    score += WEIGHTS["bedrooms"] * closeness(targets["bedrooms"], candidates.bedrooms, 1.0)
+    score += WEIGHTS["area"] * closeness(targets["log_area"], candidates.log_area, AREA_SCALE)
+
+    overlap = targets["amenities"] @ candidates.amenities.T
+    union = targets["amenity_counts"][:, None] + candidates.amenity_counts[None, :] - overlap
+    score += WEIGHTS["amenities"] * np.divide(overlap, union, out=np.zeros_like(overlap), where=union > 0)
+
+    # Equirectangular distance: accurate enough within neighbouring cells
+    dlat = targets["lat"][:, None] - candidates.lat[None, :]
+    dlon = (targets["lon"][:, None] - candidates.lon[None, :]) * np.cos(targets["lat"])[:, None]
+    dist_m = np.sqrt(dlat ** 2 + dlon ** 2) * (_METERS_PER_DEGREE * 180 / np.pi)
+    score += WEIGHTS["distance"] * np.nan_to_num(np.exp(-dist_m / DISTANCE_SCALE_M))
+    return score
+
+
+def _active_ids(db, property_ids: Optional[List[Any]] = None) -> Set[Any]:
+    query = {"status": ListingStatus.ACTIVE}
+    if property_ids is not None:
+        query["property_id"] = {"$in": property_ids}
+    return {doc["property_id"] for doc in db.listings.find(query, {"property_id": 1, "_id": 0})}
+
+
+def _load_active(db, cells: Optional[Iterable[str]] = None) -> List[Dict[str, Any]]:
+    query = {"region": {"$in": list(cells)}} if cells is not None else {"region": {"$exists": True}}
+    docs = list(db.properties.find(query, _PROJECTION, batch_size=10000))
+    active = _active_ids(db, [doc["_id"] for doc in docs] if cells is not None else None)
+    return [doc for doc in docs if doc["_id"] in active]
+
+
+def _changed_cells(db, since: datetime) -> Set[str]:
+    """Cells containing a property whose document or listing changed since `since`"""
+    changed = {doc["_id"]: doc.get("region") for doc in db.properties.find(
+        {"updated_at": {"$gte": since}}, {"region": 1})}
+    listed = [doc["property_id"] for doc in db.listings.find({"updated_at": {"$gte": since}}, {"property_id": 1})]
+    missing = [pid for pid in listed if pid not in changed]
+    if missing:
+        changed.update((doc["_id"], doc.get("region")) for doc in db.properties.find(
+            {"_id": {"$in": missing}}, {"region": 1}))
+    return {region for region in changed.values() if region}
+
+
+def refresh_similar(db, top_n: int = 10, full: bool = False, batch_size: int = 1000) -> Dict[str, Any]:
+    """
+    Recompute property_similar for every active property, or incrementally
+
+    Args:
+        db: MongoDB database instance
+        top_n: Similar properties stored per property
+        full: Ignore the watermark and recompute everything
+        batch_size: Documents per bulk write
+
+    Returns:
+        dict: {"cells": cells recomputed (None = all), "properties": rows written, "seconds": elapsed}
+    """
+    np = _import_numpy()
+    start = time.perf_counter()
+    now = datetime.now(timezone.utc)
+    similar = db[SIMILAR_COLLECTION]
+    watermark = None if full else (similar.find_one({"_id": _WATERMARK_ID}) or {}).get("refreshed_at")
+
+    if watermark is None:
+        target_cells = None
+        docs = _load_active(db)
+    else:
+        # A change in cell C can alter the results of every target whose
+        # candidate pool includes C, i.e. the targets in C's neighbours.
+        target_cells = {n for cell in _changed_cells(db, watermark) for n in neighbor_cells(cell)}
+        if not target_cells:
+            similar.update_one({"_id": _WATERMARK_ID}, {"$set": {"refreshed_at": now}}, upsert=True)
+            return {"cells": [], "properties": 0, "seconds": time.perf_counter() - start}
+        docs = _load_active(db, {n for cell in target_cells for n in neighbor_cells(cell)})
+
+    by_cell: Dict[str, List[int]] = {}
+    for i, doc in enumerate(docs):
+        by_cell.setdefault(doc["region"], []).append(i)
+    amenity_ids: Dict[str, int] = {}
+    for doc in docs:
+        for amenity in doc.get("amenities") or ():
+            amenity_ids.setdefault(amenity, len(amenity_ids))
+
+    ops, written = [], 0
+    for cell, rows in by_cell.items():
+        if target_cells is not None and cell not in target_cells:
+            continue
+        pool = [i for n in neighbor_cells(cell) for i in by_cell.get(n, ())]
+        candidates = _Features(np, [docs[i] for i in pool], amenity_ids)
+        targets = _Features(np, [docs[i] for i in rows], amenity_ids)
+        pool_index = {docs[i]["_id"]: k for k, i in enumerate(pool)}
+
+        for lo in range(0, len(rows), TARGET_CHUNK):
+            chunk = rows[lo:lo + TARGET_CHUNK]
+            scores = score_matrix(np, targets.rows(slice(lo, lo + len(chunk))), candidates)
+            for r, i in enumerate(chunk):
+                scores[r, pool_index[docs[i]["_id"]]] = -np.inf  # not similar to itself
+            k = min(top_n, len(pool) - 1)
+            if k <= 0:
+                best = np.empty((len(chunk), 0), dtype=int)
+            else:
+                best = np.argpartition(-scores, k - 1, axis=1)[:, :k]
+            for r, i in enumerate(chunk):
+                order = best[r][np.argsort(-scores[r, best[r]], kind="stable")]
+                ops.append(ReplaceOne({"_id": docs[i]["_id"]}, {
+                    "region": cell,
+                    "similar": [_summary(docs[pool[j]], scores[r, j]) for j in order],
+                    "computed_at": now,
+                }, upsert=True))
+            if len(ops) >= batch_size:
+                similar.bulk_write(ops, ordered=False)
+                written += len(ops)
+                ops = []
+
+    # Rows in recomputed cells that were not rewritten: no longer active
+    written += len(ops)
+    stale = {"computed_at": {"$lt": now}}
+    if target_cells is not None:
+        stale["region"] = {"$in": list(target_cells)}
+    ops.append(DeleteMany(stale))
+    similar.bulk_write(ops, ordered=False)
+    similar.update_one({"_id": _WATERMARK_ID}, {"$set": {"refreshed_at": now}}, upsert=True)
+
+    elapsed = time.perf_counter() - start
+    print(f"✓ property_similar refreshed: {written} properties in "
+          f"{'all' if target_cells is None else len(target_cells)} cell(s) ({elapsed:.1f}s)")
+    return {"cells": None if target_cells is None else sorted(target_cells), "properties": written,
+            "seconds": elapsed}
+
+
+if __name__ == "__main__":
+    import argparse
+    from config import get_database, close_connection
+
+    parser = argparse.ArgumentParser(description="Recompute similar-property recommendations")
+    parser.add_argument("--full", action="store_true", help="recompute every cell, not just changed ones")
+    parser.add_argument("--top", type=int, default=10, help="similar properties per property")
+    args = parser.parse_args()
+
+    client, db = get_database()
+    try:
+        refresh_similar(db, top_n=args.top, full=args.full)
+    finally:
+        close_connection(client)
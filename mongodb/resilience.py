@@ -0,0 +1,317 @@
+"""
+Circuit Breakers, Deadlines and Load Shedding
+Fail fast instead of piling up workers when MongoDB is slow or failing over
+
+Every guarded DatabaseOperations call:
+
+    1. is admitted by priority: while more than a class's share of
+       MAX_CONCURRENT_OPERATIONS calls are in flight, new calls of that class
+       are shed (OverloadedError), so analytics and audit queries give way
+       before user-facing reads and writes;
+    2. fails fast (CircuitOpenError) while the circuit of its collection is
+       open, i.e. after CIRCUIT_FAILURE_THRESHOLD consecutive timeouts or
+       connection errors; after CIRCUIT_RESET_SECONDS one trial call is let
+       through and closes the circuit again if it succeeds;
+    3. runs under a deadline (pymongo.timeout, client-side operation timeout):
+       server selection, connection checkout and the server's maxTimeMS are
+       all bounded by what is left of it.
+
+With STALE_CACHE_SECONDS > 0 (off by default: every cached result is an
+extra deep copy per read), single-document lookups (get_property_by_id, ...)
+keep their last good result in a StaleCache and return it while the circuit
+is open or the call times out.
+
+Not guarded: batch and maintenance entry points (refresh_market_stats,
+refresh_trending_listings, refresh_similar_properties, archive_stale,
+fold_view_counts, scan_collection and the dependents phase of
+cascade_delete), which legitimately run longer than any request deadline,
+and autocomplete, which is answered by an in-process index.
+"""
+
+import copy
+import functools
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+import pymongo
+from pymongo.errors import ConnectionFailure, ExecutionTimeout, PyMongoError, WTimeoutError
+
+# Share of MAX_CONCURRENT_OPERATIONS a call may be admitted into, per kind
+PRIORITY_SHARES = {
+    "read": 1.0,        # user-facing lookups
+    "write": 1.0,
+    "search": 0.75,     # search and browse pages
+    "analytics": 0.25,  # reporting, audit log queries, batch refreshes
+}
+
+
+class CircuitOpenError(ConnectionFailure):
+    """The collection's circuit is open; the call was not attempted"""
+
+    def __init__(self, collection: str, retry_in: float):
+        super().__init__(f"Circuit for {collection} is open (retry in {retry_in:.1f}s)")
+        self.collection = collection
+        self.retry_in = retry_in
+
+
+class OverloadedError(PyMongoError):
+    """Too many calls in flight for this priority; the call was shed"""
+
+    def __init__(self, kind: str, in_flight: int):
+        super().__init__(f"Shed {kind} call: {in_flight} operations in flight")
+        self.kind = kind
+        self.in_flight = in_flight
+
+
+def is_server_failure(error: BaseException) -> bool:
+    """Timeouts and connection errors count against a circuit; duplicate keys, validation etc. do not"""
+    if isinstance(error, (ConnectionFailure, ExecutionTimeout, WTimeoutError)):
+        return True
+    return isinstance(error, PyMongoError) and getattr(error, "timeout", False)
+
+
+class CircuitBreaker:
+    """
+    Consecutive-failure circuit breaker
+
+    closed -> open after failure_threshold failures in a row;
+    open -> half_open after reset_timeout seconds (one trial call);
+    half_open -> closed on success, back to open on failure.
+    """
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_timeout: float = 30.0):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.times_opened = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """Raise CircuitOpenError unless the call may proceed"""
+        with self._lock:
+            if self.state == "closed":
+                return
+            retry_in = self.opened_at + self.reset_timeout - time.monotonic()
+            if self.state == "open" and retry_in <= 0:
+                self.state = "half_open"
+            if self.state == "half_open" and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return
+            raise CircuitOpenError(self.name, max(retry_in, 0.0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            self.failures = 0
+            self._trial_in_flight = False
+            if self.state != "closed":
+                print(f"✓ Circuit {self.name} closed")
+            self.state = "closed"
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            self._trial_in_flight = False
+            if self.state == "half_open" or (self.state == "closed" and self.failures >= self.failure_threshold):
+                self.state = "open"
+                self.opened_at = time.monotonic()
+                self.times_opened += 1
+                print(f"✗ Circuit {self.name} opened after {self.failures} failure(s)")
+
+    def release(self) -> None:
+        """Call finished with an error that says nothing about the server"""
+        with self._lock:
+            self._trial_in_flight = False
+
+    def snapshot(self) -> Dict[str, Any]:
+        return {"state": self.state, "failures": self.failures, "times_opened": self.times_opened}
+
+
+class StaleCache:
+    """Last good result per key, served when the database cannot answer"""
+
+    def __init__(self, max_age: float = 300.0, max_entries: int = 10000):
+        self.max_age = max_age
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def put(self, key: Hashable, value: Any) -> None:
+        value = copy.deepcopy(value)  # callers may mutate what they were given
+        with self._lock:
+            self._entries[key] = (time.monotonic(), value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def get(self, key: Hashable) -> Tuple[bool, Any]:
+        """(found, value) for an entry younger than max_age"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or time.monotonic() - entry[0] > self.max_age:
+                return False, None
+            return True, copy.deepcopy(entry[1])
+
+    def discard(self, key: Hashable) -> None:
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class Resilience:
+    """
+    Breakers, admission control, deadlines and stale fallback for DatabaseOperations
+
+    Args:
+        timeouts: Deadline in seconds per kind ("read", "write", "search", "analytics"; None = no deadline)
+        max_concurrent: In-flight guarded calls across all kinds
+        failure_threshold: Consecutive failures that open a circuit
+        reset_timeout: Seconds an open circuit waits before a trial call
+        stale_cache: Fallback cache for single-document lookups (None disables fallback)
+    """
+
+    def __init__(self, timeouts: Optional[Dict[str, Optional[float]]] = None, max_concurrent: int = 64,
+                 failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 stale_cache: Optional[StaleCache] = None):
+        self.timeouts = {"read": 2.0, "write": 5.0, "search": 3.0, "analytics": 30.0, **(timeouts or {})}
+        self.max_concurrent = max_concurrent
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.stale_cache = stale_cache
+        self.in_flight = 0
+        self.stats = {"shed": 0, "fast_failures": 0, "timeouts": 0, "stale_served": 0}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    @classmethod
+    def from_settings(cls) -> "Resilience":
+        from config import get_settings
+        settings = get_settings()
+
+        def seconds(ms):
+            return ms / 1000 if ms > 0 else None
+
+        return cls(
+            timeouts={kind: seconds(settings[f"{kind.upper()}_TIMEOUT_MS"]) for kind in PRIORITY_SHARES},
+            max_concurrent=settings["MAX_CONCURRENT_OPERATIONS"],
+            failure_threshold=settings["CIRCUIT_FAILURE_THRESHOLD"],
+            reset_timeout=settings["CIRCUIT_RESET_SECONDS"],
+            stale_cache=StaleCache(settings["STALE_CACHE_SECONDS"]) if settings["STALE_CACHE_SECONDS"] > 0 else None,
+        )
+
+    def breaker(self, collection: str) -> CircuitBreaker:
+        with self._lock:
+            breaker = self._breakers.get(collection)
+            if breaker is None:
+                breaker = self._breakers[collection] = CircuitBreaker(
+                    collection, self.failure_threshold, self.reset_timeout)
+            return breaker
+
+    def _admit(self, kind: str) -> None:
+        limit = self.max_concurrent * PRIORITY_SHARES[kind]
+        with self._lock:
+            if self.in_flight >= limit:
+                self.stats["shed"] += 1
+                raise OverloadedError(kind, self.in_flight)
+            self.in_flight += 1
+
+    def _leave(self) -> None:
+        with self._lock:
+            self.in_flight -= 1
+
+    def call(self, collection: str, kind: str, fn: Callable[[], Any], fallback_key: Optional[Hashable] = None) -> Any:
+        """
+        Run fn under the collection's breaker, the kind's deadline and admission limit
+
+        Nested guarded calls (a guarded method calling another) run inside the
+        outer guard only.
+
+        Raises:
+            OverloadedError: The call was shed
+            CircuitOpenError: The circuit is open and no stale result was cached
+        """
+        if getattr(self._local, "depth", 0):
+            return fn()
+        use_stale = fallback_key is not None and self.stale_cache is not None
+
+        breaker = self.breaker(collection)
+        try:
+            breaker.before_call()
+        except CircuitOpenError:
+            self.stats["fast_failures"] += 1
+            if use_stale:
+                found, value = self.stale_cache.get(fallback_key)
+                if found:
+                    self.stats["stale_served"] += 1
+                    return value
+            raise
+
+        try:
+            self._admit(kind)
+        except OverloadedError:
+            breaker.release()
+            raise
+        self._local.depth = 1
+        try:
+            timeout = self.timeouts.get(kind)
+            if timeout is None:
+                result = fn()
+            else:
+                with pymongo.timeout(timeout):
+                    result = fn()
+        except BaseException as e:
+            if not is_server_failure(e):
+                breaker.release()
+                raise
+            breaker.record_failure()
+            if getattr(e, "timeout", False):
+                self.stats["timeouts"] += 1
+            if use_stale:
+                found, value = self.stale_cache.get(fallback_key)
+                if found:
+                    self.stats["stale_served"] += 1
+                    return value
+            raise
+        finally:
+            self._local.depth = 0
+            self._leave()
+
+        breaker.record_success()
+        if use_stale and result is not None:
+            self.stale_cache.put(fallback_key, result)
+        return result
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            breakers = {name: b.snapshot() for name, b in self._breakers.items()}
+            return {**self.stats, "in_flight": self.in_flight, "circuits": breakers}
+
+
+def guarded(collection: str, kind: str = "read", fallback: bool = False):
+    """
+    Run a DatabaseOperations method through self.resilience
+
+    Args:
+        collection: Circuit the call belongs to
+        kind: "read", "write", "search" or "analytics" (deadline and priority)
+        fallback: Serve the last good result (keyed on the arguments) when the
+                  database cannot answer
+    """
+    def decorate(method):
+        @functools.wraps(method)
+        def wrapper(self, *args, **kwargs):
+            resilience = self.resilience
+            if resilience is None:
+                return method(self, *args, **kwargs)
+            key = None
+            if fallback:
+                key = (method.__name__, tuple(str(a) for a in args),
+                       tuple(sorted((k, str(v)) for k, v in kwargs.items())))
+            return resilience.call(collection, kind, lambda: method(self, *args, **kwargs), fallback_key=key)
+        return wrapper
+    return decorate
@@ -3,8 +3,11 @@ Sample Data Insertion Script
 Populates the Real Estate database with sample data for testing
 """
 
+import argparse
+from bson.objectid import ObjectId
 from operations import DatabaseOperations
 from models import UserRole, PropertyType, ListingStatus
+from data_generator import DataGenerator, load_dataset
 import uuid
 
 # def generate_id(prefix): # <-- REMOVED
@@ -57,10 +60,18 @@ def insert_sample_users(db_ops):
         }
     ]
     
+    # One lookup for all existing users instead of one round trip per user
+    existing_uids = {
+        doc["firebase_uid"]
+        for doc in db_ops.db.users.find(
+            {"firebase_uid": {"$in": [u["firebase_uid"] for u in users]}},
+            {"firebase_uid": 1}
+        )
+    }
+
     for user_data in users:
         try:
-            # Check if user already exists
-            if not db_ops.get_user_by_firebase_uid(user_data["firebase_uid"]):
+            if user_data["firebase_uid"] not in existing_uids:
                 db_ops.create_user(user_data)
                 print(f"  ✓ Created user: {user_data['name']}")
             else:
@@ -221,8 +232,17 @@ def insert_sample_reviews(db_ops):
     # (Reviews use _id, so this would require fetching properties/listers first)
     print("  (Review insertion skipped - requires fetching live _ids)")
 
-def populate_database():
-    """Main function to populate database with sample data"""
+def populate_database(users=None, seed=42, workers=4, chunk_size=1000):
+    """
+    Main function to populate database with sample data
+
+    Args:
+        users: If set, load a generated dataset scaled to this many users
+               instead of the small fixed sample (see data_generator.py)
+        seed: Generator seed (same seed + size resumes a partial load)
+        workers: Number of loader processes for generated data
+        chunk_size: Documents per bulk insert for generated data
+    """
     print("="*60)
     print(" POPULATING DATABASE WITH SAMPLE DATA ".center(60))
     print("="*60)
@@ -233,10 +253,14 @@ def populate_database():
         db_ops = DatabaseOperations()
         
         # Insert data
-        insert_sample_users(db_ops)
-        created_property_ids = insert_sample_properties(db_ops)
-        insert_sample_listings(db_ops, created_property_ids)
-        insert_sample_reviews(db_ops)
+        if users:
+            gen = DataGenerator(users=users, seed=seed, chunk_size=chunk_size)
+            load_dataset(db_ops.db, gen, workers=workers)
+        else:
+            insert_sample_users(db_ops)
+            created_property_ids = insert_sample_properties(db_ops)
+            insert_sample_listings(db_ops, created_property_ids)
+            insert_sample_reviews(db_ops)
         
         # Show analytics
         print("\n" + "="*60)
@@ -261,10 +285,16 @@ def populate_database():
     
     finally:
         # Close the connection
-        if 'db_ops' in locals() and db_ops.client:
+        if 'db_ops' in locals() and db_ops.is_connected:
             db_ops.client.close()
             print("✓ MongoDB connection closed.")
 
 
 if __name__ == "__main__":
-    populate_database()
+    parser = argparse.ArgumentParser(description="Populate the database with sample data")
+    parser.add_argument("--users", type=int, help="generate a synthetic dataset with this many users")
+    parser.add_argument("--seed", type=int, default=42, help="generator seed")
+    parser.add_argument("--workers", type=int, default=4, help="loader processes")
+    parser.add_argument("--chunk-size", type=int, default=1000, help="documents per bulk insert")
+    args = parser.parse_args()
+    populate_database(users=args.users, seed=args.seed, workers=args.workers, chunk_size=args.chunk_size)
@@ -0,0 +1,211 @@
+"""
+Saved-Search Alerts
+Reverse index of saved search_properties filters, matched against new properties
+
+Each saved search is stored with canonical filters and a list of match_keys,
+one per (property_type, city, geo cell, price band) combination it can match,
+with "*" for dimensions it does not constrain. A property expands to the 16
+wildcard combinations of its own values, so one indexed $in on match_keys
+returns exactly the candidate searches; only those are evaluated in full.
+
+City alerts compare whole city names (case-insensitive); a city filter that
+is only a fragment of the name still works in search_properties but will not
+trigger alerts.
+"""
+
+import json
+import math
+import re
+from datetime import datetime, timezone
+from itertools import product
+from typing import Any, Dict, List, Optional
+
+from search_cache import canonicalize_filters
+from sharding import geo_cell, cells_within
+from text_index import tokenize
+
+SAVED_SEARCH_FILTERS = frozenset({
+    "search_term", "near_lat", "near_lon", "max_dist_meters", "property_type",
+    "min_price", "max_price", "city", "state", "bedrooms", "min_bedrooms",
+})
+
+WILDCARD = "*"
+
+# Price bands double in width: band b covers [2**b, 2**(b+1))
+MAX_PRICE_BAND = 40
+# Above this many keys per search, the price band (then the geo cell) is wildcarded
+MAX_KEYS_PER_SEARCH = 256
+
+_EARTH_RADIUS_M = 6378100
+
+
+def price_band(price: float) -> int:
+    return min(MAX_PRICE_BAND, max(0, int(math.log2(price)))) if price and price > 0 else 0
+
+
+def _city_key(city: Optional[str]) -> Optional[str]:
+    return " ".join(city.lower().split()) if city else None
+
+
+def _key(property_type: str, city: str, cell: str, band: Any) -> str:
+    return f"t={property_type}|c={city}|g={cell}|p={band}"
+
+
+def search_keys(filters: Dict[str, Any]) -> List[str]:
+    """Reverse-index keys for a saved search"""
+    types = [filters.get("property_type") or WILDCARD]
+    cities = [_city_key(filters.get("city")) or WILDCARD]
+
+    cells = [WILDCARD]
+    if "near_lat" in filters and "near_lon" in filters:
+        cells = cells_within(filters["near_lat"], filters["near_lon"],
+                             filters.get("max_dist_meters", 10000)) or [WILDCARD]
+
+    bands = [WILDCARD]
+    if "min_price" in filters or "max_price" in filters:
+        low = price_band(filters.get("min_price", 0))
+        high = price_band(filters["max_price"]) if "max_price" in filters else MAX_PRICE_BAND
+        bands = list(range(low, high + 1))
+
+    if len(cells) * len(bands) > MAX_KEYS_PER_SEARCH:
+        bands = [WILDCARD]
+    if len(cells) > MAX_KEYS_PER_SEARCH:
+        cells = [WILDCARD]
+    return [_key(*combo) for combo in product(types, cities, cells, bands)]
+
+
+def property_keys(property_data: Dict[str, Any]) -> List[str]:
+    """All keys a saved search matching this property could be indexed under"""
+    location = property_data.get("location") or {}
+    coordinates = (location.get("geo") or {}).get("coordinates")
+    values = (
+        property_data.get("property_type"),
+        _city_key(location.get("city")),
+        geo_cell(coordinates[1], coordinates[0]) if coordinates else None,
+        price_band(property_data["current_price"]) if property_data.get("current_price") is not None else None,
+    )
+    options = [[WILDCARD] if value is None else [value, WILDCARD] for value in values]
+    return [_key(*combo) for combo in product(*options)]
+
+
+def _haversine_m(lat0: float, lon0: float, lat: float, lon: float) -> float:
+    lat0, lon0, lat, lon = map(math.radians, (lat0, lon0, lat, lon))
+    a = math.sin((lat - lat0) / 2) ** 2 + math.cos(lat0) * math.cos(lat) * math.sin((lon - lon0) / 2) ** 2
+    return 2 * _EARTH_RADIUS_M * math.asin(math.sqrt(a))
+
+
+def _regex_match(pattern: str, value: Optional[str]) -> bool:
+    try:
+        return re.search(pattern, value or "", re.IGNORECASE) is not None
+    except re.error:
+        return pattern.lower() == (value or "").lower()
+
+
+def matches(filters: Dict[str, Any], property_data: Dict[str, Any]) -> bool:
+    """Evaluate search_properties filters against one property in memory"""
+    location = property_data.get("location") or {}
+    price = property_data.get("current_price")
+    bedrooms = property_data.get("bedrooms")
+
+    if "property_type" in filters and property_data.get("property_type") != filters["property_type"]:
+        return False
+    if "min_price" in filters and (price is None or price < filters["min_price"]):
+        return False
+    if "max_price" in filters and (price is None or price > filters["max_price"]):
+        return False
+    for field in ("city", "state"):
+        if field in filters and not _regex_match(filters[field], location.get(field)):
+            return False
+    if "bedrooms" in filters and bedrooms != filters["bedrooms"]:
+        return False
+    if "min_bedrooms" in filters and (bedrooms is None or bedrooms < filters["min_bedrooms"]):
+        return False
+    if "near_lat" in filters and "near_lon" in filters:
+        coordinates = (location.get("geo") or {}).get("coordinates")
+        if not coordinates or _haversine_m(filters["near_lat"], filters["near_lon"], coordinates[1],
+                                           coordinates[0]) > filters.get("max_dist_meters", 10000):
+            return False
+    if "search_term" in filters:
+        # $text matches any term; stemming is not reproduced here
+        text = set(tokenize(f"{property_data.get('title', '')} {property_data.get('description', '')}"))
+        if not text.intersection(tokenize(filters["search_term"])):
+            return False
+    return True
+
+
+def make_saved_search(user_firebase_uid: str, filters: Dict[str, Any], name: Optional[str] = None) -> Dict[str, Any]:
+    """
+    Build a saved_searches document
+
+    Raises:
+        ValueError: If filters contain keys search alerts cannot evaluate
+    """
+    unknown = set(filters) - SAVED_SEARCH_FILTERS
+    if unknown:
+        raise ValueError(f"Unsupported saved search filter(s): {', '.join(sorted(unknown))}")
+    filters_key = canonicalize_filters(filters)
+    canonical = json.loads(filters_key)
+    return {
+        "user_firebase_uid": user_firebase_uid,
+        "name": name or "Saved search",
+        "filters": canonical,
+        "filters_key": filters_key,
+        "match_keys": search_keys(canonical),
+        "is_active": True,
+        "created_at": datetime.now(timezone.utc),
+    }
+
+
+def notify_matches(db, property_data: Dict[str, Any], previous: Optional[Dict[str, Any]] = None,
+                   session=None) -> int:
+    """
+    Notify owners of saved searches that property_data matches
+
+    Args:
+        db: MongoDB database instance
+        property_data: The new or updated property
+        previous: The property before a price change; searches it already
+                  matched are not notified again
+
+    Returns:
+        int: Number of notifications written
+    """
+    candidates = db.saved_searches.find(
+        {"match_keys": {"$in": property_keys(property_data)}, "is_active": True},
+        {"user_firebase_uid": 1, "name": 1, "filters": 1},
+        session=session
+    )
+    now = datetime.now(timezone.utc)
+    price = property_data.get("current_price")
+    city = (property_data.get("location") or {}).get("city")
+    message = property_data.get("title") or "A property"
+    if price is not None:
+        message += f" at ${price:,.0f}"
+    if city:
+        message += f" in {city}"
+
+    notifications, matched = [], []
+    for search in candidates:
+        if search["user_firebase_uid"] == property_data.get("lister_firebase_uid"):
+            continue
+        if not matches(search["filters"], property_data):
+            continue
+        if previous is not None and matches(search["filters"], previous):
+            continue
+        matched.append(search["_id"])
+        notifications.append({
+            "user_firebase_uid": search["user_firebase_uid"],
+            "title": f"New match: {search['name']}" if previous is None else f"Price change: {search['name']}",
+            "message": message,
+            "notification_type": "saved_search",
+            "property_id": property_data["_id"],
+            "saved_search_id": search["_id"],
+            "is_read": False,
+            "created_at": now,
+        })
+
+    if notifications:
+        db.notifications.insert_many(notifications, ordered=False, session=session)
+        db.saved_searches.update_many({"_id": {"$in": matched}}, {"$set": {"last_notified_at": now}},
+                                      session=session)
+    return len(notifications)
@@ -0,0 +1,136 @@
+"""
+Search Result Cache
+Caches search_properties result ids keyed on canonicalized filters
+"""
+
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, List, Tuple
+
+# Filters passed to $text, which ignores case and splits terms on whitespace.
+# Other string filters are exact matches or regexes (city, state), where case
+# and whitespace change the result, so their values are kept verbatim.
+_TEXT_SEARCH = ("search_term",)
+
+
+def canonicalize_filters(filters: Dict[str, Any]) -> str:
+    """
+    Stable cache key for a search_properties filters dict
+
+    Equivalent filters map to the same key: key order, None values,
+    case/whitespace of the $text search term, and int vs float numbers are
+    normalized.
+    """
+    canonical = {}
+    for key, value in filters.items():
+        if value is None:
+            continue
+        if isinstance(value, str):
+            if key in _TEXT_SEARCH and '"' not in value:
+                # Quoted phrases are matched as written, so only unquoted terms are collapsed
+                value = " ".join(value.lower().split())
+        elif isinstance(value, bool):
+            pass
+        elif isinstance(value, (int, float)):
+            value = float(value)
+        canonical[key] = value
+    return json.dumps(canonical, sort_keys=True, default=str, separators=(",", ":"))
+
+
+class _Flight:
+    """A query in progress that concurrent identical searches wait on"""
+
+    __slots__ = ("event", "result", "error")
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SearchCache:
+    """
+    TTL + LRU cache of result id lists with generation-based invalidation
+
+    Every entry records the collection generation it was computed under;
+    bump_generation() (called on property writes) makes all older entries
+    stale at once without scanning the cache. Identical concurrent misses are
+    coalesced so only one of them queries the database.
+    """
+
+    def __init__(self, ttl: float = 60.0, max_entries: int = 1024):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, Tuple[int, float, List[Tuple[Any, Any]]]]" = OrderedDict()
+        self._generations: Dict[str, int] = {}
+        self._flights: Dict[Hashable, _Flight] = {}
+        self._lock = threading.Lock()
+        self.stats = {"hits": 0, "misses": 0, "coalesced": 0}
+
+    def generation(self, collection: str) -> int:
+        return self._generations.get(collection, 0)
+
+    def bump_generation(self, collection: str) -> None:
+        """Invalidate every cached result derived from a collection"""
+        with self._lock:
+            self._generations[collection] = self._generations.get(collection, 0) + 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+
+    def get_or_load(self, collection: str, filters: Dict[str, Any], limit: int,
+                    loader: Callable[[], List[Tuple[Any, Any]]]) -> List[Tuple[Any, Any]]:
+        """
+        Return cached (id, score) pairs or compute them once via loader
+
+        Args:
+            collection: Collection the results come from (generation key)
+            filters: search_properties filters
+            limit: Result limit (part of the key)
+            loader: Runs the query and returns [(id, score)]
+        """
+        key = (collection, canonicalize_filters(filters), limit)
+        now = time.monotonic()
+
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                generation, expires_at, ids = entry
+                if generation == self.generation(collection) and expires_at > now:
+                    self._entries.move_to_end(key)
+                    self.stats["hits"] += 1
+                    return ids
+                del self._entries[key]
+
+            flight = self._flights.get(key)
+            leader = flight is None
+            if leader:
+                flight = self._flights[key] = _Flight()
+                generation = self.generation(collection)
+                self.stats["misses"] += 1
+            else:
+                self.stats["coalesced"] += 1
+
+        if not leader:
+            flight.event.wait()
+            if flight.error is not None:
+                raise flight.error
+            return flight.result
+
+        try:
+            flight.result = loader()
+        except BaseException as e:
+            flight.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._flights[key]
+                if flight.error is None:
+                    self._entries[key] = (generation, time.monotonic() + self.ttl, flight.result)
+                    while len(self._entries) > self.max_entries:
+                        self._entries.popitem(last=False)
+            flight.event.set()
+        return flight.result
@@ -0,0 +1,117 @@
+"""
+Sharding Support
+Shard-key design and shard-targeting helpers for the Real Estate database
+
+Shard keys:
+    properties: {region: 1, _id: 1}  - region is a coarse geo cell, so geo
+                searches and per-area browsing hit one or a few shards
+    listings:   {lister_firebase_uid: "hashed"} - spreads listing writes
+                evenly and targets get_listings_by_lister to one shard
+"""
+
+import math
+from typing import Any, Dict, List, Optional
+
+from pymongo import ASCENDING, HASHED
+
+# Collection -> shard key (in shardCollection order)
+SHARD_KEYS = {
+    "properties": [("region", ASCENDING), ("_id", ASCENDING)],
+    "listings": [("lister_firebase_uid", HASHED)],
+}
+
+# Geo cell size in degrees (~111km of latitude)
+CELL_SIZE_DEG = 1.0
+
+# Above this many cells a geo query is not worth targeting
+MAX_TARGET_CELLS = 64
+
+_METERS_PER_DEGREE = 111320.0
+
+
+def geo_cell(latitude: float, longitude: float, size: float = CELL_SIZE_DEG) -> str:
+    """Cell key such as "30:-98" for the grid cell containing a point"""
+    return f"{math.floor(latitude / size)}:{math.floor(longitude / size)}"
+
+
+def property_region(property_data: Dict[str, Any]) -> Optional[str]:
+    """Shard-key region for a property document (None without coordinates)"""
+    location = property_data.get('location') or {}
+    if 'latitude' in location and 'longitude' in location:
+        return geo_cell(location['latitude'], location['longitude'])
+    coordinates = (location.get('geo') or {}).get('coordinates')
+    if coordinates:
+        return geo_cell(coordinates[1], coordinates[0])
+    return None
+
+
+def cells_within(latitude: float, longitude: float, radius_m: float,
+                 size: float = CELL_SIZE_DEG) -> Optional[List[str]]:
+    """
+    All grid cells intersecting the bounding box of a circle
+
+    Returns:
+        list: Cell keys, or None if the circle spans more than MAX_TARGET_CELLS
+    """
+    dlat = radius_m / _METERS_PER_DEGREE
+    dlon = radius_m / (_METERS_PER_DEGREE * max(math.cos(math.radians(latitude)), 0.01))
+    lat_lo, lat_hi = math.floor((latitude - dlat) / size), math.floor((latitude + dlat) / size)
+    lon_lo, lon_hi = math.floor((longitude - dlon) / size), math.floor((longitude + dlon) / size)
+    if (lat_hi - lat_lo + 1) * (lon_hi - lon_lo + 1) > MAX_TARGET_CELLS:
+        return None
+    return [f"{i}:{j}" for i in range(lat_lo, lat_hi + 1) for j in range(lon_lo, lon_hi + 1)]
+
+
+def neighbor_cells(cell: str, radius: int = 1) -> List[str]:
+    """The cell itself plus every cell within `radius` grid steps of it"""
+    lat, lon = (int(part) for part in cell.split(":"))
+    return [f"{i}:{j}" for i in range(lat - radius, lat + radius + 1) for j in range(lon - radius, lon + radius + 1)]
+
+
+def enable_sharding(client, db) -> None:
+    """
+    Enable sharding for the database and shard the collections in SHARD_KEYS
+
+    Must be run against a mongos. Supporting indexes are created first so
+    non-empty collections can be sharded.
+    """
+    print("\n=== Enabling Sharding ===\n")
+    client.admin.command("enableSharding", db.name)
+    for collection, key in SHARD_KEYS.items():
+        db[collection].create_index(key)
+        client.admin.command("shardCollection", f"{db.name}.{collection}", key=dict(key))
+        print(f"✓ {collection} sharded on {dict(key)}")
+
+
+def shards_targeted(collection, query: Dict[str, Any]) -> int:
+    """
+    Number of shards a find() on a sharded collection is routed to
+
+    Uses explain() through mongos; 1 means the query is targeted.
+    """
+    plan = collection.find(query).explain()["queryPlanner"]["winningPlan"]
+    if plan.get("stage") == "SINGLE_SHARD":
+        return 1
+    return len(plan.get("shards", [])) or 1
+
+
+def verify_targeting(db_ops) -> Dict[str, int]:
+    """
+    Report shard fan-out for the DatabaseOperations query shapes that should
+    be targeted on a sharded cluster
+    """
+    db = db_ops.db
+    listing = db.listings.find_one({}, {"lister_firebase_uid": 1}) or {}
+    prop = db.properties.find_one({"region": {"$exists": True}}, {"region": 1}) or {}
+
+    shapes = {
+        "listings by lister": (db.listings, {"lister_firebase_uid": listing.get("lister_firebase_uid")}),
+        "listing by _id + lister": (db.listings, {"_id": listing.get("_id"),
+                                                  "lister_firebase_uid": listing.get("lister_firebase_uid")}),
+        "property by _id + region": (db.properties, {"_id": prop.get("_id"), "region": prop.get("region")}),
+    }
+    report = {}
+    for name, (collection, query) in shapes.items():
+        report[name] = shards_targeted(collection, query)
+        print(f"{'✓' if report[name] == 1 else '✗'} {name}: {report[name]} shard(s)")
+    return report
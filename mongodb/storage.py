@@ -0,0 +1,152 @@
+"""
+Storage Settings and Report
+WiredTiger compression options per collection and a data/index size report
+
+Block compression and index prefix compression are fixed when a collection
+or index is created; init_db.py applies them to collections it creates and
+to indexes it builds. Existing collections keep their settings until they
+are re-created (e.g. dump/restore or an initial sync of a new member).
+
+Usage:
+    python storage.py                # per-collection and per-index sizes
+    python storage.py --json
+"""
+
+import argparse
+import json
+from typing import Any, Dict, List, Optional
+
+from pymongo.errors import CollectionInvalid, OperationFailure
+
+# block_compressor: "snappy" (MongoDB default), "zstd" (smaller, more CPU), "zlib" or "none"
+# index_prefix_compression: share key prefixes between index entries (WiredTiger default: on)
+DEFAULT_STORAGE = {"block_compressor": "snappy", "index_prefix_compression": True}
+
+COLLECTION_STORAGE = {
+    # Large, text-heavy documents (descriptions, image URLs, price_history)
+    "properties": {"block_compressor": "zstd"},
+    "message_buckets": {"block_compressor": "zstd"},
+    "notifications": {"block_compressor": "zstd"},
+    "audit_logs": {"block_compressor": "zstd"},
+}
+
+# Cold collections (cascade.py) are written once and rarely read
+ARCHIVE_STORAGE = {"block_compressor": "zstd"}
+
+_MB = 1024 * 1024
+
+
+def storage_options(collection: str) -> Dict[str, Any]:
+    """Effective storage settings for a collection"""
+    options = dict(DEFAULT_STORAGE)
+    if collection.endswith("_archive"):
+        options.update(ARCHIVE_STORAGE)
+    options.update(COLLECTION_STORAGE.get(collection, {}))
+    return options
+
+
+def collection_storage_engine(collection: str) -> Dict[str, Any]:
+    """storageEngine option for create_collection"""
+    return {"wiredTiger": {"configString": f"block_compressor={storage_options(collection)['block_compressor']}"}}
+
+
+def index_storage_engine(collection: str) -> Dict[str, Any]:
+    """storageEngine option for index builds"""
+    prefix = "true" if storage_options(collection)["index_prefix_compression"] else "false"
+    return {"wiredTiger": {"configString": f"prefix_compression={prefix}"}}
+
+
+def ensure_collection(db, collection: str, **options) -> bool:
+    """
+    Create a collection with its storage settings if it does not exist
+
+    Returns:
+        bool: True if the collection was created
+    """
+    if collection in db.list_collection_names(filter={"name": collection}):
+        return False
+    try:
+        db.create_collection(collection, storageEngine=collection_storage_engine(collection), **options)
+        return True
+    except CollectionInvalid:
+        return False  # created concurrently
+
+
+# ==================== REPORT ====================
+
+def _block_compressor(wired_tiger: Dict[str, Any]) -> Optional[str]:
+    for part in (wired_tiger.get("creationString") or "").split(","):
+        if part.startswith("block_compressor="):
+            return part.split("=", 1)[1] or "none"
+    return None
+
+
+def collection_stats(db, collection: str) -> Dict[str, Any]:
+    """
+    Storage statistics for one collection ($collStats, summed over shards)
+
+    Returns:
+        dict: count, data_size (uncompressed BSON), storage_size (on disk),
+              compression_ratio, index_size, indexes {name: bytes}, block_compressor
+    """
+    stats = {"collection": collection, "count": 0, "data_size": 0, "storage_size": 0,
+             "index_size": 0, "indexes": {}, "block_compressor": None}
+    for shard in db[collection].aggregate([{"$collStats": {"storageStats": {}}}]):
+        storage = shard["storageStats"]
+        stats["count"] += storage.get("count", 0)
+        stats["data_size"] += storage.get("size", 0)
+        stats["storage_size"] += storage.get("storageSize", 0)
+        stats["index_size"] += storage.get("totalIndexSize", 0)
+        for name, size in (storage.get("indexSizes") or {}).items():
+            stats["indexes"][name] = stats["indexes"].get(name, 0) + size
+        stats["block_compressor"] = stats["block_compressor"] or _block_compressor(storage.get("wiredTiger") or {})
+    stats["compression_ratio"] = stats["data_size"] / stats["storage_size"] if stats["storage_size"] else None
+    return stats
+
+
+def storage_report(db) -> List[Dict[str, Any]]:
+    """collection_stats for every collection, largest on disk first"""
+    report = []
+    for name in db.list_collection_names():
+        if name.startswith("system."):
+            continue
+        try:
+            report.append(collection_stats(db, name))
+        except OperationFailure as e:
+            print(f"✗ {name}: {e}")
+    return sorted(report, key=lambda stats: stats["storage_size"] + stats["index_size"], reverse=True)
+
+
+def print_storage_report(report: List[Dict[str, Any]]) -> None:
+    print(f"\n{'collection':28s} {'docs':>10s} {'data MB':>9s} {'disk MB':>9s} {'ratio':>6s} "
+          f"{'index MB':>9s}  compressor")
+    for stats in report:
+        ratio = f"{stats['compression_ratio']:.2f}" if stats["compression_ratio"] else "-"
+        print(f"{stats['collection']:28s} {stats['count']:10d} {stats['data_size'] / _MB:9.1f} "
+              f"{stats['storage_size'] / _MB:9.1f} {ratio:>6s} {stats['index_size'] / _MB:9.1f}  "
+              f"{stats['block_compressor'] or '?'}")
+        for name, size in sorted(stats["indexes"].items(), key=lambda item: -item[1]):
+            print(f"    {name:52s} {size / _MB:9.1f}")
+    total_disk = sum(s["storage_size"] + s["index_size"] for s in report)
+    print(f"\nTotal on disk (data + indexes): {total_disk / _MB:.1f} MB\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Report data and index sizes per collection")
+    parser.add_argument("--json", action="store_true", help="print the report as JSON")
+    args = parser.parse_args()
+
+    from config import get_database, close_connection
+    client, db = get_database()
+    try:
+        report = storage_report(db)
+        if args.json:
+            print(json.dumps(report, indent=2))
+        else:
+            print_storage_report(report)
+    finally:
+        close_connection(client)
+
+
+if __name__ == "__main__":
+    main()
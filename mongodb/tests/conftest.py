@@ -0,0 +1,9 @@
+"""
+Test configuration: the package modules use flat imports (from config import ...),
+so the package directory goes on sys.path.
+"""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,232 @@
+"""
+DatabaseOperations on the in-memory backend
+
+Covers the CRUD, search and aggregation paths of DatabaseOperations.in_memory()
+and pins down where memory_backend deliberately differs from MongoDB.
+"""
+
+from types import SimpleNamespace
+
+import pytest
+from bson.objectid import ObjectId
+from pymongo.errors import DuplicateKeyError, WriteError
+
+from operations import DatabaseOperations
+
+
+@pytest.fixture
+def ops():
+    return DatabaseOperations.in_memory(resilience=False, search_alerts=False)
+
+
+def make_property(ops, title="Sunny loft", price=250000, lat=30.27, lon=-97.74, **extra):
+    return ops.create_property({
+        "title": title,
+        "description": "Bright home close to downtown",
+        "property_type": "residential",
+        "current_price": price,
+        "bedrooms": 2,
+        "area_sqft": 900,
+        "location": {"address": "1 Main St", "city": "Austin", "state": "TX", "zip_code": "78701",
+                     "latitude": lat, "longitude": lon},
+        **extra,
+    })
+
+
+def make_listing(ops, property_id, status="active", lister="lister-1"):
+    return ops.create_listing({
+        "property_id": property_id, "lister_firebase_uid": lister, "listing_type": "sale",
+        "price": 250000, "status": status,
+    })
+
+
+# ==================== CRUD ====================
+
+def test_in_memory_databases_are_isolated(ops):
+    make_property(ops)
+    assert DatabaseOperations.in_memory().db.properties.count_documents({}) == 0
+
+
+def test_user_crud(ops):
+    ops.create_user({"firebase_uid": "u1", "email": "u1@example.com", "role": "buyer"})
+    assert ops.get_user_by_firebase_uid("u1")["verification_status"] == "not_submitted"
+
+    assert ops.update_user("u1", {"phone": "555-0100"})
+    assert ops.get_user_by_firebase_uid("u1")["phone"] == "555-0100"
+
+    assert ops.delete_user("u1")
+    assert ops.get_user_by_firebase_uid("u1") is None
+
+
+def test_unique_index_is_enforced(ops):
+    ops.create_user({"firebase_uid": "u1", "email": "a@example.com", "role": "buyer"})
+    with pytest.raises(DuplicateKeyError):
+        ops.create_user({"firebase_uid": "u1", "email": "b@example.com", "role": "buyer"})
+
+
+def test_property_price_history_pipeline_update(ops):
+    prop = make_property(ops, price=100000)
+    pid = str(prop["_id"])
+
+    assert ops.update_property(pid, {"current_price": 90000, "price_change_reason": "Reduced"})
+    assert ops.update_property(pid, {"current_price": 90000})  # unchanged price: no new entry
+
+    stored = ops.get_property_by_id(pid)
+    assert stored["current_price"] == 90000
+    assert [entry["price"] for entry in stored["price_history"]] == [100000, 90000]
+    assert stored["location"]["geo"] == {"type": "Point", "coordinates": [-97.74, 30.27]}
+
+
+
+def test_update_property_filters_on_shard_key(ops):
+    prop = make_property(ops)
+    pid, region = str(prop["_id"]), prop["region"]
+
+    assert not ops.update_property(pid, {"current_price": 1}, region="0:0")  # wrong shard key
+    assert ops.update_property(pid, {"current_price": 2}, region=region)
+
+    moved = {"address": "9 Elm St", "city": "Dallas", "state": "TX", "zip_code": "75201",
+             "latitude": 32.78, "longitude": -96.80}
+    assert ops.update_property(pid, {"location": moved})  # region looked up, rewritten in a transaction
+    assert ops.get_property_by_id(pid, region) is None
+    assert ops.get_property_by_id(pid, "32:-97")["current_price"] == 2
+    assert not ops.update_property(str(ObjectId()), {"current_price": 3})
+
+def test_listing_views_and_status(ops):
+    prop = make_property(ops)
+    listing = make_listing(ops, prop["_id"])
+    lid = str(listing["_id"])
+
+    ops.get_listing_by_id(lid, increment_view=True)
+    assert ops.get_listing_by_id(lid, increment_view=True)["views_count"] == 2
+    assert [doc["_id"] for doc in ops.get_listings_by_status("active")] == [listing["_id"]]
+    assert ops.delete_listing(lid)
+    assert ops.get_listing_by_id(lid) is None
+
+
+
+def test_sharded_view_counter_skips_unknown_listings(ops):
+    from contention import ShardedCounter
+
+    ops.view_counter = ShardedCounter(ops.db, "listing_views")
+    listing = make_listing(ops, make_property(ops)["_id"])
+    lid = str(listing["_id"])
+
+    assert ops.get_listing_by_id(lid, increment_view=True)["views_count"] == 1
+    assert ops.get_listing_by_id(lid, increment_view=True, lister_firebase_uid="someone-else") is None
+    assert ops.get_listing_by_id(str(ObjectId()), increment_view=True) is None
+    assert ops.db.counter_shards.count_documents({}) == 1
+
+def test_changing_id_raises_immutable_field(ops):
+    prop = make_property(ops)
+    with pytest.raises(WriteError) as info:
+        ops.db.properties.update_one({"_id": prop["_id"]}, {"$set": {"_id": ObjectId()}})
+    assert info.value.code == 66
+
+
+# ==================== SEARCH ====================
+
+def test_text_search_ranks_by_index_weights(ops):
+    make_property(ops, title="Garden cottage")
+    loft = make_property(ops, title="Loft with loft bedroom")
+    results = ops.search_properties({"search_term": "loft"})
+    assert results[0]["_id"] == loft["_id"]
+    assert all("score" in doc for doc in results)
+
+
+def test_text_search_has_no_stemming(ops):
+    # MongoDB stems "lofts" to "loft"; the in-memory backend only matches whole tokens
+    make_property(ops, title="Loft")
+    assert ops.search_properties({"search_term": "lofts"}) == []
+
+
+def test_text_inside_or_and_aggregate_match(ops):
+    make_property(ops, title="Garden cottage")
+    make_property(ops, title="Loft", price=1)
+    properties = ops.db.properties
+    assert properties.count_documents({"$or": [{"$text": {"$search": "cottage"}}, {"current_price": 1}]}) == 2
+    assert list(properties.aggregate([{"$match": {"$text": {"$search": "loft"}}}, {"$count": "n"}])) == [{"n": 1}]
+
+
+def test_geo_search_orders_by_distance(ops):
+    far = make_property(ops, title="Far", lat=30.40, lon=-97.74)
+    near = make_property(ops, title="Near", lat=30.28, lon=-97.74)
+    results = ops.search_properties({"near_lat": 30.27, "near_lon": -97.74, "max_dist_meters": 50000})
+    assert [doc["_id"] for doc in results] == [near["_id"], far["_id"]]
+
+    within = ops.search_properties({"near_lat": 30.27, "near_lon": -97.74, "max_dist_meters": 5000})
+    assert [doc["_id"] for doc in within] == [near["_id"]]
+
+
+def test_filter_search(ops):
+    cheap = make_property(ops, price=100000, area_sqft=600)
+    make_property(ops, price=500000, area_sqft=2000, lat=40.7, lon=-74.0)
+
+    def ids(filters):
+        return [doc["_id"] for doc in ops.search_properties(filters)]
+
+    assert ids({"max_price": 200000}) == [cheap["_id"]]
+    assert ids({"city": "aust"}) != []
+    assert ids({"max_area": 1000}) == [cheap["_id"]]
+    assert ids({"bbox": (29.0, -98.0, 31.0, -97.0)}) == [cheap["_id"]]
+
+
+
+def test_active_only_fallback_semi_joins_listings(ops):
+    ops.property_snapshot = SimpleNamespace(active_only=True, supports=lambda filters: False)
+    ops.ACTIVE_BATCH_SIZE = 2
+    props = [make_property(ops, title=f"Loft {i}") for i in range(5)]
+    for prop in props[1::2]:
+        make_listing(ops, prop["_id"])
+    make_listing(ops, props[0]["_id"], status="expired")
+
+    assert len(ops.search_property_ids({"search_term": "loft"}, limit=1)) == 1
+    assert sorted(ops.search_property_ids({"search_term": "loft"})) == sorted(p["_id"] for p in props[1::2])
+    assert len(ops.search_property_ids({"max_price": 10 ** 9}, limit=1)) == 1
+
+# ==================== AGGREGATION ====================
+
+def test_analytics_counts(ops):
+    prop = make_property(ops)
+    make_listing(ops, prop["_id"], status="active")
+    make_listing(ops, prop["_id"], status="pending")
+    ops.create_user({"firebase_uid": "u1", "email": "u1@example.com", "role": "buyer"})
+
+    analytics = ops.get_analytics()
+    assert analytics["total_properties"] == 1
+    assert analytics["active_listings"] == 1
+    assert analytics["total_users"] == 1
+
+
+def test_group_pipeline(ops):
+    for price in (100, 200, 300):
+        make_property(ops, price=price)
+    result = list(ops.db.properties.aggregate([
+        {"$group": {"_id": "$location.city", "n": {"$sum": 1}, "avg": {"$avg": "$current_price"}}},
+    ]))
+    assert result == [{"_id": "Austin", "n": 3, "avg": 200}]
+
+
+def test_unsupported_stage_raises(ops):
+    with pytest.raises(NotImplementedError):
+        list(ops.db.properties.aggregate([{"$facet": {}}]))
+
+
+def test_messaging_unread_counts(ops):
+    ops.send_message("alice", "bob", "hello")
+    ops.send_message("alice", "bob", "are you there?")
+    assert ops.get_unread_message_count("bob") == 2
+    assert len(ops.get_conversation_page("bob", "alice")["messages"]) == 2
+    ops.mark_conversation_read("bob", "alice")
+    assert ops.get_unread_message_count("bob") == 0
+
+
+# ==================== DIVERGENCES ====================
+
+def test_aborted_transaction_is_not_rolled_back(ops):
+    # Sessions are no-ops: writes made before an abort stay visible
+    with ops.client.start_session() as session:
+        session.start_transaction()
+        ops.db.notifications.insert_one({"title": "t", "message": "m"}, session=session)
+        session.abort_transaction()
+    assert ops.db.notifications.count_documents({}) == 1
@@ -0,0 +1,55 @@
+"""Typed models built from RawBSONDocument decode only the fields that are accessed"""
+
+from datetime import datetime, timezone
+
+import bson
+from bson import Binary, Code, Decimal128, Int64, MaxKey, MinKey, ObjectId, Regex, Timestamp
+from bson.codec_options import CodecOptions
+from bson.raw_bson import RawBSONDocument
+
+from models import Property
+
+RAW_OPTIONS = CodecOptions(document_class=RawBSONDocument, tz_aware=True)
+
+DOC = {
+    "_id": ObjectId(),
+    "title": "Sunny loft",
+    "description": "Bright home " * 50,
+    "current_price": 250000.0,
+    "bedrooms": 2,
+    "created_at": datetime(2024, 1, 1, tzinfo=timezone.utc),
+    "location": {"city": "Austin", "geo": {"type": "Point", "coordinates": [-97.7, 30.3]}},
+    "images": [f"https://img/{i}.jpg" for i in range(10)],
+    "is_featured": True,
+    "parking": None,
+    "views": Int64(7),
+    "fee": Decimal128("1.50"),
+    "blob": Binary(b"\x00\x01", 0),
+    "pattern": Regex("^a+", "i"),
+    "ts": Timestamp(1, 2),
+    "low": MinKey(),
+    "high": MaxKey(),
+    "script": Code("return 1"),
+}
+
+
+def raw_document():
+    return RawBSONDocument(bson.encode(DOC), RAW_OPTIONS)
+
+
+def test_fields_decode_from_raw_bytes():
+    model = Property.from_raw(raw_document())
+    expected = bson.decode(bson.encode(DOC), CodecOptions(tz_aware=True))
+    for key, value in expected.items():
+        assert model.get(key) == value, key
+    assert model.location["geo"]["coordinates"] == [-97.7, 30.3]
+    assert model.get("missing", "default") == "default"
+
+
+def test_accessing_a_field_does_not_inflate_the_document():
+    raw = raw_document()
+    model = Property.from_raw(raw)
+    assert model.current_price == 250000.0
+    assert model.get("fee") == Decimal128("1.50")
+    # RawBSONDocument decodes everything on its first key lookup; the model never asks it for a key
+    assert raw._RawBSONDocument__inflated_doc is None
@@ -0,0 +1,78 @@
+"""
+Query plan regression check
+
+test_query_plans_match_baseline runs query_plans.py's scenario against the
+MongoDB server at MONGO_URL and compares every plan with the committed
+query_plan_baseline.json. It is skipped when no server is reachable. After an
+intended plan change, rerun with QUERY_PLANS_UPDATE_BASELINE=1 (or
+python query_plans.py --update-baseline) and commit the baseline.
+"""
+
+import os
+
+import pytest
+from pymongo.errors import PyMongoError
+
+import query_plans
+from config import MEMORY_URL_SCHEME, get_settings
+
+
+def explain(winning_plan, docs_examined, returned):
+    return {
+        "queryPlanner": {"winningPlan": winning_plan},
+        "executionStats": {"totalDocsExamined": docs_examined, "totalKeysExamined": docs_examined,
+                           "executionStages": {"stage": "FETCH", "nReturned": returned}},
+    }
+
+
+def test_collscan_and_ratio_are_violations():
+    summary = query_plans.summarize(explain({"stage": "COLLSCAN"}, 5000, 10))
+    assert summary["plan"] == "COLLSCAN"
+    assert query_plans.violations(summary) == ["COLLSCAN", "RATIO"]
+
+
+def test_index_scan_passes():
+    plan = {"stage": "FETCH", "inputStage": {"stage": "IXSCAN", "indexName": "status_1"}}
+    summary = query_plans.summarize(explain(plan, 50, 50))
+    assert summary["plan"] == "FETCH > IXSCAN(status_1)"
+    assert query_plans.violations(summary) == []
+
+
+def test_check_reports_plan_changes_and_missing_shapes():
+    result = {"plan": "FETCH > IXSCAN(status_1)", "docs_examined": 1, "keys_examined": 1, "returned": 1,
+              "ratio": 1.0, "shape": {}}
+    baseline = {"get_listings_by_status find": {"plan": "FETCH > IXSCAN(status_1_created_at_-1)"},
+                "removed find": {"plan": "EOF"}}
+    failures = query_plans.check({"get_listings_by_status find": result}, baseline)
+    assert failures == [
+        "get_listings_by_status find: plan changed: FETCH > IXSCAN(status_1_created_at_-1) -> FETCH > IXSCAN(status_1)",
+        "removed find: in baseline but no longer emitted",
+    ]
+
+
+@pytest.fixture(scope="module")
+def server():
+    if get_settings()["MONGO_URL"].startswith(MEMORY_URL_SCHEME):
+        pytest.skip("query plans need a MongoDB server (MONGO_URL is memory://)")
+    client, db, recorder = query_plans.connect(timeout_ms=2000)
+    try:
+        client.admin.command("ping")
+    except PyMongoError as e:
+        client.close()
+        pytest.skip(f"no MongoDB server reachable at MONGO_URL ({type(e).__name__})")
+    yield client, db, recorder
+    client.close()
+
+
+def test_query_plans_match_baseline(server):
+    client, db, recorder = server
+    results = query_plans.collect_plans(client, db, recorder)
+
+    if os.environ.get("QUERY_PLANS_UPDATE_BASELINE"):
+        query_plans.write_baseline(results)
+    baseline = query_plans.load_baseline()
+    if not baseline:
+        pytest.fail(f"No baseline at {query_plans.BASELINE_PATH}: rerun with QUERY_PLANS_UPDATE_BASELINE=1 "
+                    "and commit the file")
+    failures = query_plans.check(results, baseline)
+    assert not failures, "\n".join(failures)
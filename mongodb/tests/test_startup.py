@@ -0,0 +1,59 @@
+"""
+Startup cost: importing the package and constructing DatabaseOperations must
+not connect to MongoDB and must stay within an import-time budget
+
+Each check runs in a fresh interpreter so modules cached by other tests do
+not hide import cost.
+"""
+
+import json
+import os
+import subprocess
+import sys
+
+PACKAGE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Seconds for `import config, operations` in a fresh interpreter (override for slow CI machines)
+IMPORT_BUDGET_SECONDS = float(os.environ.get("IMPORT_BUDGET_SECONDS", "1.0"))
+
+_PROBE = """
+import json, socket, sys, time
+
+connects = []
+
+def connect(self, address):
+    connects.append(str(address))
+    raise OSError("connections are blocked in this probe")
+
+socket.socket.connect = connect
+
+start = time.perf_counter()
+import config, operations
+seconds = time.perf_counter() - start
+
+db_ops = operations.DatabaseOperations()
+print(json.dumps({"seconds": seconds, "connects": connects, "is_connected": db_ops.is_connected}))
+"""
+
+
+def run(code, cwd):
+    env = {**os.environ, "MONGO_URL": "mongodb://127.0.0.1:1"}
+    output = subprocess.run([sys.executable, "-c", code], cwd=cwd, env=env, capture_output=True,
+                            text=True, check=True).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def test_import_and_construct_open_no_connection():
+    result = run(_PROBE, PACKAGE_DIR)
+    assert result["connects"] == []
+    assert result["is_connected"] is False
+
+
+def test_import_time_budget():
+    seconds = run(_PROBE, PACKAGE_DIR)["seconds"]
+    assert seconds < IMPORT_BUDGET_SECONDS, f"import config, operations took {seconds:.3f}s"
+
+
+def test_package_import_loads_no_driver():
+    code = "import json, sys, mongodb; print(json.dumps(sorted({'pymongo', 'dotenv'} & set(sys.modules))))"
+    assert run(code, os.path.dirname(PACKAGE_DIR)) == []
@@ -0,0 +1,156 @@
+"""
+Local Inverted Index
+Prefix search and autocomplete for properties, which MongoDB $text does not support
+
+Backends are pluggable: anything implementing add/remove/suggest/search_prefix
+can be passed to DatabaseOperations(autocomplete_backend=...).
+"""
+
+import re
+import threading
+from bisect import bisect_left
+from collections import defaultdict
+from typing import Any, Dict, Iterable, List, Set, Tuple
+
+_TOKEN_RE = re.compile(r"[a-z0-9]+")
+
+# Property fields indexed for autocomplete, with their score weight
+DEFAULT_FIELDS = {"title": 3, "location.city": 2, "description": 1}
+
+
+def tokenize(text: str) -> List[str]:
+    return _TOKEN_RE.findall(text.lower()) if text else []
+
+
+def _field_text(doc: Dict[str, Any], path: str) -> str:
+    value = doc
+    for part in path.split("."):
+        if not isinstance(value, dict):
+            return ""
+        value = value.get(part)
+    return value if isinstance(value, str) else ""
+
+
+class InvertedIndex:
+    """
+    In-memory token -> document postings with a sorted vocabulary
+
+    Prefix lookups bisect the sorted vocabulary, so they cost
+    O(log V + matching terms) rather than a scan over all documents.
+    """
+
+    def __init__(self, fields: Dict[str, int] = None):
+        self.fields = fields or DEFAULT_FIELDS
+        self._postings: Dict[str, Dict[Any, int]] = defaultdict(dict)  # token -> {doc_id: weight}
+        self._doc_tokens: Dict[Any, Set[str]] = {}
+        self._vocab: List[str] = []
+        self._vocab_dirty = False
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._doc_tokens)
+
+    def add(self, doc_id: Any, doc: Dict[str, Any]):
+        """Index (or re-index) a document"""
+        weights: Dict[str, int] = defaultdict(int)
+        for field, weight in self.fields.items():
+            for token in tokenize(_field_text(doc, field)):
+                weights[token] += weight
+
+        with self._lock:
+            self._remove_locked(doc_id)
+            for token, weight in weights.items():
+                if token not in self._postings:
+                    self._vocab_dirty = True
+                self._postings[token][doc_id] = weight
+            self._doc_tokens[doc_id] = set(weights)
+
+    def remove(self, doc_id: Any):
+        with self._lock:
+            self._remove_locked(doc_id)
+
+    def _remove_locked(self, doc_id: Any):
+        for token in self._doc_tokens.pop(doc_id, ()):
+            postings = self._postings[token]
+            postings.pop(doc_id, None)
+            if not postings:
+                del self._postings[token]
+                self._vocab_dirty = True
+
+    def _terms_with_prefix(self, prefix: str) -> List[str]:
+        with self._lock:
+            if self._vocab_dirty:
+                self._vocab = sorted(self._postings)
+                self._vocab_dirty = False
+            vocab = self._vocab
+        start = bisect_left(vocab, prefix)
+        terms = []
+        for term in vocab[start:]:
+            if not term.startswith(prefix):
+                break
+            terms.append(term)
+        return terms
+
+    def _postings_for(self, terms: List[str]) -> Dict[str, List[Tuple[Any, int]]]:
+        """Snapshot of the postings of terms, safe to iterate while add/remove run"""
+        with self._lock:
+            return {term: list(self._postings.get(term, {}).items()) for term in terms}
+
+    def suggest(self, prefix: str, limit: int = 10) -> List[Tuple[str, int]]:
+        """
+        Complete the last word of a prefix
+
+        Returns:
+            list: (term, document count) pairs, most common first
+        """
+        tokens = tokenize(prefix)
+        if not tokens:
+            return []
+        postings = self._postings_for(self._terms_with_prefix(tokens[-1]))
+        counts = [(term, len(docs)) for term, docs in postings.items()]
+        counts.sort(key=lambda tc: (-tc[1], tc[0]))
+        return counts[:limit]
+
+    def search_prefix(self, text: str, limit: int = 20) -> List[Any]:
+        """
+        Documents matching every word, treating the last word as a prefix
+
+        Returns:
+            list: Document ids ranked by summed field weights
+        """
+        tokens = tokenize(text)
+        if not tokens:
+            return []
+
+        scores: Dict[Any, int] = None
+        for i, token in enumerate(tokens):
+            terms = self._terms_with_prefix(token) if i == len(tokens) - 1 else [token]
+            matched: Dict[Any, int] = defaultdict(int)
+            for docs in self._postings_for(terms).values():
+                for doc_id, weight in docs:
+                    matched[doc_id] += weight
+            if scores is None:
+                scores = matched
+            else:
+                scores = {d: s + matched[d] for d, s in scores.items() if d in matched}
+            if not scores:
+                return []
+
+        return [doc_id for doc_id, _ in sorted(scores.items(), key=lambda ds: -ds[1])[:limit]]
+
+    def build(self, docs: Iterable[Dict[str, Any]]) -> int:
+        """Index an iterable of documents with _id; returns the number indexed"""
+        n = 0
+        for doc in docs:
+            self.add(doc["_id"], doc)
+            n += 1
+        return n
+
+
+def build_property_index(db, fields: Dict[str, int] = None, batch_size: int = 5000) -> InvertedIndex:
+    """Build an InvertedIndex over the properties collection, projecting only indexed fields"""
+    index = InvertedIndex(fields)
+    projection = {field: 1 for field in index.fields}
+    index.build(db.properties.find({}, projection, batch_size=batch_size))
+    print(f"✓ Autocomplete index built over {len(index)} properties")
+    return index
@@ -0,0 +1,160 @@
+"""
+Unit of Work
+Multi-document transactions with bounded retries and batched side effects
+
+    def work(uow):
+        uow.db.listings.update_one({...}, {...}, session=uow.session)
+        uow.add_notification({...})
+        uow.add_audit_log({...})
+        return True
+
+    db_ops.unit_of_work(work)
+
+Side-effect writes (audit logs, notifications) are collected during the
+callback and written with one insert_many per collection just before commit,
+inside the same transaction.
+"""
+
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, List
+
+from pymongo.errors import PyMongoError
+
+from validation import validate_document
+
+TRANSIENT_LABEL = "TransientTransactionError"
+UNKNOWN_COMMIT_LABEL = "UnknownTransactionCommitResult"
+
+
+class UnitOfWork:
+    """Writes grouped into one transaction; handed to the unit_of_work callback"""
+
+    def __init__(self, db, session):
+        self.db = db
+        self.session = session
+        self.audit_logs: List[Dict[str, Any]] = []
+        self.notifications: List[Dict[str, Any]] = []
+
+    def add_audit_log(self, log_data: Dict[str, Any]) -> None:
+        """Queue an audit log entry (same defaults as create_audit_log)"""
+        log_data.setdefault('timestamp', datetime.now(timezone.utc))
+        log_data.setdefault('metadata', {})
+        validate_document('audit_logs', log_data)
+        self.audit_logs.append(log_data)
+
+    def add_notification(self, notification_data: Dict[str, Any]) -> None:
+        """Queue a notification (same defaults as create_notification)"""
+        notification_data.setdefault('created_at', datetime.now(timezone.utc))
+        notification_data.setdefault('is_read', False)
+        validate_document('notifications', notification_data)
+        self.notifications.append(notification_data)
+
+    def flush(self) -> None:
+        """Bulk-insert queued side effects inside the transaction"""
+        if self.audit_logs:
+            self.db.audit_logs.insert_many(self.audit_logs, ordered=False, session=self.session)
+        if self.notifications:
+            self.db.notifications.insert_many(self.notifications, ordered=False, session=self.session)
+
+
+class TransactionMetrics:
+    """Thread-safe counters and latency totals for unit_of_work calls"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.transactions = 0
+        self.committed = 0
+        self.failed = 0
+        self.retries = 0
+        self.commit_retries = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+
+    def record(self, committed: bool, retries: int, commit_retries: int, elapsed_ms: float) -> None:
+        with self._lock:
+            self.transactions += 1
+            self.committed += committed
+            self.failed += not committed
+            self.retries += retries
+            self.commit_retries += commit_retries
+            self.total_ms += elapsed_ms
+            self.max_ms = max(self.max_ms, elapsed_ms)
+
+    def snapshot(self) -> Dict[str, float]:
+        with self._lock:
+            return {
+                "transactions": self.transactions,
+                "committed": self.committed,
+                "failed": self.failed,
+                "retries": self.retries,
+                "commit_retries": self.commit_retries,
+                "avg_ms": self.total_ms / self.transactions if self.transactions else 0.0,
+                "max_ms": self.max_ms,
+            }
+
+
+def _backoff(attempt: int, base: float, cap: float) -> None:
+    # Full jitter keeps retrying writers from colliding again in lockstep
+    time.sleep(random.uniform(0, min(cap, base * (2 ** attempt))))
+
+
+def run_transaction(client, db, callback: Callable[[UnitOfWork], Any], metrics: TransactionMetrics = None,
+                    max_retries: int = 5, max_commit_retries: int = 5,
+                    backoff_base: float = 0.01, backoff_cap: float = 0.5) -> Any:
+    """
+    Run callback in a transaction, retrying transient failures
+
+    The whole callback is retried (up to max_retries) on errors labelled
+    TransientTransactionError; a commit whose outcome is unknown is retried
+    on its own (commitTransaction is idempotent) up to max_commit_retries.
+
+    Returns:
+        The callback's return value
+
+    Raises:
+        PyMongoError: When the error is not retryable or retries are exhausted
+    """
+    start = time.perf_counter()
+    retries = commit_retries = 0
+    committed = False
+    try:
+        with client.start_session() as session:
+            while True:
+                uow = UnitOfWork(db, session)
+                session.start_transaction()
+                try:
+                    result = callback(uow)
+                    uow.flush()
+                except PyMongoError as e:
+                    if session.in_transaction:
+                        session.abort_transaction()
+                    if e.has_error_label(TRANSIENT_LABEL) and retries < max_retries:
+                        _backoff(retries, backoff_base, backoff_cap)
+                        retries += 1
+                        continue
+                    raise
+                except BaseException:
+                    if session.in_transaction:
+                        session.abort_transaction()
+                    raise
+
+                while True:
+                    try:
+                        session.commit_transaction()
+                        committed = True
+                        return result
+                    except PyMongoError as e:
+                        if e.has_error_label(UNKNOWN_COMMIT_LABEL) and commit_retries < max_commit_retries:
+                            commit_retries += 1
+                            continue
+                        if e.has_error_label(TRANSIENT_LABEL) and retries < max_retries:
+                            _backoff(retries, backoff_base, backoff_cap)
+                            retries += 1
+                            break  # rerun the whole transaction
+                        raise
+    finally:
+        if metrics is not None:
+            metrics.record(committed, retries, commit_retries, (time.perf_counter() - start) * 1000)
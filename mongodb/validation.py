@@ -0,0 +1,263 @@
+"""
+Schema Validation
+Compiles COLLECTIONS_SCHEMA into MongoDB $jsonSchema validators and
+precompiled client-side document validators
+"""
+
+import re
+from collections.abc import Mapping
+from datetime import datetime
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from bson.objectid import ObjectId
+
+from models import COLLECTIONS_SCHEMA
+
+# Fields a document must contain after the create_* methods applied defaults.
+# Everything else in COLLECTIONS_SCHEMA is type-checked only when present.
+REQUIRED_FIELDS = {
+    "users": ["firebase_uid", "email", "role"],
+    "properties": ["title", "property_type", "current_price"],
+    "listings": ["property_id", "lister_firebase_uid", "status"],
+    "verification_documents": ["user_firebase_uid", "document_type", "status"],
+    "saved_listings": ["user_firebase_uid", "listing_id"],
+    "property_comparisons": ["user_firebase_uid", "property_ids"],
+    "reviews": ["reviewer_firebase_uid", "target_type", "target_id", "rating"],
+    "notifications": ["title", "message"],
+    "audit_logs": ["action", "timestamp"],
+    "saved_searches": ["user_firebase_uid", "filters", "match_keys"],
+    "conversations": ["participants", "message_count"],
+    "message_buckets": ["conversation_id", "seq"],
+    "user_conversations": ["user_firebase_uid", "conversation_id"],
+    "listing_view_stats": ["listing_id", "day", "views"],
+}
+
+# Schema type name -> ($jsonSchema bsonType, Python types)
+_TYPES = {
+    "string": ("string", (str,)),
+    "float": (["double", "int", "long", "decimal"], (int, float)),
+    "int": (["int", "long"], (int,)),
+    "boolean": ("bool", (bool,)),
+    "datetime": ("date", (datetime,)),
+    "ObjectId": ("objectId", (ObjectId,)),
+    "object": ("object", (Mapping,)),
+}
+
+_SPEC_RE = re.compile(r"^(\w+)\s*(?:\((.*)\))?$")
+_RANGE_RE = re.compile(r"^(\d+(?:\.\d+)?)-(\d+(?:\.\d+)?)$")
+
+
+class SchemaValidationError(ValueError):
+    """Raised when a document does not match its collection schema"""
+
+
+def _parse_spec(spec: str) -> Dict[str, Any]:
+    """
+    Parse a schema type string such as "string (visitor|buyer)" or
+    "float (1-5)" into {type, enum, minimum, maximum, nullable}
+    """
+    if spec.startswith("["):
+        # "[longitude, latitude]": a fixed-size numeric pair
+        return {"type": "float", "pair": True, "nullable": False}
+
+    match = _SPEC_RE.match(spec.strip())
+    if not match or match.group(1) not in _TYPES:
+        raise ValueError(f"Unsupported schema type: {spec!r}")
+
+    parsed = {"type": match.group(1), "nullable": False}
+    for note in (match.group(2) or "").split(","):
+        note = note.strip()
+        if note.startswith("optional"):
+            parsed["nullable"] = True
+        elif "|" in note:
+            parsed["enum"] = [v.strip().strip("'") for v in note.split("|")]
+        elif _RANGE_RE.match(note):
+            low, high = _RANGE_RE.match(note).groups()
+            parsed["minimum"], parsed["maximum"] = float(low), float(high)
+        elif note.startswith("'") and note.endswith("'"):
+            parsed["enum"] = [note.strip("'")]
+    return parsed
+
+
+# ==================== SERVER-SIDE ($jsonSchema) ====================
+
+def _json_schema(spec: Any) -> Dict[str, Any]:
+    if isinstance(spec, dict):
+        properties = {k: _json_schema(v) for k, v in spec.items()}
+        return {"bsonType": "object", "properties": properties}
+    if isinstance(spec, list):
+        return {"bsonType": "array", "items": _json_schema(spec[0])}
+
+    parsed = _parse_spec(spec)
+    if parsed.get("pair"):
+        return {"bsonType": "array", "minItems": 2, "maxItems": 2,
+                "items": {"bsonType": _TYPES["float"][0]}}
+
+    bson_type = _TYPES[parsed["type"]][0]
+    if parsed["nullable"]:
+        bson_type = (bson_type if isinstance(bson_type, list) else [bson_type]) + ["null"]
+    schema = {"bsonType": bson_type}
+    if "enum" in parsed:
+        schema["enum"] = parsed["enum"] + ([None] if parsed["nullable"] else [])
+    if "minimum" in parsed:
+        schema["minimum"] = parsed["minimum"]
+        schema["maximum"] = parsed["maximum"]
+    return schema
+
+
+def compile_json_schema(collection: str) -> Dict[str, Any]:
+    """
+    Build the $jsonSchema validator for a collection
+
+    Unknown fields are allowed so derived fields (e.g. location.latitude)
+    and later additions keep working.
+
+    Returns:
+        dict: {"$jsonSchema": {...}} suitable for collMod/create
+    """
+    schema = _json_schema(COLLECTIONS_SCHEMA[collection])
+    schema.pop("bsonType")
+    schema["properties"].pop("_id", None)
+    return {"$jsonSchema": {
+        "bsonType": "object",
+        "required": REQUIRED_FIELDS.get(collection, []),
+        **schema,
+    }}
+
+
+# ==================== CLIENT-SIDE ====================
+
+def _compile_check(spec: Any, path: str) -> Callable[[Any], None]:
+    """Compile a schema fragment into a closure that raises on bad values"""
+    if isinstance(spec, dict):
+        checks = [(k, _compile_check(v, f"{path}.{k}" if path else k)) for k, v in spec.items()]
+
+        def check_object(value):
+            if not isinstance(value, Mapping):
+                raise SchemaValidationError(f"{path}: expected object, got {type(value).__name__}")
+            for key, check in checks:
+                if key in value:
+                    check(value[key])
+        return check_object
+
+    if isinstance(spec, list):
+        check_item = _compile_check(spec[0], f"{path}[]")
+
+        def check_array(value):
+            if value is None:
+                return
+            if not isinstance(value, (list, tuple)):
+                raise SchemaValidationError(f"{path}: expected array, got {type(value).__name__}")
+            for item in value:
+                check_item(item)
+        return check_array
+
+    parsed = _parse_spec(spec)
+    if parsed.get("pair"):
+        def check_pair(value):
+            if (not isinstance(value, (list, tuple)) or len(value) != 2
+                    or not all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in value)):
+                raise SchemaValidationError(f"{path}: expected [longitude, latitude]")
+        return check_pair
+
+    py_types = _TYPES[parsed["type"]][1]
+    reject_bool = parsed["type"] in ("float", "int")
+    nullable = parsed["nullable"]
+    enum = frozenset(parsed["enum"]) if "enum" in parsed else None
+    low, high = parsed.get("minimum"), parsed.get("maximum")
+    type_name = parsed["type"]
+
+    def check_scalar(value):
+        if value is None:
+            if nullable:
+                return
+            raise SchemaValidationError(f"{path}: must not be null")
+        if not isinstance(value, py_types) or (reject_bool and isinstance(value, bool)):
+            raise SchemaValidationError(f"{path}: expected {type_name}, got {type(value).__name__}")
+        if enum is not None and value not in enum:
+            raise SchemaValidationError(f"{path}: {value!r} is not one of {sorted(enum)}")
+        if low is not None and not low <= value <= high:
+            raise SchemaValidationError(f"{path}: {value!r} outside {low:g}-{high:g}")
+    return check_scalar
+
+
+class DocumentValidator:
+    """Precompiled validator for one collection"""
+
+    def __init__(self, collection: str):
+        self.collection = collection
+        schema = dict(COLLECTIONS_SCHEMA[collection])
+        schema.pop("_id", None)
+        self.required = tuple(REQUIRED_FIELDS.get(collection, []))
+        self.checks = {k: _compile_check(v, k) for k, v in schema.items()}
+
+    def validate(self, doc: Mapping, partial: bool = False):
+        """
+        Raise SchemaValidationError if doc does not match the schema
+
+        Args:
+            doc: Document (or $set payload when partial=True)
+            partial: Skip the required-fields check (for updates)
+        """
+        if not partial:
+            missing = [f for f in self.required if f not in doc]
+            if missing:
+                raise SchemaValidationError(f"{self.collection}: missing required field(s) {', '.join(missing)}")
+        checks = self.checks
+        for key, value in doc.items():
+            check = checks.get(key)
+            if check is not None:
+                check(value)
+
+    def validate_many(self, docs: Iterable[Mapping]):
+        """Validate a batch, reporting the index of the first bad document"""
+        for i, doc in enumerate(docs):
+            try:
+                self.validate(doc)
+            except SchemaValidationError as e:
+                raise SchemaValidationError(f"document {i}: {e}") from None
+
+
+_validators: Dict[str, DocumentValidator] = {}
+
+
+def get_validator(collection: str) -> Optional[DocumentValidator]:
+    """Return the cached validator for a collection (None if it has no schema)"""
+    validator = _validators.get(collection)
+    if validator is None and collection in COLLECTIONS_SCHEMA:
+        validator = _validators[collection] = DocumentValidator(collection)
+    return validator
+
+
+def validate_document(collection: str, doc: Mapping, partial: bool = False):
+    """Validate a document against its collection schema (no-op for unknown collections)"""
+    validator = get_validator(collection)
+    if validator is not None:
+        validator.validate(doc, partial=partial)
+
+
+def benchmark(n: int = 20000) -> Dict[str, float]:
+    """
+    Measure per-document validation cost on generated documents
+
+    Returns:
+        dict: Collection name -> microseconds per document
+    """
+    import time
+    from data_generator import DataGenerator
+
+    gen = DataGenerator(users=max(10, n // 5), chunk_size=n)
+    results = {}
+    for collection in ("users", "properties", "listings", "reviews", "notifications", "audit_logs"):
+        docs = gen.generate_chunk(collection, 0)
+        validator = get_validator(collection)
+        start = time.perf_counter()
+        validator.validate_many(docs)
+        elapsed = time.perf_counter() - start
+        results[collection] = elapsed / len(docs) * 1e6
+        print(f"{collection:15s} {len(docs):7d} docs  {results[collection]:6.2f} µs/doc")
+    return results
+
+
+if __name__ == "__main__":
+    benchmark()